@@ -1,14 +1,26 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Customer, Product, OrderDetail, Chat
+from .models import Customer, Product, Order, OrderLine, Chat
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('name', 'user')
     search_fields = ('name', 'user__username')
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    raw_id_fields = ('product',)
+    extra = 0
+
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('order_code', 'customer', 'created_at', 'total_price')
+    search_fields = ('order_code',)
+    raw_id_fields = ('customer',)
+    readonly_fields = ('total_price',)
+    inlines = [OrderLineInline]
     
 admin.site.register(Customer, CustomerAdmin)
 admin.site.register(Product)
-admin.site.register(OrderDetail)
+admin.site.register(Order, OrderAdmin)
 admin.site.register(Chat)
 
 
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
+
+    def ready(self):
+        from . import profiling, signals  # noqa: F401
+        if profiling.enabled():
+            profiling.connect()
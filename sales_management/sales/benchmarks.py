@@ -0,0 +1,109 @@
+import math
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Customer, Order, OrderLine, Product
+from .services import customer_name_key
+
+# Dữ liệu sinh cho benchmark dùng tiền tố riêng để không lẫn với dữ liệu thật
+CUSTOMER_PREFIX = 'BC'
+PRODUCT_PREFIX = 'B'
+ORDER_PREFIX = 'BO'
+LINES_PER_ORDER = 3
+
+
+def seed(customers=10000, products=2000, orders=2000000, batch_size=10000, days=730, log=print):
+    """Sinh khách hàng, sản phẩm và `orders` dòng đơn hàng (LINES_PER_ORDER dòng mỗi Order), bỏ qua phần đã có."""
+    existing = Customer.objects.filter(customer_code__startswith=CUSTOMER_PREFIX).count()
+    Customer.objects.bulk_create([
+        Customer(
+            customer_code=f'{CUSTOMER_PREFIX}{i}',
+            name=f'Khách hàng {i}',
+            name_key=customer_name_key(f'Khách hàng {i}'),
+            segment_code=f'SEG{i % 5}',
+            segment_description=f'Phân khúc {i % 5}',
+        )
+        for i in range(existing, customers)
+    ], batch_size=batch_size)
+
+    existing = Product.objects.filter(product_code__startswith=PRODUCT_PREFIX).count()
+    Product.objects.bulk_create([
+        Product(
+            product_code=f'{PRODUCT_PREFIX}{i:05d}',
+            product_name=f'Sản phẩm {i}',
+            group_code=f'GRP{i % 20}',
+            group_name=f'Nhóm hàng {i % 20}',
+            price=random.randint(1, 500) * 1000,
+        )
+        for i in range(existing, products)
+    ], batch_size=batch_size)
+
+    customer_ids = list(Customer.objects.filter(customer_code__startswith=CUSTOMER_PREFIX).values_list('id', flat=True))
+    product_prices = dict(Product.objects.filter(product_code__startswith=PRODUCT_PREFIX).values_list('id', 'price'))
+    product_ids = list(product_prices)
+
+    start = Order.objects.filter(order_code__startswith=ORDER_PREFIX).count()
+    total = math.ceil(orders / LINES_PER_ORDER)
+    now = timezone.now()
+    per_batch = max(batch_size // LINES_PER_ORDER, 1)
+    for first in range(start, total, per_batch):
+        headers = []
+        lines = []
+        for order_number in range(first, min(first + per_batch, total)):
+            rng = random.Random(order_number)
+            order = Order(
+                order_code=f'{ORDER_PREFIX}{order_number:08d}',
+                customer_id=rng.choice(customer_ids),
+                created_at=now - timedelta(seconds=rng.randrange(days * 86400)),
+            )
+            offset = rng.randrange(len(product_ids))
+            order_lines = []
+            for line in range(min(LINES_PER_ORDER, orders - order_number * LINES_PER_ORDER)):
+                product_id = product_ids[(offset + line) % len(product_ids)]
+                quantity = rng.randint(1, 20)
+                order_lines.append(OrderLine(order=order, product_id=product_id, quantity=quantity,
+                                             total_price=quantity * product_prices[product_id]))
+            order.total_price = sum(line.total_price for line in order_lines)
+            headers.append(order)
+            lines += order_lines
+        Order.objects.bulk_create(headers)
+        # Mỗi Order đã có id sau bulk_create nên order_id của các dòng được gán theo
+        OrderLine.objects.bulk_create(lines)
+        log(f'Seeded {first + len(headers):,}/{total:,} orders')
+
+
+def timed(fn, repeat=5):
+    """Chạy fn `repeat` lần, trả về (median, min) tính bằng mili giây."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), min(samples)
+
+
+def percentile(samples, p):
+    """Phân vị p (0-100) theo phương pháp nearest-rank."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def adversarial_messages(length=20000):
+    """Bộ tin nhắn dài dùng để fuzz intent router: các mẫu gây backtracking cho regex lồng nhau."""
+    return [
+        ('digits after keyword', 'mua ' + '1' * length),
+        ('digits and spaces', 'đặt hàng ' + '1 ' * (length // 2) + '!'),
+        ('many short items', 'đặt hàng ' + ', '.join(f'{i % 9 + 1} bánh mì' for i in range(length // 12))),
+        ('words without quantity', 'mua ' + 'bánh ' * (length // 5) + '!'),
+        ('separators only', 'mua ' + ' và ' * (length // 4)),
+        ('history keyword spaces', 'xem' + ' ' * length + 'lịch sử'),
+        ('repeated keywords', 'xem lịch sử ' * (length // 12)),
+        ('diacritics', 'ệ' * length),
+        ('no match', 'a' * length),
+    ]
@@ -0,0 +1,275 @@
+"""
+Ghi hàng loạt và xuất dữ liệu dạng stream cho REST API (đồng bộ với ERP).
+
+POST <resource>/bulk/ nhận một mảng JSON hoặc NDJSON (Content-Type: application/x-ndjson),
+kiểm tra toàn bộ bằng serializer không truy vấn DB cùng các map mã -> id nạp sẵn, rồi upsert
+bằng bulk_create(update_conflicts=True) trong một transaction. GET <resource>/export/
+(?format=ndjson|csv) stream toàn bộ dữ liệu từ server-side cursor, không phân trang, không đệm;
+dưới ASGI (daphne) response là async generator, mỗi chunk đọc từ cursor qua sync_to_async.
+"""
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+
+from . import fragments, product_index, rollups, statistics
+from .models import Customer, Order, OrderLine, Product
+from .sequences import reserve_order_codes
+from .services import OrderError, customer_name_key, normalize_lines, update_totals
+
+DEFAULT_MAX_RECORDS = 5000
+WRITE_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+STREAM_ROWS = 500  # số dòng gộp vào mỗi lần yield
+
+
+class NDJSONParser(BaseParser):
+    """Mỗi dòng một object JSON, trả về danh sách các object."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        records = []
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError(f'NDJSON parse error on line {number}: {e}')
+        return records
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Chỉ dùng cho phản hồi lỗi; dữ liệu export được stream trực tiếp
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for row in rows)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(csv_lines([list(row.values()) for row in rows], list(rows[0]) if rows else []))
+
+
+class Echo:
+    # csv.writer ghi vào đây rồi trả lại chuỗi vừa ghi, không giữ gì trong bộ nhớ
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows, header):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + '\n'
+
+
+def chunked(lines, size=STREAM_ROWS):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def aiter_chunks(chunks):
+    """
+    Async generator lấy từng chunk từ iterator đồng bộ.
+
+    StreamingHttpResponse dưới ASGI đọc hết iterator đồng bộ vào list trước khi gửi byte đầu
+    tiên; ở đây mỗi chunk được đọc riêng trên luồng thread_sensitive (cùng kết nối DB và
+    cursor của iterator()).
+    """
+    chunks = iter(chunks)
+    read = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await read(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def max_records():
+    return getattr(settings, 'SALES_BULK_MAX_RECORDS', DEFAULT_MAX_RECORDS)
+
+
+def last_by(records, field):
+    # Bản ghi trùng khoá trong cùng request: bản sau ghi đè bản trước (ON CONFLICT không cho cập nhật một dòng hai lần)
+    return list({record[field]: record for record in records}.values())
+
+
+def existing_codes(model, field, codes):
+    return set(model.objects.filter(**{f'{field}__in': codes}).values_list(field, flat=True))
+
+
+def upsert_customers(records):
+    records = last_by(records, 'customer_code')
+    existing = existing_codes(Customer, 'customer_code', [record['customer_code'] for record in records])
+    with transaction.atomic():
+        # bulk_create không gửi pre_save nên phải tự gán khoá tên
+        Customer.objects.bulk_create(
+            [Customer(name_key=customer_name_key(record['name']), **record) for record in records],
+            batch_size=WRITE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['customer_code'],
+            update_fields=['name', 'name_key', 'segment_code', 'segment_description'],
+        )
+        transaction.on_commit(statistics.invalidate)
+        transaction.on_commit(lambda: fragments.bump('customers', 'orders'))
+    return len(records) - len(existing), len(existing)
+
+
+def upsert_products(records):
+    records = last_by(records, 'product_code')
+    existing = existing_codes(Product, 'product_code', [record['product_code'] for record in records])
+    with transaction.atomic():
+        products = Product.objects.bulk_create(
+            [Product(**record) for record in records],
+            batch_size=WRITE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['product_code'],
+            update_fields=['product_name', 'group_code', 'group_name', 'price'],
+        )
+        product_ids = [product.id for product in products]
+        transaction.on_commit(statistics.invalidate)
+        transaction.on_commit(lambda: fragments.bump('products'))
+        transaction.on_commit(lambda: product_index.record_changes(product_ids))
+    return len(records) - len(existing), len(existing)
+
+
+def upsert_orders(records):
+    """
+    Upsert Order theo order_code và các dòng theo (đơn, sản phẩm) như khi import CSV.
+
+    Khách hàng và sản phẩm được nạp bằng hai truy vấn cho cả request; mã không tồn tại làm
+    cả request bị từ chối với lỗi theo vị trí bản ghi.
+    """
+    customers = dict(Customer.objects.filter(customer_code__in={record['customer_code'] for record in records})
+                     .values_list('customer_code', 'id'))
+    products = {code: (product_id, price) for code, product_id, price in Product.objects.filter(
+        product_code__in={line['product_code'] for record in records for line in record['lines']}
+    ).values_list('product_code', 'id', 'price')}
+
+    errors, merged = [], {}
+    for record in records:
+        error = {}
+        if record['customer_code'] not in customers:
+            error['customer_code'] = [f"Customer {record['customer_code']} not found."]
+        missing = sorted({line['product_code'] for line in record['lines']} - products.keys())
+        if missing:
+            error['lines'] = [f"Product not found: {', '.join(missing)}"]
+        else:
+            try:
+                merged[record['order_code']] = normalize_lines(
+                    (products[line['product_code']][0], line['quantity'], line.get('total_price'))
+                    for line in record['lines'])
+            except OrderError as e:
+                error['lines'] = [str(e)]
+        errors.append(error)
+    if any(errors):
+        raise ValidationError(errors)
+    records = last_by(records, 'order_code')
+
+    prices = dict(products.values())
+    previous = dict(Order.objects.filter(order_code__in=merged).values_list('order_code', 'created_at'))
+    with transaction.atomic():
+        # update_conflicts trả về id cả với đơn đã có (RETURNING) nên không phải đọc lại map mã -> id
+        orders = {order.order_code: order.id for order in Order.objects.bulk_create(
+            [
+                Order(order_code=record['order_code'], customer_id=customers[record['customer_code']],
+                      created_at=record['created_at'])
+                for record in records
+            ],
+            batch_size=WRITE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['order_code'],
+            update_fields=['customer', 'created_at'],
+        )}
+        reserve_order_codes(orders)
+        OrderLine.objects.bulk_create(
+            [
+                OrderLine(order_id=orders[order_code], product_id=product_id, quantity=quantity,
+                          total_price=total_price if total_price is not None else prices[product_id] * quantity)
+                for order_code, lines in merged.items()
+                for product_id, (quantity, total_price) in lines.items()
+            ],
+            batch_size=WRITE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['order', 'product'],
+            update_fields=['quantity', 'total_price'],
+        )
+        update_totals(orders.values())
+        rollups.mark_dirty([record['created_at'] for record in records] + list(previous.values()))
+        transaction.on_commit(statistics.invalidate)
+        transaction.on_commit(lambda: fragments.bump('orders'))
+    return len(records) - len(previous), len(previous)
+
+
+class BulkMixin:
+    """
+    Thêm hai action cho ViewSet: bulk (upsert hàng loạt) và export (stream NDJSON/CSV).
+
+    ViewSet khai báo bulk_serializer_class, bulk_upsert (staticmethod nhận danh sách
+    validated_data, trả về (created, updated)) và export_fields {tên cột: đường dẫn trường}; có thể ghi đè
+    get_export_queryset để lọc theo query string.
+    """
+    bulk_serializer_class = None
+    bulk_upsert = None
+    export_fields = {}
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        records = request.data
+        if not isinstance(records, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of records.']})
+        if len(records) > max_records():
+            raise ValidationError({'non_field_errors': [f'At most {max_records()} records per request.']})
+        serializer = self.bulk_serializer_class(data=records, many=True)
+        serializer.is_valid(raise_exception=True)
+        created, updated = self.bulk_upsert(serializer.validated_data)
+        return Response({'success': True, 'created': created, 'updated': updated})
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        header = list(self.export_fields)
+        # iterator() dùng server-side cursor trên PostgreSQL: chỉ giữ EXPORT_CHUNK_SIZE dòng trong bộ nhớ
+        rows = self.get_export_queryset().values_list(*self.export_fields.values()).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+        lines = csv_lines(rows, header) if renderer.format == 'csv' else ndjson_lines(rows, header)
+        content = chunked(lines)
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_chunks(content)
+        response = StreamingHttpResponse(content, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}.{renderer.format}"'
+        return response
+
+    def get_export_queryset(self):
+        return self.get_queryset().model.objects.order_by('id')
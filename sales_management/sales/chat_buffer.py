@@ -0,0 +1,123 @@
+"""
+Ghi tin nhắn chat theo lô (write-behind) thay vì mỗi tin nhắn một INSERT.
+
+ChatConsumer chỉ thêm tin nhắn vào bộ đệm của tiến trình; bộ đệm ghi bằng một bulk_create
+khi đủ SALES_CHAT_FLUSH_SIZE tin nhắn hoặc sau SALES_CHAT_FLUSH_INTERVAL giây kể từ tin
+nhắn đầu tiên chưa ghi. Phần còn lại được ghi khi socket đóng và khi tiến trình thoát
+(atexit); chỉ tiến trình bị kill -9 mới có thể mất tối đa một lô chưa ghi.
+
+Lô lỗi được ghi lại từng dòng: dòng lỗi dữ liệu (user đã bị xoá...) bị bỏ và ghi log, chỉ khi
+mất kết nối DB thì các dòng còn lại mới được giữ để thử lại. Bộ đệm giữ tối đa
+SALES_CHAT_MAX_PENDING tin nhắn, quá thì bỏ tin nhắn cũ nhất và báo lỗi.
+"""
+import asyncio
+import atexit
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+
+from .models import Chat
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_MAX_PENDING = 10000
+# Lỗi kết nối: thử lại sau; các lỗi khác là do dữ liệu của dòng, thử lại cũng không được
+RETRYABLE_ERRORS = (OperationalError, InterfaceError)
+
+
+class ChatWriteBuffer:
+    def __init__(self, flush_size=None, flush_interval=None, max_pending=None):
+        self.flush_size = flush_size or getattr(settings, 'SALES_CHAT_FLUSH_SIZE', DEFAULT_FLUSH_SIZE)
+        self.flush_interval = flush_interval or getattr(settings, 'SALES_CHAT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self.max_pending = max_pending or getattr(settings, 'SALES_CHAT_MAX_PENDING', DEFAULT_MAX_PENDING)
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+
+    async def add(self, user_id, message):
+        """Thêm một tin nhắn; chỉ chờ ghi DB khi lô đã đầy."""
+        self.pending.append(Chat(user_id=user_id, message=message))
+        self.trim()
+        if len(self.pending) >= self.flush_size:
+            await self.flush()
+        else:
+            self.schedule()
+
+    def schedule(self):
+        if self.timer is None and self.pending:
+            self.timer = asyncio.get_running_loop().call_later(self.flush_interval, self.start_flush)
+
+    def start_flush(self):
+        self.timer = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        # Giữ tham chiếu tới task để không bị thu gom giữa chừng
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def trim(self):
+        dropped = len(self.pending) - self.max_pending
+        if dropped > 0:
+            del self.pending[:dropped]
+            logger.error(f'Chat buffer is full ({self.max_pending} messages), dropped {dropped} oldest message(s)')
+
+    def requeue(self, batch):
+        # Trả các dòng chưa ghi về đầu bộ đệm để giữ thứ tự
+        self.pending[:0] = batch
+        self.trim()
+
+    def take(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        return batch
+
+    async def flush(self):
+        batch = self.take()
+        if not batch:
+            return
+        # Luồng sync dùng chung (thread_sensitive) chạy các lô lần lượt theo thứ tự gọi
+        retry = await sync_to_async(self.write)(batch)
+        if retry:
+            # DB gián đoạn: thử lại sau, không làm mất tin nhắn
+            self.requeue(retry)
+            self.schedule()
+
+    def flush_sync(self):
+        """Ghi ngay phần còn lại từ code sync (atexit, lệnh quản trị)."""
+        batch = self.take()
+        if batch:
+            self.requeue(self.write(batch))
+
+    def write(self, batch):
+        """Ghi lô, trả về các tin nhắn cần thử lại (rỗng nếu đã ghi hoặc đã bỏ hết)."""
+        try:
+            # timestamp (auto_now_add) là thời điểm ghi lô, trễ hơn lúc nhận tối đa flush_interval
+            with transaction.atomic():
+                Chat.objects.bulk_create(batch)
+            return []
+        except RETRYABLE_ERRORS as e:
+            logger.error(f'Error saving {len(batch)} chat message(s), will retry: {str(e)}')
+            return batch
+        except Exception as e:
+            logger.error(f'Error saving {len(batch)} chat message(s), retrying one by one: {str(e)}')
+        # Một dòng lỗi không được chặn cả lô: ghi từng dòng, bỏ dòng vẫn lỗi
+        for i, chat in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    Chat.objects.bulk_create([chat])
+            except RETRYABLE_ERRORS as e:
+                logger.error(f'Error saving {len(batch) - i} chat message(s), will retry: {str(e)}')
+                return batch[i:]
+            except Exception as e:
+                logger.error(f'Dropped chat message of user {chat.user_id}: {str(e)}')
+        return []
+
+
+buffer = ChatWriteBuffer()
+
+atexit.register(buffer.flush_sync)
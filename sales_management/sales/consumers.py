@@ -1,64 +1,75 @@
 import json
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
-from .models import Chat
-from django.contrib.auth.models import User
+from . import chat_buffer, metrics, profiling, tracing
 import logging
-from .tasks import process_chat_message
+from .tasks import STAFF_GROUP, process_chat_message, user_group_name
 from channels.exceptions import StopConsumer
 
 logger = logging.getLogger(__name__)
 
+
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.room_name = 'chat_room'
-        self.room_group_name = f'chat_{self.room_name}'
+        # Mỗi user một room riêng, tin nhắn và câu trả lời của bot không gửi cho người khác
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.room_group_name = user_group_name(self.user.id)
+        self.groups_joined = [self.room_group_name]
+        # Nhân viên kết nối tới ws/chat/staff/ để theo dõi hội thoại của tất cả khách hàng; socket này
+        # chỉ ở STAFF_GROUP, nếu ở cả room riêng thì tin nhắn của chính nhân viên tới hai lần
+        if self.scope.get('url_route', {}).get('kwargs', {}).get('room') == 'staff' and self.user.is_staff:
+            self.groups_joined = [STAFF_GROUP]
 
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
 
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Ghi nốt tin nhắn còn trong bộ đệm trước khi socket đóng hẳn
+        await chat_buffer.buffer.flush()
+        for group in getattr(self, 'groups_joined', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
         raise StopConsumer()
 
     async def receive(self, text_data):
+        # Mỗi tin nhắn một trace (sales.tracing): id tương quan đi cùng task và câu trả lời
+        trace = tracing.Trace()
+        with profiling.track('websocket', 'chat.receive'):
+            await self.handle_message(text_data, trace)
+        trace.observe('consumer.')
+
+    async def handle_message(self, text_data, trace):
         try:
             logger.info(f'Received message: {text_data}')
-            text_data_json = json.loads(text_data)
-            message = text_data_json['message']
-            username = text_data_json['username']
+            with trace.span('consumer.parse'):
+                text_data_json = json.loads(text_data)
+                message = text_data_json['message']
+            username = self.user.username
 
-            await self.save_message(username, message)
-            
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message,
-                    'username': username,
-                }
-            )
-            
-            task = process_chat_message.delay(message, username)  # Pass both arguments
-            result = await sync_to_async(task.get)(timeout=10)  # Set a timeout
+            with trace.span('consumer.save_message'):
+                await self.save_message(message)
+
+            event = {
+                'type': 'chat_message',
+                'message': message,
+                'username': username,
+            }
+            with trace.span('consumer.group_send'):
+                await self.channel_layer.group_send(self.room_group_name, event)
+                await self.channel_layer.group_send(STAFF_GROUP, event)
             
-            response_message = result or "Đã xử lý yêu cầu của bạn."
-                
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': response_message,
-                    'username': 'System',
-                }
-            )
+            # Task Celery tự gửi câu trả lời về group qua channel layer, không chờ kết quả ở đây.
+            # delay() không đụng tới DB nên không cần chạy trên luồng thread_sensitive dùng chung.
+            with trace.span('consumer.enqueue'):
+                await sync_to_async(process_chat_message.delay, thread_sensitive=False)(
+                    message, username, self.room_group_name, trace=trace.context()
+                )
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             await self.send(text_data=json.dumps({
@@ -70,12 +81,36 @@ class ChatConsumer(AsyncWebsocketConsumer):
         message = event['message']
         username = event['username']
 
-        await self.send(text_data=json.dumps({
+        payload = {
             'message': message,
             'username': username
-        }))
+        }
+        if 'trace' in event:
+            payload['trace_id'] = event['trace']['id']
+        await self.send(text_data=json.dumps(payload))
+        self.trace_delivered(event)
+
+    async def chat_error(self, event):
+        payload = {'error': event['error']}
+        if 'trace' in event:
+            payload['trace_id'] = event['trace']['id']
+        await self.send(text_data=json.dumps(payload))
+        self.trace_delivered(event)
+
+    def trace_delivered(self, event):
+        """Cộng span của câu trả lời đã gửi xuống socket; câu trả lời cuối cộng cả span của task và tổng thời gian."""
+        context = event.get('trace')
+        if not context:
+            return
+        trace = tracing.Trace.resume(context)
+        trace.add('channel.delivery', tracing.waited(context))
+        trace.observe('channel.')
+        if context.get('final'):
+            roundtrip = time.time() - trace.started_at
+            trace.observe('task.')
+            metrics.observe(tracing.CHAT_ROUNDTRIP_METRIC, roundtrip)
+            trace.log('reply', type=event['type'], roundtrip_ms=round(roundtrip * 1000, 3))
 
-    @sync_to_async
-    def save_message(self, username, message):
-        user = User.objects.get(username=username)
-        Chat.objects.create(user=user, message=message)
+    async def save_message(self, message):
+        # user_id lấy từ scope đã xác thực; tin nhắn được ghi theo lô (sales/chat_buffer.py)
+        await chat_buffer.buffer.add(self.user.id, message)
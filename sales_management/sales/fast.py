@@ -0,0 +1,185 @@
+"""
+Đường tắt serialize cho list/retrieve của các ViewSet đọc nhiều (bật bằng FastReadMixin).
+
+Thay vì dựng model và chạy từng field của ModelSerializer cho mỗi dòng, dữ liệu được đọc
+bằng values_list() và chuyển thành dict qua một FieldPlan dịch sẵn từ serializer của view:
+field có sẵn kiểu JSON (chuỗi, số, khoá ngoại) lấy thẳng giá trị, các field khác gọi đúng
+to_representation của DRF. Kết quả render bằng orjson (nếu có) với cùng định dạng như
+JSONRenderer, nên response giống hệt từng byte với đường thường.
+"""
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Các field mà to_representation không đổi giá trị đọc từ DB (str, int, bool, pk)
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                      serializers.PrimaryKeyRelatedField)
+UNSUPPORTED_FIELDS = (serializers.FloatField, serializers.SerializerMethodField, serializers.ManyRelatedField,
+                      serializers.HiddenField)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer dùng orjson: cùng bytes với json.dumps của DRF (gọn, UTF-8, escape U+2028/U+2029).
+
+    datetime/Decimal/... vẫn đi qua JSONEncoder của DRF; dữ liệu orjson không xử lý được
+    (số nguyên quá 64 bit, chuỗi lỗi surrogate) và khi có indent thì dùng lại JSONRenderer.
+    Không dùng cho float: orjson và json.dumps có thể viết số mũ khác nhau.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def empty(row):
+    return None
+
+
+def converted(index, convert):
+    # to_representation của DRF không được gọi với None (to_representation của Serializer bỏ qua)
+    def get(row):
+        value = row[index]
+        return None if value is None else convert(value)
+    return get
+
+
+class FieldPlan:
+    """
+    Cách đọc và dựng output của một serializer: danh sách cột cho values_list() và một hàm
+    đọc giá trị từ row cho mỗi field, theo đúng thứ tự field. Field lồng many=True (reverse FK)
+    được nạp bằng một truy vấn cho cả trang.
+    """
+
+    def __init__(self, serializer, model):
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise ImproperlyConfigured(f'{type(serializer).__name__} overrides to_representation.')
+        self.model = model
+        self.columns = []
+        self.nested = []  # (tên field, FieldPlan con, tên khoá ngoại trỏ về model này)
+        self.getters = []  # (tên field, hàm row -> giá trị đã đổi sang kiểu JSON)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, UNSUPPORTED_FIELDS) \
+                    or (isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField)):
+                raise ImproperlyConfigured(f'{type(serializer).__name__}.{name} is not supported by FieldPlan.')
+            if isinstance(field, serializers.ListSerializer):
+                relation = model._meta.get_field(field.source)
+                self.nested.append((name, FieldPlan(field.child, relation.related_model), relation.field.name))
+                self.getters.append((name, empty))  # điền trong dump()
+                continue
+            index = self.column('__'.join(field.source_attrs))
+            if type(field) in PASSTHROUGH_FIELDS and getattr(field, 'pk_field', None) is None:
+                self.getters.append((name, itemgetter(index)))
+            else:
+                self.getters.append((name, converted(index, field.to_representation)))
+        self.pk_index = self.column('pk')
+
+    def build(self, row):
+        return {name: get(row) for name, get in self.getters}
+
+    def column(self, path):
+        if path == self.model._meta.pk.name:
+            path = 'pk'
+        if path not in self.columns:
+            self.columns.append(path)
+        return self.columns.index(path)
+
+    def rows(self, queryset, extra=()):
+        """values_list() của queryset (bỏ prefetch); `extra` là các cột cần đọc theo tên (phân trang cursor, khoá ngoại)."""
+        columns = self.columns + [path for path in extra if path not in self.columns]
+        return queryset.prefetch_related(None).values_list(*columns, named=True)
+
+    def dump(self, rows, prefetches=None):
+        rows = list(rows)
+        data = [self.build(row) for row in rows]
+        if not rows:
+            return data
+        ids = [row[self.pk_index] for row in rows]
+        for name, plan, fk in self.nested:
+            queryset = (prefetches or {}).get(name, plan.model.objects.all())
+            children = list(plan.rows(queryset.filter(**{f'{fk}__in': ids}), extra=[fk]))
+            grouped = defaultdict(list)
+            for child, item in zip(children, plan.dump(children)):
+                grouped[getattr(child, fk)].append(item)
+            for item, pk in zip(data, ids):
+                item[name] = grouped[pk]
+        return data
+
+
+_plans = {}
+
+
+def get_plan(serializer_class, model):
+    key = (serializer_class, model)
+    if key not in _plans:
+        _plans[key] = FieldPlan(serializer_class(), model)
+    return _plans[key]
+
+
+def prefetch_querysets(queryset):
+    # Giữ thứ tự của Prefetch(..., queryset=...) trong queryset của view để output không đổi
+    return {lookup.prefetch_to: lookup.queryset for lookup in queryset._prefetch_related_lookups
+            if isinstance(lookup, Prefetch) and lookup.queryset is not None}
+
+
+class FastReadMixin:
+    """
+    list/retrieve qua FieldPlan khi response là JSON và SALES_FAST_SERIALIZERS bật.
+
+    Browsable API, ?format=api và các view có quyền theo object (has_object_permission)
+    vẫn đi đường serializer thường.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def use_fast_path(self):
+        return getattr(settings, 'SALES_FAST_SERIALIZERS', True) and isinstance(self.request.accepted_renderer, JSONRenderer)
+
+    def get_plan(self):
+        return get_plan(self.get_serializer_class(), self.get_queryset().model)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super().list(request, *args, **kwargs)
+        plan = self.get_plan()
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self, 'cursor_ordering', ())
+        ordering = [ordering] if isinstance(ordering, str) else ordering
+        rows = plan.rows(queryset, extra=[field.lstrip('-') for field in ordering])
+        page = self.paginate_queryset(rows)
+        data = plan.dump(page if page is not None else rows, prefetch_querysets(queryset))
+        return self.get_paginated_response(data) if page is not None else Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        object_permissions = any(type(permission).has_object_permission is not BasePermission.has_object_permission
+                                 for permission in self.get_permissions())
+        if not self.use_fast_path() or object_permissions:
+            return super().retrieve(request, *args, **kwargs)
+        plan = self.get_plan()
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        rows = list(plan.rows(queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}))[:2])
+        if len(rows) != 1:
+            # Để get_object báo 404 (hoặc MultipleObjectsReturned) như đường thường
+            return super().retrieve(request, *args, **kwargs)
+        return Response(plan.dump(rows, prefetch_querysets(queryset))[0])
@@ -1,5 +1,6 @@
 from django import forms
-from .models import Customer, Product, OrderDetail
+from .models import Customer, Product, Order
+from .services import resolve_customer
 from django.forms.widgets import DateTimeInput
 import datetime
 
@@ -13,7 +14,7 @@ class ProductForm(forms.ModelForm):
         model = Product
         fields = ['product_code', 'product_name', 'group_code', 'group_name', 'price']
 
-class OrderDetailForm(forms.ModelForm):
+class OrderForm(forms.ModelForm):
     created_at = forms.DateTimeField(
         widget=DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'}),
         input_formats=['%Y-%m-%d %H:%M:%S'],
@@ -22,20 +23,16 @@ class OrderDetailForm(forms.ModelForm):
     customer_name = forms.CharField(label='Customer Name', max_length=100, widget=forms.TextInput(attrs={'class': 'form-control'}))
 
     class Meta:
-        model = OrderDetail
-        fields = ['order_code', 'customer', 'product', 'created_at', 'quantity', 'total_price']
+        model = Order
+        fields = ['order_code', 'created_at']
         widgets = {
             'order_code': forms.TextInput(attrs={'class': 'form-control'}),
-            'customer': forms.Select(attrs={'class': 'form-control'}),
-            'product': forms.Select(attrs={'class': 'form-control'}),
-            'quantity': forms.NumberInput(attrs={'class': 'form-control'}),
-            'total_price': forms.NumberInput(attrs={'class': 'form-control'}),
         }
 
     
     def save(self, commit=True):
         customer_name = self.cleaned_data['customer_name']
-        customer, created = Customer.objects.get_or_create(name=customer_name)
+        customer, created = resolve_customer(customer_name)
         self.instance.customer = customer
         return super().save(commit=commit)
 
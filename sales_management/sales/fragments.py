@@ -0,0 +1,51 @@
+"""
+Phiên bản của các fragment HTML được cache (phần dòng của order_list, customer_list, product_list).
+
+Khoá fragment chứa phiên bản của danh sách; mỗi lần ghi chỉ cần tăng phiên bản,
+các fragment cũ không còn được đọc và tự hết hạn theo TTL. Phiên bản và thời điểm đổi
+cuối cũng là ETag/Last-Modified của các response danh mục (sales.http_cache).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'sales:fragments'
+DEFAULT_TTL = 300
+LISTS = ('orders', 'customers', 'products')
+
+
+def key(name):
+    return f'{KEY_PREFIX}:{name}'
+
+
+def ttl():
+    return getattr(settings, 'SALES_FRAGMENT_CACHE_TTL', DEFAULT_TTL)
+
+
+def version(name):
+    value = cache.get(key(name))
+    if value is None:
+        # Khởi tạo theo thời gian để không trùng phiên bản cũ nếu khoá bị cache đẩy ra
+        cache.add(key(name), time.time_ns(), timeout=None)
+        value = cache.get(key(name))
+    return value
+
+
+def last_modified(name):
+    """Thời điểm (epoch, giây) danh sách thay đổi lần cuối, dùng cho header Last-Modified."""
+    value = cache.get(f'{key(name)}:modified')
+    if value is None:
+        cache.add(f'{key(name)}:modified', int(time.time()), timeout=None)
+        value = cache.get(f'{key(name)}:modified')
+    return value
+
+
+def bump(*names):
+    now = int(time.time())
+    for name in names:
+        try:
+            cache.incr(key(name))
+        except ValueError:
+            pass
+        cache.set(f'{key(name)}:modified', now, timeout=None)
@@ -0,0 +1,146 @@
+"""
+Cache HTTP cho các endpoint danh mục (sản phẩm, khách hàng): ETag, Last-Modified và 304.
+
+Validator của response lấy từ phiên bản danh sách trong sales.fragments (tăng mỗi khi
+model được lưu/xoá), nên request có If-None-Match/If-Modified-Since còn đúng nhận 304
+mà không chạm DB; response JSON của API còn được cache theo phiên bản đó để request
+không có validator cũng không phải truy vấn và serialize lại.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from . import fragments, metrics
+
+KEY_PREFIX = 'sales:http'
+DEFAULT_TTL = 300
+CACHED_ACTIONS = ('list', 'retrieve')
+
+
+def ttl():
+    return getattr(settings, 'SALES_HTTP_CACHE_TTL', DEFAULT_TTL)
+
+
+def validators(name, *parts):
+    """(etag, last_modified) cho response phụ thuộc danh sách `name` và các phần còn lại (URL, user...)."""
+    digest = hashlib.md5('\n'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{fragments.version(name)}-{digest}"', fragments.last_modified(name)
+
+
+def entry_key(etag):
+    return KEY_PREFIX + ':' + etag.strip('"')
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Client được lưu nhưng phải hỏi lại mỗi lần (nhận 304 nếu không đổi)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def record(name, result, saved=0):
+    metrics.incr('http_cache_requests_total', resource=name, result=result)
+    if saved:
+        metrics.incr('http_cache_bytes_saved_total', saved, resource=name)
+
+
+class CachedResponseMixin:
+    """
+    Cache list/retrieve (JSON) của ViewSet theo phiên bản danh sách `cache_list`.
+
+    Khoá cache gồm URL đầy đủ (link phân trang là URL tuyệt đối) và media type; Browsable API
+    không được cache vì có thông tin của user.
+    """
+    cache_list = None
+
+    def cache_validators(self, request):
+        if self.action not in CACHED_ACTIONS or request.method != 'GET' \
+                or not isinstance(request.accepted_renderer, JSONRenderer):
+            return None
+        return validators(self.cache_list, request.build_absolute_uri(), request.accepted_media_type)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, super().retrieve, *args, **kwargs)
+
+    def cached(self, request, view, *args, **kwargs):
+        self.http_cache = self.cache_validators(request)
+        if self.http_cache is None:
+            return view(request, *args, **kwargs)
+        etag, last_modified = self.http_cache
+        key = entry_key(etag)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            entry = cache.get(key)
+            record(self.cache_list, 'not_modified', len(entry[0]) if entry else 0)
+            return set_validators(not_modified, etag, last_modified)
+        entry = cache.get(key)
+        if entry is not None:
+            record(self.cache_list, 'hit')
+            content, content_type = entry
+            return set_validators(HttpResponse(content, content_type=content_type), etag, last_modified)
+        record(self.cache_list, 'miss')
+        return view(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        cache_state = getattr(self, 'http_cache', None)
+        if cache_state and response.status_code == 200 and hasattr(response, 'render'):
+            etag, last_modified = cache_state
+            response.render()
+            cache.set(entry_key(etag), (response.content, response['Content-Type']), timeout=ttl())
+            set_validators(response, etag, last_modified)
+        if cache_state:
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+
+def summary():
+    """Tỉ lệ request không phải dựng lại response và số byte không phải gửi, theo từng danh sách."""
+    resources = {}
+    for name, labels, value in metrics.counters():
+        if name == 'http_cache_requests_total':
+            resources.setdefault(labels['resource'], {'hit': 0, 'miss': 0, 'not_modified': 0})[labels['result']] = value
+    for resource, stats in resources.items():
+        total = sum(stats.values())
+        stats['hit_ratio'] = round((stats['hit'] + stats['not_modified']) / total, 4) if total else 0.0
+        stats['bytes_saved'] = metrics.counter('http_cache_bytes_saved_total', resource=resource)
+    return resources
+
+
+def conditional_list(name):
+    """
+    ETag cho trang HTML hiển thị danh sách `name`: trả 304 khi danh sách và URL không đổi.
+
+    Trang HTML có tên user và token CSRF nên ETag tính cả user và cookie CSRF; nội dung
+    không được cache phía server (đã có cache fragment cho phần dòng).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(name, request.get_full_path(), request.user.pk,
+                                             request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                record(name, 'not_modified')
+            else:
+                record(name, 'miss')
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,357 @@
+import codecs
+import csv
+import logging
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import fragments, product_index, rollups, statistics
+from .models import Customer, Order, OrderLine, Product
+from .sequences import reserve_order_codes
+from .services import customer_name_key, update_totals
+
+logger = logging.getLogger(__name__)
+
+# Ánh xạ tên cột CSV tiếng Việt sang tên trường trong cơ sở dữ liệu
+COLUMN_MAPPING = {
+    'Thời gian tạo đơn': 'created_at',
+    'Mã đơn hàng': 'order_code',
+    'Mã khách hàng': 'customer_code',
+    'Tên khách hàng': 'customer_name',
+    'Mã PKKH': 'segment_code',
+    'Mô tả Phân Khúc Khách hàng': 'segment_description',
+    'Mã nhóm hàng': 'group_code',
+    'Tên nhóm hàng': 'group_name',
+    'Mã mặt hàng': 'product_code',
+    'Tên mặt hàng': 'product_name',
+    'SL': 'quantity',
+    'Đơn giá': 'price',
+    'Thành tiền': 'total_price'
+}
+
+DEFAULT_BATCH_SIZE = 2000
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class LineReader:
+    """
+    Đọc file nhị phân thành từng dòng str (utf-8-sig) cho csv, ghi lại vị trí byte đã đọc.
+
+    File được tách dòng trên bytes (byte \\n không nằm trong ký tự UTF-8 nhiều byte) nên ký tự
+    bị cắt giữa hai chunk vẫn được giải mã đúng. csv đọc từng dòng khi cần, nên ngay sau khi
+    nhận một bản ghi, `offset` là vị trí bắt đầu của bản ghi tiếp theo: có thể seek() tới đó
+    để đọc tiếp mà không phải parse lại phần đầu file.
+    """
+
+    def __init__(self, file, offset=0, chunk_size=None):
+        self.file = file
+        self.offset = offset
+        self.chunk_size = chunk_size or READ_CHUNK_SIZE
+
+    def __iter__(self):
+        pending = b''
+        if self.offset == 0:
+            pending = self.file.read(len(codecs.BOM_UTF8))
+            if pending == codecs.BOM_UTF8:
+                self.offset = len(pending)
+                pending = b''
+        for chunk in iter(lambda: self.file.read(self.chunk_size), b''):
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                self.offset += len(line) + 1
+                yield line.decode('utf-8') + '\n'
+        if pending:
+            self.offset += len(pending)
+            yield pending.decode('utf-8')
+
+
+def scan_rows(file, chunk_rows=None):
+    """
+    Đếm số dòng dữ liệu (không tính tiêu đề và dòng trống); nếu có `chunk_rows`, trả thêm vị trí
+    byte bắt đầu của mỗi khoảng chunk_rows dòng để các worker seek thẳng tới khoảng của mình.
+    """
+    reader = LineReader(file)
+    rows = csv.reader(reader)
+    next(rows, None)  # dòng tiêu đề
+    total, offsets = 0, []
+    while True:
+        start = reader.offset
+        row = next(rows, None)
+        if row is None:
+            break
+        if not row:
+            continue
+        if chunk_rows and total % chunk_rows == 0:
+            offsets.append(start)
+        total += 1
+    return total, offsets
+
+
+def save_upload(file):
+    """Lưu file upload xuống SALES_IMPORT_DIR để worker Celery đọc lại."""
+    os.makedirs(settings.SALES_IMPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.SALES_IMPORT_DIR, f'{uuid.uuid4().hex}.csv')
+    with open(path, 'wb') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    return path
+
+
+def parse_row(row):
+    """Chuyển một dòng CSV thành dict đã chuẩn hoá, trả về None nếu thiếu thông tin bắt buộc."""
+    data = {COLUMN_MAPPING[key]: value for key, value in row.items() if key in COLUMN_MAPPING}
+
+    if not data.get('customer_code') or not data.get('product_code') or not data.get('order_code'):
+        return None
+
+    created_at = parse_datetime(data.get('created_at') or '')
+    if created_at is None:
+        raise ValueError(f"invalid created_at {data.get('created_at')!r}")
+    if settings.USE_TZ and timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+
+    data['created_at'] = created_at
+    data['quantity'] = int(data['quantity'])
+    data['total_price'] = int(data['total_price'])
+    data['price'] = int(data.get('price') or 0)
+    data['segment_code'] = data.get('segment_code') or 'DEFAULT_SEGMENT_CODE'
+    data['segment_description'] = data.get('segment_description') or 'DEFAULT_SEGMENT_DESCRIPTION'
+    return data
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def finish(self):
+        self.finished_at = time.monotonic()
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+    def __str__(self):
+        return (f"{self.rows} rows in {self.elapsed:.1f}s ({self.rows_per_sec:,.0f} rows/s): "
+                f"{self.created} created, {self.updated} updated, {self.skipped} skipped, {self.errors} errors")
+
+
+class OrderImporter:
+    """
+    Import file CSV đơn hàng theo kiểu streaming.
+
+    Khách hàng và sản phẩm được tra qua map trong bộ nhớ (nạp theo lô), Order và OrderLine
+    được upsert bằng bulk_create(update_conflicts=True), mỗi lô một transaction riêng.
+    """
+
+    def __init__(self, batch_size=None, on_batch=None):
+        self.batch_size = batch_size or getattr(settings, 'SALES_IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        # on_batch(importer, next_row) được gọi trong transaction của mỗi lô để lưu tiến độ
+        self.on_batch = on_batch
+        self.customers = {}  # customer_code -> id
+        self.products = {}  # product_code -> id
+        self.stats = ImportStats()
+        self.offset = None  # vị trí byte của dòng tiếp theo sau dòng cuối đã đọc
+
+    def run(self, file, start_row=0, end_row=None, offset=None):
+        """
+        Import các dòng dữ liệu trong khoảng [start_row, end_row) (không tính dòng tiêu đề).
+
+        `offset` là vị trí byte của dòng start_row (xem scan_rows); khi có, chỉ dòng tiêu đề
+        được đọc từ đầu file rồi seek thẳng tới đó, không có thì đọc lướt các dòng trước start_row.
+        """
+        reader = LineReader(file)
+        rows = csv.DictReader(reader)
+        first_row = 0
+        if offset:
+            fieldnames = rows.fieldnames
+            file.seek(offset)
+            reader = LineReader(file, offset)
+            rows = csv.DictReader(reader, fieldnames)
+            first_row = start_row
+        self.offset = offset
+
+        batch = []
+        for row_number, row in enumerate(rows, start=first_row):
+            if row_number < start_row:
+                continue
+            if end_row is not None and row_number >= end_row:
+                break
+
+            self.offset = reader.offset
+            self.stats.rows += 1
+            try:
+                data = parse_row(row)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping row {row_number}: {e}")
+                self.stats.errors += 1
+                continue
+            if data is None:
+                self.stats.skipped += 1
+                continue
+
+            batch.append(data)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch, start_row + self.stats.rows)
+                batch = []
+
+        self.write_batch(batch, start_row + self.stats.rows)
+        self.stats.finish()
+        # Ghi hàng loạt không phát signal nên số liệu dashboard và các danh sách HTML phải tính lại
+        statistics.invalidate()
+        fragments.bump(*fragments.LISTS)
+        logger.info(f"Import finished: {self.stats}")
+        return self.stats
+
+    def write_batch(self, batch, next_row):
+        if not batch:
+            if self.on_batch:
+                with transaction.atomic():
+                    self.on_batch(self, next_row)
+            return
+
+        self.resolve_customers(batch)
+        self.resolve_products(batch)
+
+        # Dòng xuất hiện sau trong cùng lô sẽ ghi đè dòng trước (giống hành vi cập nhật cũ)
+        rows = {}
+        for data in batch:
+            rows[(data['order_code'], self.products[data['product_code']])] = data
+
+        try:
+            with transaction.atomic():
+                created, updated = self.upsert_orders(rows)
+                self.stats.created += created
+                # Các dòng trùng khoá trong lô cũng được tính là cập nhật
+                self.stats.updated += updated + len(batch) - len(rows)
+                if self.on_batch:
+                    self.on_batch(self, next_row)
+        except IntegrityError as e:
+            logger.error(f"Error saving batch of {len(batch)} rows: {e}")
+            self.stats.errors += len(batch)
+            if self.on_batch:
+                with transaction.atomic():
+                    self.on_batch(self, next_row)
+
+    def upsert_orders(self, rows):
+        # Header lấy khách hàng và thời gian từ dòng cuối cùng của mỗi mã đơn trong lô
+        headers = {order_code: data for (order_code, _), data in rows.items()}
+        # Ngày cũ của các đơn bị ghi đè cũng phải dựng lại bảng tổng hợp
+        previous = {
+            order_code: created_at
+            for order_code, created_at in Order.objects.filter(order_code__in=headers).values_list('order_code', 'created_at')
+        }
+        Order.objects.bulk_create(
+            [
+                Order(
+                    order_code=order_code,
+                    customer_id=self.customers[data['customer_code']],
+                    created_at=data['created_at'],
+                )
+                for order_code, data in headers.items()
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['order_code'],
+            update_fields=['customer', 'created_at'],
+        )
+        orders = dict(Order.objects.filter(order_code__in=headers).values_list('order_code', 'id'))
+        reserve_order_codes(headers)
+
+        existing = set(OrderLine.objects.filter(order_id__in=[orders[code] for code in previous])
+                       .values_list('order_id', 'product_id'))
+        lines = {(orders[order_code], product_id): data for (order_code, product_id), data in rows.items()}
+        OrderLine.objects.bulk_create(
+            [
+                OrderLine(order_id=key[0], product_id=key[1], quantity=data['quantity'], total_price=data['total_price'])
+                for key, data in lines.items()
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['order', 'product'],
+            update_fields=['quantity', 'total_price'],
+        )
+        update_totals(orders.values())
+        rollups.mark_dirty([data['created_at'] for data in headers.values()] + list(previous.values()))
+        updated = len(existing & lines.keys())
+        return len(lines) - updated, updated
+
+    def resolve_customers(self, batch):
+        missing = {}
+        for data in batch:
+            if data['customer_code'] not in self.customers:
+                missing.setdefault(data['customer_code'], data)
+        if not missing:
+            return
+
+        self.customers.update(Customer.objects.filter(customer_code__in=missing).values_list('customer_code', 'id'))
+        new_customers = [
+            Customer(
+                customer_code=code,
+                name=data.get('customer_name', ''),
+                # bulk_create không gửi pre_save nên phải tự gán khoá tên
+                name_key=customer_name_key(data.get('customer_name', '')),
+                segment_code=data['segment_code'],
+                segment_description=data['segment_description'],
+            )
+            for code, data in missing.items() if code not in self.customers
+        ]
+        if new_customers:
+            Customer.objects.bulk_create(new_customers, ignore_conflicts=True)
+            self.customers.update(Customer.objects.filter(
+                customer_code__in=[c.customer_code for c in new_customers]
+            ).values_list('customer_code', 'id'))
+
+    def resolve_products(self, batch):
+        missing = {}
+        for data in batch:
+            if data['product_code'] not in self.products:
+                missing.setdefault(data['product_code'], data)
+        if not missing:
+            return
+
+        self.products.update(Product.objects.filter(product_code__in=missing).values_list('product_code', 'id'))
+        new_products = [
+            Product(
+                product_code=code,
+                product_name=data.get('product_name', ''),
+                group_code=data.get('group_code', ''),
+                group_name=data.get('group_name', ''),
+                price=data['price'],
+            )
+            for code, data in missing.items() if code not in self.products
+        ]
+        if new_products:
+            Product.objects.bulk_create(new_products, ignore_conflicts=True)
+            created = dict(Product.objects.filter(
+                product_code__in=[p.product_code for p in new_products]
+            ).values_list('product_code', 'id'))
+            self.products.update(created)
+            # bulk_create không phát post_save nên phải báo cho index sản phẩm của chatbot
+            product_index.record_changes(created.values())
@@ -0,0 +1,124 @@
+import re
+import unicodedata
+
+# Chỉ dùng các pattern không có lượng từ lồng nhau để thời gian khớp tuyến tính theo độ dài tin nhắn
+TOKEN = re.compile(r'\S+')
+QUANTITY = re.compile(r'[0-9]{1,6}')
+ORDER_SEPARATOR = re.compile(r'[,;]|\bva\b|\band\b')
+NAME_PUNCTUATION = ' \t\r\n.!?:;"\'()'
+
+
+class FoldTable(dict):
+    """Bảng str.translate: mỗi ký tự -> một ký tự thường không dấu, tính lười và cache lại."""
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        if char in 'đĐ':
+            folded = 'd'
+        elif char.isspace():
+            folded = ' '
+        else:
+            folded = unicodedata.normalize('NFD', char.lower())[0]
+        if len(self) < 65536:
+            self[codepoint] = folded
+        return folded
+
+
+FOLD_TABLE = FoldTable()
+
+
+def normalize(text):
+    """Chữ thường và bỏ dấu tiếng Việt, giữ nguyên độ dài để vị trí khớp dùng được trên chuỗi gốc."""
+    return text.translate(FOLD_TABLE)
+
+
+class Message:
+    def __init__(self, text):
+        self.text = unicodedata.normalize('NFC', text)
+        self.normalized = normalize(self.text)
+
+
+def parse_order_items(message, start=0):
+    """Tách danh sách [số lượng, tên sản phẩm] từ message (tính từ vị trí start) trong một lượt."""
+    items = []
+    end = len(message.normalized)
+    for separator in ORDER_SEPARATOR.finditer(message.normalized, start):
+        item = parse_order_item(message, start, separator.start())
+        if item:
+            items.append(item)
+        start = separator.end()
+    item = parse_order_item(message, start, end)
+    if item:
+        items.append(item)
+    return items
+
+
+def parse_order_item(message, start, end):
+    tokens = list(TOKEN.finditer(message.normalized, start, end))
+    for i, token in enumerate(tokens[:-1]):
+        if QUANTITY.fullmatch(token.group()):
+            name = message.text[tokens[i + 1].start():tokens[-1].end()].strip(NAME_PUNCTUATION)
+            return [int(token.group()), name] if name else None
+    return None
+
+
+class Intent:
+    def __init__(self, name, pattern, handler, priority=0, extract=None):
+        self.name = name
+        self.pattern = re.compile(pattern) if pattern is not None else None
+        self.handler = handler
+        self.priority = priority
+        self.extract = extract
+
+    def match(self, message):
+        """Trả về dict slot nếu khớp, None nếu không."""
+        if self.pattern is None:
+            return {}
+        match = self.pattern.search(message.normalized)
+        if match is None:
+            return None
+        return self.extract(message, match) if self.extract else {}
+
+
+class IntentRouter:
+    """
+    Bảng intent của chatbot, thử lần lượt theo priority giảm dần.
+
+    Pattern được viết trên chuỗi đã chuẩn hoá (không dấu, chữ thường). Hàm extract
+    có thể trả về None để bỏ qua intent và thử intent tiếp theo.
+    """
+
+    def __init__(self):
+        self.intents = []
+        self.fallback = None
+
+    def intent(self, name, pattern, priority=0, extract=None):
+        def decorator(handler):
+            self.intents.append(Intent(name, pattern, handler, priority, extract))
+            self.intents.sort(key=lambda intent: -intent.priority)
+            return handler
+        return decorator
+
+    def default(self, handler):
+        self.fallback = Intent('fallback', None, handler)
+        return handler
+
+    def route(self, text):
+        message = Message(text)
+        for intent in self.intents:
+            slots = intent.match(message)
+            if slots is not None:
+                return intent, message, slots
+        return self.fallback, message, {}
+
+    def dispatch(self, text, **context):
+        intent, message, slots = self.route(text)
+        return intent.handler(message, slots, **context)
+
+
+router = IntentRouter()
+
+
+def extract_order(message, match):
+    items = parse_order_items(message, match.end())
+    return {'items': items} if items else None
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from sales import rollups
+from sales.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại các bảng tổng hợp doanh thu theo ngày cho dữ liệu lịch sử'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='YYYY-MM-DD, mặc định ngày có đơn hàng sớm nhất')
+        parser.add_argument('--end', type=date.fromisoformat, help='YYYY-MM-DD, mặc định ngày có đơn hàng muộn nhất')
+        parser.add_argument('--pending', action='store_true', help='Chỉ dựng lại các ngày đang được đánh dấu thay đổi')
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            self.stdout.write(f'Rebuilt {rollups.refresh()} pending day(s).')
+            return
+
+        bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            self.stdout.write('No orders to roll up.')
+            return
+        start = options['start'] or timezone.localdate(bounds['first'])
+        end = options['end'] or timezone.localdate(bounds['last'])
+        if start > end:
+            raise CommandError('--start must not be after --end.')
+
+        total = (end - start).days + 1
+        # Mỗi ngày là một transaction riêng nên có thể dừng và chạy lại giữa chừng
+        for number, day in enumerate(rollups.date_range(start, end), start=1):
+            rollups.rebuild_day(day)
+            if number % 30 == 0 or number == total:
+                self.stdout.write(f'Rebuilt {number:,}/{total:,} days (up to {day})')
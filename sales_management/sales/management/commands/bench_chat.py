@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from sales.benchmarks import percentile
+from sales.consumers import ChatConsumer
+from sales.tasks import process_chat_message
+
+
+class BlockingConsumer(ChatConsumer):
+    # Thiết kế cũ: giữ một luồng sync chờ task.get() rồi mới gửi câu trả lời
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        await self.save_message(data['message'])
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'chat_message', 'message': data['message'], 'username': self.user.username,
+        })
+        task = process_chat_message.apply_async((data['message'], self.user.username), ignore_result=False)
+        result = await sync_to_async(task.get)(timeout=10)
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'chat_message', 'message': result, 'username': 'System',
+        })
+
+
+class Command(BaseCommand):
+    help = ('Load test cho websocket chat: nhiều client giả gửi tin nhắn đồng thời, đo độ trễ '
+            'p50/p99 và số tin nhắn/giây. Cần Redis và worker Celery đang chạy.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--messages', type=int, default=20, help='Số tin nhắn mỗi client')
+        parser.add_argument('--text', default='xin chào')
+        parser.add_argument('--mode', choices=['blocking', 'non-blocking', 'both'], default='both')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        # Mỗi client là một user riêng (mỗi user một room)
+        users = [User.objects.get_or_create(username=f'bench_chat_{i}')[0] for i in range(options['clients'])]
+        modes = {'blocking': BlockingConsumer, 'non-blocking': ChatConsumer}
+        if options['mode'] != 'both':
+            modes = {options['mode']: modes[options['mode']]}
+
+        self.stdout.write(f"{'mode':14} {'msgs/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'errors':>8}")
+        for name, consumer in modes.items():
+            latencies, errors, elapsed = asyncio.run(self.run_clients(consumer, users, options))
+            self.stdout.write(
+                f'{name:14} {len(latencies) / elapsed:10.1f} {percentile(latencies, 50):10.1f} '
+                f'{percentile(latencies, 99):10.1f} {errors:8}'
+            )
+
+    async def run_clients(self, consumer, users, options):
+        application = consumer.as_asgi()
+        latencies = []
+        errors = 0
+
+        async def client(user):
+            nonlocal errors
+            communicator = WebsocketCommunicator(application, '/ws/chat/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                errors += options['messages']
+                return
+            try:
+                for _ in range(options['messages']):
+                    started = time.perf_counter()
+                    await communicator.send_to(text_data=json.dumps({
+                        'message': options['text'], 'username': user.username,
+                    }))
+                    # Bỏ qua bản echo tin nhắn của chính client, chờ câu trả lời của bot
+                    while True:
+                        event = json.loads(await communicator.receive_from(timeout=options['timeout']))
+                        if event.get('error'):
+                            errors += 1
+                            break
+                        if event.get('username') == 'System':
+                            latencies.append((time.perf_counter() - started) * 1000)
+                            break
+            except asyncio.TimeoutError:
+                errors += 1
+            finally:
+                await communicator.disconnect()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(user) for user in users))
+        return latencies, errors, time.perf_counter() - started
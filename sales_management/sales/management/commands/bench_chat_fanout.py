@@ -0,0 +1,53 @@
+import asyncio
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Đo chi phí fan-out của channel layer theo số kết nối: một room chung cho mọi socket '
+            '(thiết kế cũ) so với room riêng cho từng user')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', default='10,100,1000', help='Danh sách số kết nối, phân cách bởi dấu phẩy')
+        parser.add_argument('--messages', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'connections':>12} {'mode':>10} {'ms/message':>12} {'deliveries/message':>20}")
+        for connections in [int(value) for value in options['connections'].split(',')]:
+            for mode, (elapsed, deliveries) in asyncio.run(self.measure(connections, options['messages'])).items():
+                self.stdout.write(
+                    f"{connections:12} {mode:>10} {elapsed / options['messages'] * 1000:12.3f} "
+                    f"{deliveries / options['messages']:20.1f}"
+                )
+
+    async def measure(self, connections, messages):
+        layer = get_channel_layer()
+        prefix = f'bench_{uuid.uuid4().hex[:8]}'
+        channels = [await layer.new_channel() for _ in range(connections)]
+        event = {'type': 'chat_message', 'message': 'benchmark', 'username': 'System'}
+        results = {}
+
+        shared_group = f'{prefix}_shared'
+        for channel in channels:
+            await layer.group_add(shared_group, channel)
+        started = time.perf_counter()
+        for _ in range(messages):
+            await layer.group_send(shared_group, event)
+        results['shared'] = (time.perf_counter() - started, messages * connections)
+        for channel in channels:
+            await layer.group_discard(shared_group, channel)
+
+        user_groups = [f'{prefix}_user_{i}' for i in range(connections)]
+        for group, channel in zip(user_groups, channels):
+            await layer.group_add(group, channel)
+        started = time.perf_counter()
+        for i in range(messages):
+            await layer.group_send(user_groups[i % connections], event)
+        results['per-user'] = (time.perf_counter() - started, messages)
+        for group, channel in zip(user_groups, channels):
+            await layer.group_discard(group, channel)
+
+        return results
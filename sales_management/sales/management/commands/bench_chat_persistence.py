@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from sales.chat_buffer import ChatWriteBuffer
+from sales.models import Chat
+
+
+@sync_to_async
+def save_message(username, message):
+    # Cách cũ: tìm user theo username rồi INSERT từng tin nhắn
+    user = User.objects.get(username=username)
+    Chat.objects.create(user=user, message=message)
+
+
+class Command(BaseCommand):
+    help = ('Đo số tin nhắn chat/giây ghi được khi nhiều client gửi dồn dập: '
+            'mỗi tin nhắn hai truy vấn (cách cũ) so với bộ đệm ghi theo lô')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--messages', type=int, default=200, help='Số tin nhắn mỗi client')
+        parser.add_argument('--flush-size', type=int, default=100)
+        parser.add_argument('--flush-interval', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        users = [User.objects.get_or_create(username=f'bench_chat_{i}')[0] for i in range(options['clients'])]
+        total = len(users) * options['messages']
+        buffer = ChatWriteBuffer(options['flush_size'], options['flush_interval'])
+        modes = {
+            'per message': lambda user, text: save_message(user.username, text),
+            'write-behind': lambda user, text: buffer.add(user.id, text),
+        }
+
+        self.stdout.write(f"{'mode':14} {'msgs/s':>10} {'seconds':>9}")
+        for name, save in modes.items():
+            before = Chat.objects.count()
+            elapsed = asyncio.run(self.run_clients(users, options['messages'], save, buffer))
+            saved = Chat.objects.count() - before
+            assert saved == total, f'{name}: saved {saved} of {total} messages'
+            self.stdout.write(f'{name:14} {total / elapsed:10.1f} {elapsed:9.2f}')
+        Chat.objects.filter(user__in=users).delete()
+
+    async def run_clients(self, users, messages, save, buffer):
+        async def client(user):
+            for number in range(messages):
+                await save(user, f'benchmark {number}')
+                # Nhường event loop như giữa hai frame websocket
+                await asyncio.sleep(0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(user) for user in users))
+        # Tính cả lần ghi phần còn lại như khi socket đóng
+        await buffer.flush()
+        return time.perf_counter() - started
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from sales.benchmarks import seed, timed
+from sales.models import Customer
+from sales.services import autocomplete_customers, resolve_customer
+
+
+class Command(BaseCommand):
+    help = 'Đo thời gian gợi ý khách hàng theo tiền tố và tra khách theo tên trên bảng khách hàng lớn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--skip-seed', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            seed(customers=options['customers'], products=0, orders=0, batch_size=options['batch_size'],
+                 log=self.stdout.write)
+        last = Customer.objects.order_by('-id').values_list('name', flat=True).first()
+        if last is None:
+            self.stderr.write('No customers to search.')
+            return
+
+        repeat = options['repeat']
+        # Tên sinh sẵn cùng tiền tố "Khách hàng" nên "kh" khớp gần như cả bảng
+        variants = {
+            'autocomplete "kh"': lambda: autocomplete_customers('kh'),
+            'autocomplete "Khách hàng 12"': lambda: autocomplete_customers('Khách hàng 12'),
+            'autocomplete (no match)': lambda: autocomplete_customers('zzz'),
+            'resolve_customer (existing)': lambda: resolve_customer(last.upper()),
+            'get(name=...) (old, no index)': lambda: Customer.objects.filter(name=last).first(),
+        }
+        self.stdout.write(f"{'variant':32} {'median (ms)':>12} {'min (ms)':>10}")
+        for name, fn in variants.items():
+            median, fastest = timed(fn, repeat)
+            self.stdout.write(f'{name:32} {median:12.2f} {fastest:10.2f}')
@@ -0,0 +1,66 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from sales.benchmarks import adversarial_messages, timed
+from sales.intents import router
+import sales.tasks  # noqa: F401  (đăng ký các intent của chatbot)
+
+# Các regex của bộ định tuyến cũ, giữ lại để so sánh
+LEGACY_PATTERNS = [
+    r'\b(đặt hàng|mua).*(\d+\s+\w+(\s+\w+)*(\s+(và|,)\s+)?)+',
+    r'\b(xem|kiểm tra|lấy)\s+lịch sử\s+(mua hàng|đặt hàng)\b',
+    r'\b(Hi|Hello|xin chào)\b',
+]
+LEGACY_EXTRACT = r'(\d+)\s+([\w\s]+?)(?:,|\s+và\s+|$)'
+
+SAMPLE_MESSAGES = [
+    'Xin chào',
+    'Tôi muốn đặt hàng 2 bánh mì và 3 sữa tươi, 1 nước cam',
+    'xem lịch sử mua hàng',
+    'hôm nay trời đẹp quá',
+]
+
+
+def legacy_route(message):
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, message, re.IGNORECASE):
+            return re.findall(LEGACY_EXTRACT, message)
+    return None
+
+
+def router_route(message):
+    intent, parsed, slots = router.route(message)
+    return slots
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark intent router và thời gian xấu nhất trên bộ tin nhắn fuzz dài'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--length', type=int, default=2000, help='Độ dài tin nhắn fuzz')
+        parser.add_argument('--repeat', type=int, default=1000, help='Số lần lặp cho tin nhắn mẫu')
+        parser.add_argument('--legacy-timeout', type=float, default=10.0,
+                            help='Bỏ qua phần đo regex cũ nếu một tin nhắn chạy quá số giây này')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Sample messages (µs/message):')
+        for message in SAMPLE_MESSAGES:
+            legacy, _ = timed(lambda: [legacy_route(message) for _ in range(options['repeat'])], 3)
+            current, _ = timed(lambda: [router_route(message) for _ in range(options['repeat'])], 3)
+            self.stdout.write(f"  {message[:40]:42} legacy {legacy * 1000 / options['repeat']:8.1f}  "
+                              f"router {current * 1000 / options['repeat']:8.1f}")
+
+        self.stdout.write(f"Fuzz corpus, {options['length']} chars (ms):")
+        legacy_enabled = True
+        for label, message in adversarial_messages(options['length']):
+            current, _ = timed(lambda: router_route(message), 3)
+            legacy = '-'
+            if legacy_enabled:
+                started = time.perf_counter()
+                legacy_route(message)
+                elapsed = time.perf_counter() - started
+                legacy = f'{elapsed * 1000:.1f}'
+                legacy_enabled = elapsed < options['legacy_timeout']
+            self.stdout.write(f'  {label:26} legacy {legacy:>10}  router {current:8.2f}')
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from sales.benchmarks import ORDER_PREFIX, seed, timed
+from sales.models import Order, OrderLine
+
+
+class Command(BaseCommand):
+    help = 'Sinh dữ liệu đơn hàng và đo thời gian truy vấn của các view trước/sau khi có index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=3000000)
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--skip-seed', action='store_true')
+        parser.add_argument('--no-compare', action='store_true', help='Chỉ đo với index hiện tại')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            seed(options['customers'], options['products'], options['orders'], log=self.stdout.write)
+        self.analyze()
+
+        sample = OrderLine.objects.filter(order__order_code__startswith=ORDER_PREFIX).order_by('-id').values(
+            'order__order_code', 'order__customer_id', 'product_id').first()
+        if sample is None:
+            self.stderr.write('No benchmark data, run without --skip-seed first.')
+            return
+        codes = list(Order.objects.filter(order_code__startswith=ORDER_PREFIX)
+                     .order_by('-id').values_list('order_code', flat=True)[:2000])
+
+        queries = {
+            'order_detail (order_code)': lambda: list(
+                OrderLine.objects.filter(order__order_code=sample['order__order_code'])),
+            'get_order_history (customer, -created_at, -id)': lambda: list(
+                Order.objects.filter(customer_id=sample['order__customer_id']).order_by('-created_at', '-id')[:16]),
+            'order_list (created_at)': lambda: list(
+                Order.objects.order_by('created_at', 'id')[:1000]),
+            'orders_by_product (product, id)': lambda: list(
+                OrderLine.objects.filter(product_id=sample['product_id']).order_by('id')[:300]),
+            'importer lookup (order_code IN)': lambda: list(
+                Order.objects.filter(order_code__in=codes).values_list('order_code', 'created_at')),
+        }
+
+        after = {name: timed(query, options['repeat']) for name, query in queries.items()}
+        before = None
+        if not options['no_compare']:
+            with self.baseline_indexes():
+                before = {name: timed(query, options['repeat']) for name, query in queries.items()}
+
+        self.stdout.write(f"{'query':50} {'before (ms)':>12} {'after (ms)':>12}")
+        for name, (median, _) in after.items():
+            baseline = f'{before[name][0]:12.2f}' if before else f"{'-':>12}"
+            self.stdout.write(f'{name:50} {baseline} {median:12.2f}')
+
+    def analyze(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in (Order, OrderLine):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def index_names(self, model):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, model._meta.db_table))
+
+    @contextmanager
+    def baseline_indexes(self):
+        # Tạm thời quay về trạng thái không có index ghép: chỉ có index đơn trên các khoá ngoại.
+        # Kiểm tra tên index trước mỗi thao tác vì SQLite dựng lại bảng khi đổi constraint
+        # (trên SQLite ràng buộc unique nằm trong định nghĩa bảng nên vẫn còn ở chế độ "before").
+        fk_indexes = {
+            Order: [models.Index(fields=['customer'], name='bench_order_customer')],
+            OrderLine: [
+                models.Index(fields=['order'], name='bench_orderline_order'),
+                models.Index(fields=['product'], name='bench_orderline_product'),
+            ],
+        }
+        with connection.schema_editor() as editor:
+            for model, indexes in fk_indexes.items():
+                for constraint in model._meta.constraints:
+                    editor.remove_constraint(model, constraint)
+                for index in model._meta.indexes:
+                    if index.name in self.index_names(model):
+                        editor.remove_index(model, index)
+                for index in indexes:
+                    editor.add_index(model, index)
+        self.analyze()
+        try:
+            yield
+        finally:
+            with connection.schema_editor() as editor:
+                for model, indexes in fk_indexes.items():
+                    for index in indexes:
+                        if index.name in self.index_names(model):
+                            editor.remove_index(model, index)
+                    for constraint in model._meta.constraints:
+                        editor.add_constraint(model, constraint)
+                    for index in model._meta.indexes:
+                        if index.name not in self.index_names(model):
+                            editor.add_index(model, index)
+            self.analyze()
@@ -0,0 +1,103 @@
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from sales.benchmarks import LINES_PER_ORDER, PRODUCT_PREFIX, seed
+from sales.models import Customer, Order, OrderLine, Product
+from sales.views import SearchViewSet
+
+WHOLESALE_CODE = 'BW0'
+WHOLESALE_ORDER_PREFIX = 'BW'
+
+
+class Command(BaseCommand):
+    help = 'Đo bộ nhớ đỉnh và thời gian của orders_by_customer cho một khách sỉ có rất nhiều dòng đơn hàng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=500000)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--skip-legacy', action='store_true', help='Bỏ qua cách prefetch không giới hạn cũ')
+
+    def handle(self, *args, **options):
+        customer = self.seed_wholesale(options['lines'], options['products'], options['batch_size'])
+        self.factory = APIRequestFactory()
+        self.user = User.objects.filter(is_staff=True).first() or User.objects.create(username='bench_api', is_staff=True)
+        self.view = SearchViewSet.as_view({'get': 'orders_by_customer'})
+        # CustomPagination trả một khách mỗi trang, theo thứ tự id
+        self.page = Customer.objects.filter(id__lte=customer.id).count()
+
+        variants = {
+            'paged prefetch': lambda: self.request(),
+            'lean rows': lambda: self.request(lean='true'),
+        }
+        if not options['skip_legacy']:
+            variants = {'unbounded prefetch (old)': lambda: legacy_orders_by_customer(customer.id), **variants}
+
+        self.stdout.write(f"{'variant':28} {'time (ms)':>12} {'peak memory (MB)':>18}")
+        for name, fn in variants.items():
+            started = time.perf_counter()
+            fn()
+            elapsed = (time.perf_counter() - started) * 1000
+            tracemalloc.start()
+            fn()
+            peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+            self.stdout.write(f'{name:28} {elapsed:12.1f} {peak:18.2f}')
+
+    def request(self, **params):
+        request = self.factory.get('/sales/api/search/orders_by_customer/', {'page': self.page, **params})
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        assert response.status_code == 200, response.data
+        return response.render()
+
+    def seed_wholesale(self, lines, products, batch_size):
+        seed(customers=1, products=products, orders=0, batch_size=batch_size, log=self.stdout.write)
+        customer, _ = Customer.objects.get_or_create(customer_code=WHOLESALE_CODE, defaults={
+            'name': 'Khách sỉ benchmark', 'segment_code': 'SEG0', 'segment_description': 'Phân khúc 0'})
+        product_ids = list(Product.objects.filter(product_code__startswith=PRODUCT_PREFIX)
+                           .order_by('id').values_list('id', flat=True))
+        now = timezone.now()
+        start = Order.objects.filter(customer=customer).count()
+        total = -(-lines // LINES_PER_ORDER)
+        per_batch = max(batch_size // LINES_PER_ORDER, 1)
+        for first in range(start, total, per_batch):
+            orders = [
+                Order(
+                    order_code=f'{WHOLESALE_ORDER_PREFIX}{order_number:08d}',
+                    customer=customer,
+                    created_at=now - timedelta(minutes=order_number),
+                    total_price=1000 * LINES_PER_ORDER,
+                )
+                for order_number in range(first, min(first + per_batch, total))
+            ]
+            Order.objects.bulk_create(orders)
+            # LINES_PER_ORDER sản phẩm khác nhau mỗi đơn để không vi phạm ràng buộc unique
+            OrderLine.objects.bulk_create([
+                OrderLine(order=order, product_id=product_ids[(first + number + line) % len(product_ids)],
+                          quantity=1, total_price=1000)
+                for number, order in enumerate(orders) for line in range(LINES_PER_ORDER)
+            ])
+            self.stdout.write(f'Seeded {(first + len(orders)) * LINES_PER_ORDER:,}/{lines:,} wholesale order lines')
+        return customer
+
+
+def legacy_orders_by_customer(customer_id):
+    # Cách cũ: Prefetch không giới hạn, nạp toàn bộ đơn và dòng đơn hàng thành model
+    customers = Customer.objects.filter(id=customer_id).prefetch_related(
+        Prefetch('orders', queryset=Order.objects.prefetch_related(
+            Prefetch('lines', queryset=OrderLine.objects.select_related('product')))))
+    return [
+        [(order.order_code, order.created_at, order.total_price,
+          [(line.product.product_name, line.product.product_code, line.quantity, line.total_price)
+           for line in order.lines.all()])
+         for order in customer.orders.all()]
+        for customer in customers
+    ]
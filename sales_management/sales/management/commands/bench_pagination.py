@@ -0,0 +1,70 @@
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from sales.benchmarks import seed, timed
+from sales.models import Order
+from sales.pagination import SalesCursorPagination
+from sales.views import OrderViewSet
+
+
+class Command(BaseCommand):
+    help = 'Đo thời gian trang 1 và trang sâu của /api/orders/ với từng kiểu phân trang'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=3000000)
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--page', type=int, default=10000, help='Trang sâu cần đo')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--skip-seed', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            seed(options['customers'], options['products'], options['orders'], log=self.stdout.write)
+
+        page, page_size = options['page'], options['page_size']
+        if Order.objects.count() < page * page_size:
+            self.stderr.write(f'Need at least {page * page_size:,} orders for page {page:,}.')
+            return
+
+        self.factory = APIRequestFactory()
+        self.user = User.objects.filter(is_staff=True).first() or User.objects.create(username='bench_api', is_staff=True)
+        self.view = OrderViewSet.as_view({'get': 'list'})
+
+        modes = {
+            'page number': {},
+            'page number, count=false': {'count': 'false'},
+            'cursor': {'pagination': 'cursor'},
+        }
+        self.stdout.write(f"{'mode':28} {'page 1 (ms)':>12} {f'page {page:,} (ms)':>16}")
+        for name, params in modes.items():
+            first = self.time_request({**params, 'page_size': page_size}, options['repeat'])
+            if name == 'cursor':
+                deep_params = {'cursor': self.deep_cursor(page, page_size), 'page_size': page_size, **params}
+            else:
+                deep_params = {**params, 'page': page, 'page_size': page_size}
+            deep = self.time_request(deep_params, options['repeat'])
+            self.stdout.write(f'{name:28} {first:12.2f} {deep:16.2f}')
+
+    def time_request(self, params, repeat):
+        def run():
+            request = self.factory.get('/sales/api/orders/', params)
+            force_authenticate(request, user=self.user)
+            response = self.view(request)
+            assert response.status_code == 200, response.data
+            response.render()
+        return timed(run, repeat)[0]
+
+    def deep_cursor(self, page, page_size):
+        # Cursor trỏ tới vị trí bắt đầu trang `page`, giống như client đã đi theo các link next
+        created_at = (Order.objects.order_by('-created_at', '-id')
+                      .values_list('created_at', flat=True)[(page - 1) * page_size - 1])
+        paginator = SalesCursorPagination()
+        paginator.base_url = 'http://testserver/sales/api/orders/'
+        url = paginator.encode_cursor(Cursor(offset=1, reverse=False, position=str(created_at)))
+        return parse_qs(urlparse(url).query)['cursor'][0]
@@ -0,0 +1,61 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from sales.benchmarks import timed
+from sales.models import Product
+from sales.product_index import ProductIndex
+
+WORDS = ['bánh', 'mì', 'sữa', 'tươi', 'nước', 'cam', 'táo', 'trà', 'xanh', 'cà', 'phê', 'đường', 'muối',
+         'gạo', 'thơm', 'dầu', 'ăn', 'kẹo', 'dừa', 'mứt', 'gừng', 'bột', 'ngọt', 'chua', 'cay', 'hộp', 'gói']
+
+
+def synthetic_catalog(size, seed=0):
+    rng = random.Random(seed)
+    for i in range(size):
+        name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4)))
+        yield i + 1, f'P{i:05d}', f'{name} {i}', rng.randint(1, 500) * 1000
+
+
+def strip_marks(text):
+    from sales.intents import normalize
+    return normalize(text)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark index tên sản phẩm trong bộ nhớ trên catalog giả lập (mặc định 100k sản phẩm)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--db', action='store_true',
+                            help='So sánh với truy vấn icontains cũ trên bảng Product hiện có')
+
+    def handle(self, *args, **options):
+        catalog = list(synthetic_catalog(options['products']))
+        build_ms, _ = timed(lambda: ProductIndex(catalog), 1)
+        index = ProductIndex(catalog)
+        self.stdout.write(f'Built index of {len(index):,} products in {build_ms:.0f} ms')
+
+        sample = catalog[len(catalog) // 2][2]
+        queries = {
+            'exact': sample,
+            'prefix': sample.split()[0] + ' ' + sample.split()[1],
+            'no diacritics': strip_marks(sample),
+            'no spaces': sample.replace(' ', ''),
+            'typo (fuzzy)': sample[:3] + sample[4:],
+            'no match': 'xyzxyz',
+        }
+        for label, query in queries.items():
+            elapsed, _ = timed(lambda: [index.search(query) for _ in range(options['repeat'])], 3)
+            best = index.best(query)
+            self.stdout.write(f"  {label:15} {elapsed * 1000 / options['repeat']:8.1f} µs  -> {best.product_name if best else None}")
+
+        if options['db']:
+            for label, query in queries.items():
+                name = query.strip()
+                elapsed, _ = timed(lambda: Product.objects.filter(
+                    Q(product_name__icontains=name) | Q(product_name__icontains=name.replace(' ', ''))
+                ).first(), 5)
+                self.stdout.write(f'  db icontains {label:15} {elapsed * 1000:8.1f} µs')
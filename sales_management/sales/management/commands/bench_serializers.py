@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from sales.benchmarks import seed, timed
+from sales.fast import FastJSONRenderer, get_plan, prefetch_querysets
+from sales.views import CustomerViewSet, OrderLineViewSet, OrderViewSet, ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Đo số dòng/giây khi serialize một trang lớn bằng ModelSerializer so với FieldPlan + orjson (sales.fast)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Số dòng mỗi trang')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--skip-seed', action='store_true')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if not options['skip_seed']:
+            # Mỗi Order có 3 dòng: đủ `rows` đơn hàng cho trang /api/orders/
+            seed(customers=rows, products=max(rows // 5, 2000), orders=rows * 3, log=self.stdout.write)
+
+        self.stdout.write(f"{'endpoint':12} {'serializer (rows/s)':>20} {'fast path (rows/s)':>20} {'speedup':>8}")
+        for name, viewset in [('customers', CustomerViewSet), ('products', ProductViewSet),
+                              ('orders', OrderViewSet), ('orderlines', OrderLineViewSet)]:
+            queryset = viewset.queryset.all()[:rows]
+            serializer_class = viewset.serializer_class
+            plan = get_plan(serializer_class, queryset.model)
+            prefetches = prefetch_querysets(queryset)
+
+            def standard():
+                return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+            def fast():
+                return FastJSONRenderer().render(plan.dump(plan.rows(queryset.all()), prefetches))
+
+            assert standard() == fast(), f'{name}: fast path output differs'
+            count = len(queryset)
+            standard_ms, _ = timed(standard, options['repeat'])
+            fast_ms, _ = timed(fast, options['repeat'])
+            self.stdout.write(f'{name:12} {count / standard_ms * 1000:20,.0f} {count / fast_ms * 1000:20,.0f} '
+                              f'{standard_ms / fast_ms:7.1f}x')
@@ -0,0 +1,98 @@
+"""
+Bộ đếm và histogram số liệu vận hành trong bộ nhớ của tiến trình (không chạm DB hay cache).
+
+Mỗi số liệu có tên và nhãn (kiểu Prometheus); mỗi tiến trình giữ số của riêng nó.
+prometheus() xuất tất cả theo định dạng text của Prometheus (xem /sales/metrics/).
+"""
+import bisect
+import threading
+from collections import defaultdict
+
+# Ngưỡng bucket (giây) mặc định cho histogram độ trễ
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_histograms = {}  # (tên, nhãn) -> [buckets, [số lần theo bucket, +Inf ở cuối], tổng, số lần]
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def incr(name, value=1, **labels):
+    with _lock:
+        _counters[(name, labels_key(labels))] += value
+
+
+def counter(name, **labels):
+    return _counters.get((name, labels_key(labels)), 0)
+
+
+def counters():
+    """[(tên, {nhãn}, giá trị)] theo thứ tự tên, dùng cho endpoint số liệu."""
+    with _lock:
+        items = sorted(_counters.items())
+    return [(name, dict(labels), value) for (name, labels), value in items]
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    with _lock:
+        entry = _histograms.get((name, labels_key(labels)))
+        if entry is None:
+            entry = _histograms[(name, labels_key(labels))] = [buckets, [0] * (len(buckets) + 1), 0.0, 0]
+        entry[1][bisect.bisect_left(entry[0], value)] += 1
+        entry[2] += value
+        entry[3] += 1
+
+
+def histograms():
+    """[(tên, {nhãn}, [(ngưỡng, số lần cộng dồn)...], tổng, số lần)] theo thứ tự tên."""
+    with _lock:
+        items = sorted((key, (buckets, list(counts), total, count)) for key, (buckets, counts, total, count) in _histograms.items())
+    result = []
+    for (name, labels), (buckets, counts, total, count) in items:
+        cumulative, running = [], 0
+        for bound, value in zip(buckets + (float('inf'),), counts):
+            running += value
+            cumulative.append((bound, running))
+        result.append((name, dict(labels), cumulative, total, count))
+    return result
+
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def prometheus():
+    """Toàn bộ bộ đếm và histogram theo định dạng text exposition 0.0.4 của Prometheus."""
+    lines = []
+    declared = set()
+    for name, labels, value in counters():
+        if name not in declared:
+            declared.add(name)
+            lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    for name, labels, buckets, total, count in histograms():
+        if name not in declared:
+            declared.add(name)
+            lines.append(f'# TYPE {name} histogram')
+        for bound, value in buckets:
+            lines.append(f'{name}_bucket{format_labels(labels, le=format_bound(bound))} {value}')
+        lines.append(f'{name}_sum{format_labels(labels)} {total}')
+        lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,29 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser, User
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+@database_sync_to_async
+def get_user_from_token(token):
+    try:
+        user_id = AccessToken(token)[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return AnonymousUser()
+    return User.objects.filter(id=user_id, is_active=True).first() or AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Xác thực websocket bằng JWT trong query string (?token=...) mà frontend React gửi lên."""
+
+    async def __call__(self, scope, receive, send):
+        user = scope.get('user')
+        if user is None or not user.is_authenticated:
+            token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+            if token:
+                scope = dict(scope, user=await get_user_from_token(token[0]))
+        return await super().__call__(scope, receive, send)
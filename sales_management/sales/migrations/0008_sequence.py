@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:58
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_order_code_sequence(apps, schema_editor):
+    # Bắt đầu bộ đếm sau mã ORD####### lớn nhất hiện có
+    OrderDetail = apps.get_model('sales', 'OrderDetail')
+    Sequence = apps.get_model('sales', 'Sequence')
+    last_order_code = (OrderDetail.objects
+                       .filter(order_code__regex=r'^ORD[0-9]{7}$')
+                       .aggregate(Max('order_code'))['order_code__max'])
+    next_value = int(last_order_code[3:]) + 1 if last_order_code else 1
+    Sequence.objects.update_or_create(name='order_code', defaults={'next_value': next_value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_importjob_importchunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_order_code_sequence, migrations.RunPython.noop),
+    ]
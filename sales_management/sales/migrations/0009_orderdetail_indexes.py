@@ -0,0 +1,58 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def remove_duplicate_order_lines(apps, schema_editor):
+    # Gộp các dòng trùng (order_code, customer, product) vào dòng có id nhỏ nhất trước khi thêm
+    # ràng buộc unique: luồng chat cũ tạo ra chúng (vd "2 X và 3 X") nên phải cộng dồn số lượng/tiền
+    OrderDetail = apps.get_model('sales', 'OrderDetail')
+    duplicates = (OrderDetail.objects
+                  .values('order_code', 'customer_id', 'product_id')
+                  .annotate(lines=Count('id'), keep_id=Min('id'), lines_quantity=Sum('quantity'), lines_total=Sum('total_price'))
+                  .filter(lines__gt=1))
+    for group in duplicates.iterator():
+        OrderDetail.objects.filter(id=group['keep_id']).update(quantity=group['lines_quantity'], total_price=group['lines_total'])
+        (OrderDetail.objects
+         .filter(order_code=group['order_code'], customer_id=group['customer_id'], product_id=group['product_id'])
+         .exclude(id=group['keep_id'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_sequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderdetail',
+            index=models.Index(fields=['created_at', 'id'], name='orderdetail_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderdetail',
+            index=models.Index(fields=['customer', '-created_at'], name='orderdetail_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderdetail',
+            index=models.Index(fields=['product', 'id'], name='orderdetail_product_idx'),
+        ),
+        migrations.AlterField(
+            model_name='orderdetail',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.customer'),
+        ),
+        migrations.AlterField(
+            model_name='orderdetail',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.product'),
+        ),
+        migrations.RunPython(remove_duplicate_order_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderdetail',
+            constraint=models.UniqueConstraint(fields=('order_code', 'customer', 'product'), name='unique_order_line'),
+        ),
+    ]
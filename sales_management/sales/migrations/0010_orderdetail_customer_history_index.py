@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_orderdetail_indexes'),
+    ]
+
+    operations = [
+        # Tạo index mới trước khi bỏ index cũ để truy vấn lịch sử không lúc nào mất index
+        migrations.AddIndex(
+            model_name='orderdetail',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='orderdetail_customer_hist_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='orderdetail',
+            name='orderdetail_customer_idx',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_orderdetail_customer_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['timestamp', 'id'], name='chat_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_chat_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySegmentSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('lines', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('segment_code', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('marked_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCustomerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('lines', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyProductGroupSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('lines', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('group_code', models.TextField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group_code', 'date'], name='daily_group_sales_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductgroupsales',
+            constraint=models.UniqueConstraint(fields=('date', 'group_code'), name='unique_daily_group_sales'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysegmentsales',
+            index=models.Index(fields=['segment_code', 'date'], name='daily_segment_sales_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysegmentsales',
+            constraint=models.UniqueConstraint(fields=('date', 'segment_code'), name='unique_daily_segment_sales'),
+        ),
+        migrations.AddIndex(
+            model_name='dailycustomersales',
+            index=models.Index(fields=['customer', 'date'], name='daily_customer_sales_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycustomersales',
+            constraint=models.UniqueConstraint(fields=('date', 'customer'), name='unique_daily_customer_sales'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-18 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_code', models.CharField(max_length=10, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('total_price', models.BigIntegerField(default=0)),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='sales.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='order_created_idx'), models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_hist_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('total_price', models.IntegerField()),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='sales.order')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='sales.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'id'], name='orderline_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'product'), name='unique_order_product')],
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+from django.db import migrations, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def update_totals(Order, OrderLine, order_ids):
+    line_totals = (OrderLine.objects.filter(order=OuterRef('pk')).values('order')
+                   .annotate(total=Sum('total_price')).values('total'))
+    Order.objects.filter(id__in=order_ids).update(total_price=Coalesce(Subquery(line_totals), 0))
+
+
+def copy_order_details(apps, schema_editor):
+    """
+    Chuyển OrderDetail sang Order + OrderLine theo từng lô id, mỗi lô một transaction ngắn
+    nên không khoá bảng lâu.
+
+    Dòng đầu tiên (id nhỏ nhất) của mỗi mã đơn quyết định khách hàng và thời gian của đơn;
+    các dòng cũ trùng (mã đơn, sản phẩm) nhưng khác khách hàng được cộng dồn vào một dòng.
+    """
+    OrderDetail = apps.get_model('sales', 'OrderDetail')
+    Order = apps.get_model('sales', 'Order')
+    OrderLine = apps.get_model('sales', 'OrderLine')
+
+    # Hai bảng mới chỉ do migration này ghi: lần chạy trước bị dừng giữa chừng thì chép lại từ đầu
+    OrderLine.objects.all().delete()
+    Order.objects.all().delete()
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            details = list(OrderDetail.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'order_code', 'customer_id', 'product_id', 'created_at', 'quantity', 'total_price')[:BATCH_SIZE])
+            if not details:
+                return
+            last_id = details[-1][0]
+
+            headers = {}
+            for _, order_code, customer_id, _, created_at, _, _ in details:
+                headers.setdefault(order_code, (customer_id, created_at))
+            Order.objects.bulk_create([
+                Order(order_code=order_code, customer_id=customer_id, created_at=created_at)
+                for order_code, (customer_id, created_at) in headers.items()
+            ], ignore_conflicts=True)
+            orders = dict(Order.objects.filter(order_code__in=headers).values_list('order_code', 'id'))
+
+            lines = {}
+            for _, order_code, _, product_id, _, quantity, total_price in details:
+                key = (orders[order_code], product_id)
+                previous = lines.get(key, (0, 0))
+                lines[key] = (previous[0] + quantity, previous[1] + total_price)
+            existing = set(OrderLine.objects.filter(order_id__in=orders.values())
+                           .values_list('order_id', 'product_id'))
+            for (order_id, product_id), (quantity, total_price) in lines.items():
+                if (order_id, product_id) in existing:
+                    OrderLine.objects.filter(order_id=order_id, product_id=product_id).update(
+                        quantity=F('quantity') + quantity, total_price=F('total_price') + total_price)
+            OrderLine.objects.bulk_create([
+                OrderLine(order_id=order_id, product_id=product_id, quantity=quantity, total_price=total_price)
+                for (order_id, product_id), (quantity, total_price) in lines.items()
+                if (order_id, product_id) not in existing
+            ])
+            update_totals(Order, OrderLine, orders.values())
+
+
+def restore_order_details(apps, schema_editor):
+    OrderDetail = apps.get_model('sales', 'OrderDetail')
+    OrderLine = apps.get_model('sales', 'OrderLine')
+
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            lines = list(OrderLine.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'order__order_code', 'order__customer_id', 'product_id', 'order__created_at',
+                'quantity', 'total_price')[:BATCH_SIZE])
+            if not lines:
+                return
+            last_id = lines[-1][0]
+            OrderDetail.objects.bulk_create([
+                OrderDetail(order_code=order_code, customer_id=customer_id, product_id=product_id,
+                            created_at=created_at, quantity=quantity, total_price=total_price)
+                for _, order_code, customer_id, product_id, created_at, quantity, total_price in lines
+            ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    # Mỗi lô tự commit thay vì bọc cả bảng trong một transaction
+    atomic = False
+
+    dependencies = [
+        ('sales', '0013_order_orderline'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_order_details, restore_order_details),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.0.14 on 2026-10-18 16:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0014_copy_order_details'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='OrderDetail',
+        ),
+    ]
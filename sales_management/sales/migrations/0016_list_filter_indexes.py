@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0015_delete_orderdetail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['segment_code', 'customer_code'], name='customer_segment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['group_code', 'product_code'], name='product_group_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:40
+
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 5000
+
+
+def fold_char(char):
+    if char in 'đĐ':
+        return 'd'
+    if char.isspace():
+        return ' '
+    return unicodedata.normalize('NFD', char.lower())[0]
+
+
+def customer_name_key(name):
+    # Bản sao của sales.services.customer_name_key lúc tạo migration: migration không được phụ thuộc
+    # code ứng dụng có thể đổi sau này (chữ thường, bỏ dấu tiếng Việt, gộp khoảng trắng, tối đa 100 ký tự)
+    name = unicodedata.normalize('NFC', name or '')
+    return ' '.join(''.join(fold_char(char) for char in name).split())[:100]
+
+
+def fill_name_keys(apps, schema_editor):
+    # Mỗi lô id một transaction ngắn, không khoá cả bảng khách hàng
+    Customer = apps.get_model('sales', 'Customer')
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            customers = list(Customer.objects.filter(id__gt=last_id).order_by('id').only('id', 'name')[:BATCH_SIZE])
+            if not customers:
+                return
+            last_id = customers[-1].id
+            for customer in customers:
+                customer.name_key = customer_name_key(customer.name)
+            Customer.objects.bulk_update(customers, ['name_key'])
+
+
+def create_autocomplete_index(apps, schema_editor):
+    # PostgreSQL so sánh theo collation của CSDL; gợi ý theo tiền tố cần index theo thứ tự byte (collation "C")
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS customer_name_key_c_idx '
+            'ON sales_customer ((name_key COLLATE "C"), id)'
+        )
+
+
+def drop_autocomplete_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS customer_name_key_c_idx')
+
+
+class Migration(migrations.Migration):
+    # Backfill theo lô và CREATE INDEX CONCURRENTLY không chạy được trong một transaction
+    atomic = False
+
+    dependencies = [
+        ('sales', '0016_list_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['name_key', 'id'], name='customer_name_key_idx'),
+        ),
+        migrations.RunPython(create_autocomplete_index, drop_autocomplete_index),
+    ]
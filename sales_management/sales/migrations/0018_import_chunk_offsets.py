@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-18 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0017_customer_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importchunk',
+            name='committed_offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importchunk',
+            name='start_offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
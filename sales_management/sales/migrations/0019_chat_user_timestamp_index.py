@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-18 16:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0018_import_chunk_offsets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='chat_user_timestamp_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='chat',
+            name='chat_timestamp_idx',
+        ),
+        migrations.AlterField(
+            model_name='chat',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,16 +1,27 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     customer_code = models.TextField(unique=True)
     name = models.CharField(max_length=100)
+    # Tên chữ thường, bỏ dấu, gộp khoảng trắng (services.customer_name_key), gán trong signal pre_save
+    name_key = models.CharField(max_length=100, default='', editable=False)
     segment_code = models.TextField()
     segment_description = models.TextField()
     
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            # Lọc customer_list theo phân khúc, giữ thứ tự customer_code cho keyset
+            models.Index(fields=['segment_code', 'customer_code'], name='customer_segment_idx'),
+            # Tìm khách theo tên khi nhập đơn và gợi ý theo tiền tố (services.autocomplete_customers)
+            models.Index(fields=['name_key', 'id'], name='customer_name_key_idx'),
+        ]
+
 class Product(models.Model):
     product_code = models.CharField(max_length=6, unique=True)
     product_name = models.CharField(max_length=100)
@@ -20,20 +31,53 @@ class Product(models.Model):
     
     def __str__(self):
         return self.product_name
+
+    class Meta:
+        indexes = [
+            # Lọc product_list theo nhóm hàng và lọc order_list theo nhóm hàng của các dòng
+            models.Index(fields=['group_code', 'product_code'], name='product_group_idx'),
+        ]
     
-class OrderDetail(models.Model):
-    order_code = models.CharField(max_length=10)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+class Order(models.Model):
+    order_code = models.CharField(max_length=10, unique=True)
+    # Index đơn trên khoá ngoại được thay bằng index ghép trong Meta
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False, related_name='orders')
     created_at = models.DateTimeField()
+    # Tổng thành tiền các dòng, lưu sẵn để không phải cộng lại khi đọc (xem services.update_totals)
+    total_price = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'Order: {self.order_code}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+            # Keyset (created_at, id) giảm dần cho lịch sử mua hàng theo khách hàng
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_hist_idx'),
+        ]
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, db_index=False, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False, related_name='order_lines')
     quantity = models.IntegerField()
     total_price = models.IntegerField()
-    
+
     def __str__(self):
-        return f'Order: {self.order_code} - Product: {self.product.product_name}'
+        return f'Order: {self.order_id} - Product: {self.product.product_name}'
+
+    class Meta:
+        constraints = [
+            # Cũng phục vụ nạp các dòng theo order (cột đầu của index)
+            models.UniqueConstraint(fields=['order', 'product'], name='unique_order_product'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'id'], name='orderline_product_idx'),
+        ]
     
 class Chat(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Index đơn của user thừa: chat_user_timestamp_idx bắt đầu bằng user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     
@@ -41,4 +85,143 @@ class Chat(models.Model):
         return f"{self.user.username}: {self.message}"
     class Meta:
         ordering = ['-timestamp']
-        
\ No newline at end of file
+        indexes = [
+            # Lịch sử chat luôn lọc theo user rồi sắp (timestamp, id), khớp cursor của ChatViewSet
+            models.Index(fields=['user', 'timestamp', 'id'], name='chat_user_timestamp_idx'),
+        ]
+        
+
+class ImportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    file_name = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_rows = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Import #{self.id}: {self.file_name} ({self.status})'
+
+    def progress(self):
+        totals = self.chunks.aggregate(
+            processed_rows=models.Sum(models.F('committed_row') - models.F('start_row')),
+            created_rows=models.Sum('created_rows'),
+            updated_rows=models.Sum('updated_rows'),
+            skipped_rows=models.Sum('skipped_rows'),
+            error_rows=models.Sum('error_rows'),
+        )
+        totals = {key: value or 0 for key, value in totals.items()}
+        totals['errors'] = list(self.chunks.exclude(last_error='').values_list('last_error', flat=True))
+
+        throughput = eta = None
+        if self.started_at:
+            elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+            if elapsed > 0:
+                throughput = totals['processed_rows'] / elapsed
+            if throughput and self.total_rows is not None and self.status == self.STATUS_RUNNING:
+                eta = (self.total_rows - totals['processed_rows']) / throughput
+        totals['throughput'] = round(throughput, 1) if throughput is not None else None
+        totals['eta_seconds'] = round(eta, 1) if eta is not None else None
+        return totals
+
+
+class ImportChunk(models.Model):
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name='chunks')
+    start_row = models.IntegerField()
+    end_row = models.IntegerField()
+    # Dòng tiếp theo cần import; được cập nhật cùng transaction với mỗi lô nên có thể resume
+    committed_row = models.IntegerField()
+    # Vị trí byte của start_row và committed_row trong file để worker seek thẳng tới, không parse lại
+    # từ đầu file (null với các khoảng tạo trước khi có cột này)
+    start_offset = models.BigIntegerField(null=True, blank=True)
+    committed_offset = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=ImportJob.STATUS_CHOICES, default=ImportJob.STATUS_PENDING)
+    created_rows = models.IntegerField(default=0)
+    updated_rows = models.IntegerField(default=0)
+    skipped_rows = models.IntegerField(default=0)
+    error_rows = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'Import #{self.job_id} rows {self.start_row}-{self.end_row} ({self.status})'
+
+    class Meta:
+        ordering = ['start_row']
+
+
+class Sequence(models.Model):
+    # Bộ đếm dùng chung (ví dụ mã đơn hàng); mỗi worker giữ một khối số để ít truy cập DB
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f'{self.name}: {self.next_value}'
+
+
+class DailySales(models.Model):
+    # Bảng tổng hợp theo ngày (giờ địa phương), được dựng lại từng ngày từ OrderLine (xem sales/rollups.py)
+    date = models.DateField()
+    lines = models.IntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySegmentSales(DailySales):
+    segment_code = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'segment_code'], name='unique_daily_segment_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['segment_code', 'date'], name='daily_segment_sales_idx'),
+        ]
+
+
+class DailyProductGroupSales(DailySales):
+    group_code = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'group_code'], name='unique_daily_group_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['group_code', 'date'], name='daily_group_sales_idx'),
+        ]
+
+
+class DailyCustomerSales(DailySales):
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'customer'], name='unique_daily_customer_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['customer', 'date'], name='daily_customer_sales_idx'),
+        ]
+
+
+class RollupDirtyDay(models.Model):
+    # Ngày có đơn hàng thay đổi, chờ task refresh_rollups dựng lại
+    date = models.DateField(unique=True)
+    marked_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.date} (marked {self.marked_at})'
@@ -0,0 +1,320 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.http import urlencode
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+
+def query_int(request, name, default, maximum=None, minimum=1):
+    """Đọc tham số số nguyên từ query string, báo lỗi 400 thay vì để giá trị sai đi xuống ORM."""
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid integer is required.'})
+    if value < minimum:
+        raise ValidationError({name: f'Ensure this value is greater than or equal to {minimum}.'})
+    return min(value, maximum) if maximum else value
+
+
+def query_date(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Date has wrong format. Use YYYY-MM-DD.'})
+
+
+class SalesPageNumberPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class CountlessPageNumberPagination(SalesPageNumberPagination):
+    """
+    Phân trang theo số trang nhưng bỏ COUNT(*): lấy thêm một bản ghi để biết còn trang sau.
+
+    Response không có trường count; vẫn tốn OFFSET nên trang sâu chậm dần, dùng cursor nếu cần duyệt hết.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_page_message)
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties'].pop('count', None)
+        schema['required'] = ['results']
+        return schema
+
+
+class SalesCursorPagination(BasePagination):
+    """
+    Phân trang cursor cho API (?pagination=cursor) theo keyset của KeysetPaginator.
+
+    CursorPagination của DRF chỉ đưa cột đầu của ordering vào cursor; với ('-created_at', '-id')
+    các đơn trùng created_at bị phân trang bằng offset trong cùng vị trí. Ở đây cursor giữ
+    giá trị của mọi cột nên trang nào cũng chỉ là WHERE + LIMIT.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+    invalid_cursor_message = CursorPagination.invalid_cursor_message
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = [self.ordering] if isinstance(self.ordering, str) else list(self.ordering)
+        paginator = KeysetPaginator(queryset, ordering, page_size=api_settings.PAGE_SIZE, max_page_size=self.max_page_size)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor and paginator.decode(cursor) is None:
+            raise NotFound(self.invalid_cursor_message)
+        self.page = paginator.get_page(request)
+        return list(self.page)
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encode_keyset(position, reverse))
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_position, False)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_position, True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return CursorPagination().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        paginator = CursorPagination()
+        paginator.page_size_query_param = self.page_size_query_param
+        return paginator.get_schema_operation_parameters(view)
+
+
+class SwitchablePagination(BasePagination):
+    """
+    Chọn kiểu phân trang theo query param cho từng request.
+
+    - mặc định: page number như cũ (có count);
+    - ?count=false: page number không chạy COUNT(*);
+    - ?pagination=cursor: keyset theo `cursor_ordering` của view (phải khớp một index),
+      chi phí không phụ thuộc độ sâu trang.
+    """
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+    default_cursor_ordering = '-id'
+
+    def __init__(self):
+        self.delegate = SalesPageNumberPagination()
+
+    def get_delegate(self, request, view=None):
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            paginator = SalesCursorPagination()
+            paginator.ordering = getattr(view, 'cursor_ordering', self.default_cursor_ordering)
+            return paginator
+        if request.query_params.get(self.count_query_param, '').lower() in FALSE_VALUES:
+            return CountlessPageNumberPagination()
+        return SalesPageNumberPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.get_delegate(request, view)
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.delegate.get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return self.delegate.display_page_controls
+
+    def to_html(self):
+        return self.delegate.to_html()
+
+    def get_results(self, data):
+        return self.delegate.get_results(data)
+
+    def get_schema_operation_parameters(self, view):
+        return self.delegate.get_schema_operation_parameters(view)
+
+
+class KeysetPage:
+    def __init__(self, object_list, query, next_position=None, previous_position=None):
+        self.object_list = object_list
+        self.query = query
+        self.next_position = next_position
+        self.previous_position = previous_position
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_position is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_position is not None
+
+    def url(self, position, reverse):
+        query = self.query.copy()
+        query[KeysetPaginator.cursor_query_param] = encode_keyset(position, reverse)
+        return f'?{urlencode(query, doseq=True)}'
+
+    def next_url(self):
+        return self.url(self.next_position, False) if self.has_next else None
+
+    def previous_url(self):
+        return self.url(self.previous_position, True) if self.has_previous else None
+
+    def first_url(self):
+        query = self.query.copy()
+        query.pop(KeysetPaginator.cursor_query_param, None)
+        return f'?{urlencode(query, doseq=True)}'
+
+
+class KeysetEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cắt datetime/time còn mili giây; vị trí keyset phải đúng tới micro giây,
+    # nếu không các dòng cùng mili giây với vị trí sẽ bị bỏ qua
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_keyset(position, reverse):
+    data = json.dumps([reverse, position], cls=KeysetEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+class KeysetPaginator:
+    """
+    Phân trang keyset (?cursor=...) cho các trang HTML: không COUNT, không OFFSET.
+
+    `ordering` phải kết thúc bằng cột duy nhất (thường là id) và khớp một index; cursor
+    không hợp lệ quay về trang đầu giống Paginator.get_page.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, queryset, ordering, page_size=50, max_page_size=200):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.fields = [queryset.model._meta.get_field(field.lstrip('-')) for field in ordering]
+
+    def get_page_size(self, request):
+        try:
+            return max(1, min(int(request.GET[self.page_size_query_param]), self.max_page_size))
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode(self, cursor):
+        try:
+            reverse, position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(position) != len(self.fields):
+                return None
+            return bool(reverse), [field.to_python(value) for field, value in zip(self.fields, position)]
+        except (binascii.Error, ValueError, TypeError, DjangoValidationError):
+            return None
+
+    def position(self, obj):
+        return [getattr(obj, field.attname) for field in self.fields]
+
+    def after(self, position, reverse):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y); chiều so sánh theo từng cột của ordering
+        condition, equal = Q(), {}
+        for ordering, field, value in zip(self.ordering, self.fields, position):
+            lookup = 'lt' if ordering.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{field.name}__{lookup}': value})
+            equal[field.name] = value
+        return condition
+
+    def get_page(self, request):
+        page_size = self.get_page_size(request)
+        cursor = self.decode(request.GET.get(self.cursor_query_param, ''))
+        reverse, position = cursor or (False, None)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        queryset = self.queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position, reverse))
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        next_position = previous_position = None
+        if rows and reverse:
+            # Đi lùi từ một trang sau nên luôn còn trang sau
+            previous_position = self.position(rows[0]) if has_more else None
+            next_position = self.position(rows[-1])
+        elif rows:
+            next_position = self.position(rows[-1]) if has_more else None
+            previous_position = self.position(rows[0]) if position is not None else None
+        return KeysetPage(rows, request.GET, next_position, previous_position)
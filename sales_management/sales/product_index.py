@@ -0,0 +1,241 @@
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .intents import normalize
+from .models import Product
+
+VERSION_KEY = 'sales:product_index:version'
+CHANGE_KEY_PREFIX = 'sales:product_index:change'
+CHANGE_TIMEOUT = 3600
+MAX_INCREMENTAL_CHANGES = 500
+DEFAULT_CHECK_INTERVAL = 5  # giây giữa hai lần kiểm tra phiên bản trên cache
+
+# Điểm xếp hạng theo kiểu khớp; cùng điểm thì tên ngắn hơn (gần với truy vấn hơn) đứng trước
+EXACT, COMPACT, PREFIX, CONTAINS, FUZZY = 1.0, 0.95, 0.9, 0.8, 0.7
+FUZZY_THRESHOLD = 0.45
+FUZZY_POSTINGS_BUDGET = 10000
+
+
+def fold(text):
+    return ' '.join(normalize(text).split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductEntry:
+    __slots__ = ('id', 'product_code', 'product_name', 'price', 'key', 'compact', 'grams')
+
+    def __init__(self, id, product_code, product_name, price):
+        self.id = id
+        self.product_code = product_code
+        self.product_name = product_name
+        self.price = price
+        self.key = fold(product_name)
+        self.compact = self.key.replace(' ', '')
+        self.grams = trigrams(self.key)
+
+    def __repr__(self):
+        return f'<ProductEntry {self.id} {self.product_name!r}>'
+
+
+class ProductIndex:
+    """
+    Chỉ mục tên sản phẩm trong bộ nhớ cho chatbot.
+
+    Hỗ trợ khớp chính xác, bỏ khoảng trắng, tiền tố, chuỗi con và gần đúng
+    (trigram), tất cả đều không phân biệt hoa thường và dấu tiếng Việt.
+    """
+
+    def __init__(self, products=(), version=None):
+        self.version = version
+        self.entries = {}
+        self.exact = defaultdict(set)
+        self.compact = defaultdict(set)
+        self.keys = []  # danh sách (key, id) đã sắp xếp để tìm tiền tố bằng bisect
+        self.postings = defaultdict(set)
+        for product in products:
+            self.add(*product, sort=False)
+        self.keys.sort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, id, product_code, product_name, price, sort=True):
+        if id in self.entries:
+            self.remove(id)
+        entry = ProductEntry(id, product_code, product_name, price)
+        self.entries[id] = entry
+        self.exact[entry.key].add(id)
+        self.compact[entry.compact].add(id)
+        if sort:
+            bisect.insort(self.keys, (entry.key, id))
+        else:
+            self.keys.append((entry.key, id))
+        for gram in entry.grams:
+            self.postings[gram].add(id)
+
+    def remove(self, id):
+        entry = self.entries.pop(id, None)
+        if entry is None:
+            return
+        self.exact[entry.key].discard(id)
+        self.compact[entry.compact].discard(id)
+        position = bisect.bisect_left(self.keys, (entry.key, id))
+        if position < len(self.keys) and self.keys[position] == (entry.key, id):
+            del self.keys[position]
+        for gram in entry.grams:
+            self.postings[gram].discard(id)
+
+    def search(self, query, limit=5):
+        """Trả về tối đa `limit` cặp (điểm, ProductEntry), điểm cao nhất trước."""
+        key = fold(query)
+        if not key:
+            return []
+        scores = {}
+
+        def hit(ids, score):
+            for id in ids:
+                if scores.get(id, 0) < score:
+                    scores[id] = score
+
+        hit(self.exact.get(key, ()), EXACT)
+        hit(self.compact.get(key.replace(' ', ''), ()), COMPACT)
+
+        position = bisect.bisect_left(self.keys, (key,))
+        while position < len(self.keys) and self.keys[position][0].startswith(key) and len(scores) < limit * 4:
+            hit((self.keys[position][1],), PREFIX)
+            position += 1
+
+        # Chỉ tìm gần đúng khi không có kết quả khớp chính xác / tiền tố
+        if not scores:
+            self.fuzzy(key, limit, hit)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], len(self.entries[item[0]].key), item[0]))
+        return [(score, self.entries[id]) for id, score in ranked[:limit]]
+
+    def fuzzy(self, key, limit, hit):
+        # Lấy ứng viên từ các trigram hiếm nhất trước, giới hạn tổng số posting phải duyệt
+        query_grams = trigrams(key)
+        shared = Counter()
+        visited = 0
+        for gram in sorted(query_grams, key=lambda gram: len(self.postings.get(gram, ()))):
+            ids = self.postings.get(gram)
+            if not ids:
+                continue
+            if shared and visited + len(ids) > FUZZY_POSTINGS_BUDGET:
+                break
+            shared.update(ids)
+            visited += len(ids)
+
+        for id, _ in shared.most_common(limit * 20):
+            entry = self.entries[id]
+            if key in entry.key:
+                hit((id,), CONTAINS)
+                continue
+            similarity = 2 * len(query_grams & entry.grams) / (len(query_grams) + len(entry.grams))
+            if similarity >= FUZZY_THRESHOLD:
+                hit((id,), FUZZY * similarity)
+
+    def best(self, query):
+        results = self.search(query, limit=1)
+        return results[0][1] if results else None
+
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def change_key(version):
+    return f'{CHANGE_KEY_PREFIX}:{version}'
+
+
+def load_index():
+    cache.add(VERSION_KEY, 0, timeout=None)
+    version = cache.get(VERSION_KEY)
+    products = Product.objects.values_list('id', 'product_code', 'product_name', 'price').iterator(chunk_size=5000)
+    return ProductIndex(products, version=version)
+
+
+def refresh(index):
+    """Áp các thay đổi đã ghi trên cache kể từ phiên bản của index; dựng lại toàn bộ nếu thiếu dữ liệu."""
+    current = cache.get(VERSION_KEY)
+    if current == index.version:
+        return index
+    if current is None or index.version is None or not 0 < current - index.version <= MAX_INCREMENTAL_CHANGES:
+        return load_index()
+
+    keys = [change_key(version) for version in range(index.version + 1, current + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return load_index()
+
+    ids = set(changes.values())
+    rows = {row[0]: row for row in Product.objects.filter(id__in=ids).values_list(
+        'id', 'product_code', 'product_name', 'price')}
+    for id in ids:
+        if id in rows:
+            index.add(*rows[id])
+        else:
+            index.remove(id)
+    index.version = current
+    return index
+
+
+def get_index():
+    """Index dùng chung của tiến trình, định kỳ cập nhật theo các thay đổi từ tiến trình khác."""
+    global _index, _checked_at
+    interval = getattr(settings, 'SALES_PRODUCT_INDEX_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    with _lock:
+        now = time.monotonic()
+        if _index is None:
+            _index, _checked_at = load_index(), now
+        elif now - _checked_at >= interval:
+            _index, _checked_at = refresh(_index), now
+        return _index
+
+
+def bump_version(product_id=None):
+    cache.add(VERSION_KEY, 0, timeout=None)
+    version = cache.incr(VERSION_KEY)
+    if product_id is not None:
+        cache.set(change_key(version), product_id, timeout=CHANGE_TIMEOUT)
+    else:
+        # Xoá bản ghi cũ (nếu khoá phiên bản từng bị mất) để các tiến trình buộc phải dựng lại
+        cache.delete(change_key(version))
+
+
+def refresh_local():
+    global _index
+    with _lock:
+        if _index is not None:
+            _index = refresh(_index)
+
+
+def record_change(product_id=None):
+    """Ghi nhận sản phẩm thay đổi; product_id=None buộc mọi tiến trình dựng lại index."""
+    bump_version(product_id)
+    refresh_local()
+
+
+def record_changes(product_ids):
+    product_ids = list(product_ids)
+    if len(product_ids) > MAX_INCREMENTAL_CHANGES:
+        bump_version()
+    else:
+        for product_id in product_ids:
+            bump_version(product_id)
+    refresh_local()
+
+
+def invalidate():
+    """Dùng sau các thao tác ghi hàng loạt (bulk_create) không phát signal."""
+    record_change(None)
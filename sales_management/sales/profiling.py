@@ -0,0 +1,266 @@
+"""
+Đo truy vấn DB theo từng đơn vị công việc: request HTTP, tin nhắn websocket, task Celery.
+
+Mỗi đơn vị có một QueryProfile ghi số truy vấn, tổng thời gian DB, các truy vấn lặp lại
+nguyên văn (cùng SQL và tham số) và các mẫu N+1: cùng một câu SQL (bỏ giá trị) được gọi từ
+cùng một dòng code từ SALES_QUERY_NPLUSONE_THRESHOLD lần trở lên.
+
+Bật bằng SALES_QUERY_PROFILER (middleware HTTP, hook Celery, ChatConsumer.receive); kết quả
+cộng dồn vào sales.metrics (xem /sales/api/metrics/) và ghi log JSON một dòng mỗi đơn vị.
+Trong test dùng trực tiếp, không cần bật setting:
+
+    with profiling.profile('test', 'orders') as p:
+        ...
+    p.check(max_queries=5)
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NPLUSONE_THRESHOLD = 5
+# Các profile đang chạy (lồng nhau: task chạy eager trong request ghi vào cả hai); contextvar
+# được asgiref chép sang luồng của sync_to_async nên truy vấn của consumer vẫn được tính
+_active = ContextVar('sales_query_profiles', default=())
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+SPACES = re.compile(r'\s+')
+PROJECT_DIR = str(settings.BASE_DIR)
+
+
+def enabled():
+    return getattr(settings, 'SALES_QUERY_PROFILER', False)
+
+
+def nplusone_threshold():
+    return getattr(settings, 'SALES_QUERY_NPLUSONE_THRESHOLD', DEFAULT_NPLUSONE_THRESHOLD)
+
+
+def fingerprint(sql):
+    """Câu SQL bỏ giá trị: chuỗi, số và danh sách IN (...) dài ngắn khác nhau được coi là một."""
+    sql = STRINGS.sub('?', sql)
+    sql = NUMBERS.sub('?', sql)
+    sql = IN_LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def call_site():
+    """File:dòng (hàm) trong code của project gần nhất đã gọi truy vấn, bỏ qua Django và thư viện."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR) and 'site-packages' not in filename and filename != __file__:
+            return f'{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return '?'
+
+
+class QueryProfile:
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()  # (sql, params) -> số lần, để đếm truy vấn lặp nguyên văn
+        self.sites = Counter()  # (call site, fingerprint) -> số lần
+
+    def add(self, sql, params, duration, site):
+        self.queries += 1
+        self.db_time += duration
+        try:
+            self.statements[(sql, repr(params))] += 1
+        except TypeError:
+            pass
+        self.sites[(site, fingerprint(sql))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def nplusone(self, threshold=None):
+        """[(call site, fingerprint, số lần)] của các câu SQL bị gọi lặp từ cùng một chỗ."""
+        threshold = threshold or nplusone_threshold()
+        return [(site, sql, count) for (site, sql), count in self.sites.most_common() if count >= threshold]
+
+    def report(self):
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'duplicates': self.duplicates,
+            'nplusone': [{'site': site, 'sql': sql, 'count': count} for site, sql, count in self.nplusone()],
+        }
+
+    def check(self, max_queries=None, nplusone=False):
+        """Dùng trong test: AssertionError kèm báo cáo nếu vượt số truy vấn hoặc có mẫu N+1."""
+        problems = []
+        if max_queries is not None and self.queries > max_queries:
+            problems.append(f'{self.queries} queries > budget {max_queries}')
+        if not nplusone and self.nplusone():
+            problems.append('N+1 query pattern')
+        if problems:
+            raise AssertionError(f"{self.kind} {self.name}: {', '.join(problems)}\n{json.dumps(self.report(), indent=2, ensure_ascii=False)}")
+
+    def record(self):
+        labels = {'kind': self.kind, 'unit': self.name}
+        metrics.incr('query_profile_units_total', **labels)
+        metrics.incr('query_profile_queries_total', self.queries, **labels)
+        metrics.incr('query_profile_db_ms_total', round(self.db_time * 1000, 2), **labels)
+        metrics.incr('query_profile_duplicates_total', self.duplicates, **labels)
+        report = self.report()
+        for item in report['nplusone']:
+            metrics.incr('query_nplusone_total', site=item['site'], **labels)
+        if report['nplusone']:
+            logger.warning(f'query_profile {json.dumps(report, ensure_ascii=False)}')
+        else:
+            logger.info(f'query_profile {json.dumps(report, ensure_ascii=False)}')
+
+
+def record_query(execute, sql, params, many, context):
+    profiles = _active.get()
+    if not profiles:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        site = call_site()
+        for profile in profiles:
+            profile.add(sql, params, duration, site)
+
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def connection_opened(sender, connection, **kwargs):
+    install(connection)
+
+
+def start(kind, name):
+    # Kết nối mới (luồng mới của sync_to_async/worker) được gắn qua connection_created;
+    # kết nối đã có của luồng hiện tại gắn ở đây
+    for connection in connections.all():
+        install(connection)
+    profile = QueryProfile(kind, name)
+    return profile, _active.set(_active.get() + (profile,))
+
+
+def stop(token):
+    _active.reset(token)
+
+
+@contextmanager
+def profile(kind, name, record=False):
+    """Đo các truy vấn trong khối with; `record=True` cộng vào sales.metrics và ghi log."""
+    current, token = start(kind, name)
+    try:
+        yield current
+    finally:
+        stop(token)
+        if record:
+            current.record()
+
+
+@contextmanager
+def track(kind, name):
+    """Như profile(record=True) nhưng chỉ khi bật SALES_QUERY_PROFILER."""
+    if not enabled():
+        yield None
+        return
+    with profile(kind, name, record=True) as current:
+        yield current
+
+
+class QueryProfilerMiddleware:
+    """Một QueryProfile cho mỗi request HTTP, đặt tên theo view (url name) và method."""
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        current, token = start('http', '')
+        try:
+            response = self.get_response(request)
+        finally:
+            stop(token)
+        match = request.resolver_match
+        # Không dùng path làm tên: mỗi id/URL lạ sẽ thành một nhãn riêng trong sales.metrics
+        current.name = f"{request.method} {match.view_name if match else '<unmatched>'}"
+        current.record()
+        return response
+
+
+_tasks = {}
+
+
+def task_started(task_id=None, task=None, **kwargs):
+    if not enabled():
+        return
+    _tasks[task_id] = start('task', task.name)
+
+
+def task_finished(task_id=None, **kwargs):
+    entry = _tasks.pop(task_id, None)
+    if entry is not None:
+        current, token = entry
+        try:
+            stop(token)
+        except ValueError:
+            # Token tạo ở context khác (worker đổi luồng giữa prerun và postrun): chỉ bỏ khỏi danh sách
+            _active.set(tuple(p for p in _active.get() if p is not current))
+        current.record()
+
+
+def connect():
+    """Gắn hook cho kết nối DB mới và task Celery; gọi từ SalesConfig.ready() khi profiler bật."""
+    from celery.signals import task_postrun, task_prerun
+
+    connection_created.connect(connection_opened, dispatch_uid='sales.profiling')
+    task_prerun.connect(task_started, dispatch_uid='sales.profiling')
+    task_postrun.connect(task_finished, dispatch_uid='sales.profiling')
+
+
+def summary():
+    """Trung bình số truy vấn/thời gian DB theo đơn vị và các call site N+1, cho endpoint số liệu."""
+    units = {}
+    fields = {
+        'query_profile_units_total': 'count',
+        'query_profile_queries_total': 'queries',
+        'query_profile_db_ms_total': 'db_ms',
+        'query_profile_duplicates_total': 'duplicates',
+    }
+    for name, labels, value in metrics.counters():
+        if name in fields or name == 'query_nplusone_total':
+            unit = units.setdefault(f"{labels['kind']} {labels['unit']}", {
+                'count': 0, 'queries': 0, 'db_ms': 0, 'duplicates': 0, 'nplusone': {}})
+            if name in fields:
+                unit[fields[name]] = value
+            else:
+                unit['nplusone'][labels['site']] = value
+    for unit in units.values():
+        unit['avg_queries'] = round(unit['queries'] / unit['count'], 2) if unit['count'] else 0.0
+        unit['avg_db_ms'] = round(unit['db_ms'] / unit['count'], 2) if unit['count'] else 0.0
+        unit['db_ms'] = round(unit['db_ms'], 2)
+    return units
@@ -0,0 +1,116 @@
+"""
+Bảng tổng hợp doanh thu theo ngày (DailySegmentSales, DailyProductGroupSales, DailyCustomerSales).
+
+Mỗi thay đổi đơn hàng chỉ đánh dấu ngày (giờ địa phương) của nó vào RollupDirtyDay sau commit; task
+refresh_rollups dựng lại từng ngày bẩn bằng vài câu GROUP BY trên một ngày dữ liệu, nhờ vậy
+sửa/xoá/import đều đúng mà không cần theo dõi chênh lệch.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import DailyCustomerSales, DailyProductGroupSales, DailySegmentSales, OrderLine, RollupDirtyDay
+from .services import advisory_xact_lock
+
+# dimension -> (model tổng hợp, cột khoá trong bảng tổng hợp, đường dẫn tương ứng từ OrderLine)
+DIMENSIONS = {
+    'segment': (DailySegmentSales, 'segment_code', 'order__customer__segment_code'),
+    'group': (DailyProductGroupSales, 'group_code', 'product__group_code'),
+    'customer': (DailyCustomerSales, 'customer_id', 'order__customer_id'),
+}
+SCHEDULE_KEY = 'sales:rollups:scheduled'
+DEFAULT_REFRESH_DELAY = 10
+REFRESH_BATCH_DAYS = 31
+
+
+def day_bounds(date):
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    return start, timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min))
+
+
+def mark_dirty(datetimes):
+    """Đánh dấu các ngày của `datetimes` cần dựng lại và hẹn lịch refresh, cả hai sau khi transaction commit."""
+    dates = {timezone.localdate(value) for value in datetimes if value is not None}
+    if not dates:
+        return
+    # Mọi đơn trong ngày cùng upsert một dòng RollupDirtyDay: ghi trong transaction của đơn hàng
+    # thì các transaction tạo đơn phải chờ khoá dòng đó của nhau tới lúc commit
+    transaction.on_commit(lambda: save_dirty_days(dates))
+
+
+def save_dirty_days(dates):
+    now = timezone.now()
+    # Đánh dấu lại một ngày đang được refresh sẽ cập nhật marked_at nên ngày đó không bị xoá khỏi hàng đợi
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(date=date, marked_at=now) for date in dates],
+        update_conflicts=True, unique_fields=['date'], update_fields=['marked_at'],
+    )
+    schedule_refresh()
+
+
+def schedule_refresh():
+    # Gộp nhiều thay đổi liên tiếp vào một lần refresh
+    from .tasks import refresh_rollups
+
+    delay = getattr(settings, 'SALES_ROLLUP_REFRESH_DELAY', DEFAULT_REFRESH_DELAY)
+    if cache.add(SCHEDULE_KEY, True, timeout=delay):
+        refresh_rollups.apply_async(countdown=delay)
+
+
+def lock_day(date):
+    advisory_xact_lock(f'sales:rollups:{date.isoformat()}')
+
+
+def rebuild_day(date):
+    """
+    Dựng lại mọi bảng tổng hợp của một ngày từ OrderLine.
+
+    Hai refresh có thể chạy chồng nhau (ngày được đánh dấu lại trong lúc refresh sẽ hẹn một
+    refresh mới), nên việc xoá rồi ghi lại một ngày được tuần tự hoá bằng advisory lock theo
+    ngày: refresh sau chờ refresh trước commit rồi mới đọc và dựng lại.
+    """
+    start, end = day_bounds(date)
+    orders = OrderLine.objects.filter(order__created_at__gte=start, order__created_at__lt=end)
+    with transaction.atomic():
+        lock_day(date)
+        for model, key, source in DIMENSIONS.values():
+            model.objects.filter(date=date).delete()
+            rows = (orders.values(source)
+                    .annotate(lines=Count('id'), quantity=Sum('quantity'), revenue=Sum('total_price'))
+                    .values_list(source, 'lines', 'quantity', 'revenue'))
+            model.objects.bulk_create([
+                model(date=date, lines=lines, quantity=quantity, revenue=revenue, **{key: value})
+                for value, lines, quantity, revenue in rows
+            ], batch_size=1000)
+
+
+def refresh(batch_days=REFRESH_BATCH_DAYS):
+    """
+    Dựng lại các ngày được đánh dấu trước thời điểm bắt đầu, mỗi lượt tối đa `batch_days` ngày.
+
+    Ngày bị đánh dấu lại trong lúc đang chạy được giữ lại cho lần refresh đã hẹn sau đó.
+    Trả về số ngày đã dựng lại.
+    """
+    cache.delete(SCHEDULE_KEY)
+    started = timezone.now()
+    refreshed = 0
+    while True:
+        dirty = list(RollupDirtyDay.objects.filter(marked_at__lte=started)
+                     .order_by('date').values_list('date', flat=True)[:batch_days])
+        if not dirty:
+            return refreshed
+        for date in dirty:
+            rebuild_day(date)
+        RollupDirtyDay.objects.filter(date__in=dirty, marked_at__lte=started).delete()
+        refreshed += len(dirty)
+
+
+def date_range(start, end):
+    date = start
+    while date <= end:
+        yield date
+        date += timedelta(days=1)
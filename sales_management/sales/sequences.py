@@ -0,0 +1,95 @@
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Sequence
+
+DEFAULT_BLOCK_SIZE = 20
+ORDER_CODE = re.compile(r'ORD([0-9]{7})')
+
+
+class BlockAllocator:
+    """
+    Cấp số tăng dần từ một dòng Sequence theo từng khối.
+
+    Mỗi tiến trình giữ một khối [next, end) trong bộ nhớ, chỉ khi hết khối mới
+    khoá dòng Sequence để lấy khối tiếp theo. Số không dùng hết của một khối sẽ bị
+    bỏ qua (mã có thể không liên tục) nhưng không bao giờ bị cấp trùng.
+    """
+
+    def __init__(self, name, block_size=None):
+        self.name = name
+        self.block_size = block_size or getattr(settings, 'SALES_SEQUENCE_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+        self.reset()
+
+    def reset(self):
+        # Gọi lại sau khi fork: tiến trình con không được dùng khối của tiến trình cha
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self.reserve_block()
+            value = self._next
+            self._next += 1
+            return value
+
+    def discard(self):
+        """Bỏ phần còn lại của khối đang giữ, lần cấp sau lấy khối mới từ DB."""
+        with self._lock:
+            self._next = self._end = 0
+
+    def advance_past(self, value):
+        """Các khối lấy từ DB sau này chỉ chứa số lớn hơn `value` (số đã được dùng từ bên ngoài)."""
+        if not Sequence.objects.filter(name=self.name, next_value__lte=value).update(next_value=value + 1):
+            Sequence.objects.get_or_create(name=self.name, defaults={'next_value': value + 1})
+        with self._lock:
+            if self._next <= value < self._end:
+                self._next = self._end = 0
+
+    def reserve_block(self):
+        while True:
+            try:
+                with transaction.atomic():
+                    # UPDATE trước để giữ khoá dòng tới khi commit, các worker khác phải chờ
+                    sequence = Sequence.objects.filter(name=self.name)
+                    if not sequence.update(next_value=F('next_value') + self.block_size):
+                        Sequence.objects.create(name=self.name, next_value=1 + self.block_size)
+                    end = sequence.values_list('next_value', flat=True).get()
+                return end - self.block_size, end
+            except IntegrityError:
+                # Worker khác vừa tạo dòng Sequence, thử lại bằng UPDATE
+                continue
+
+
+order_codes = BlockAllocator('order_code')
+customer_codes = BlockAllocator('customer_code')
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=order_codes.reset)
+    os.register_at_fork(after_in_child=customer_codes.reset)
+
+
+def next_order_code():
+    return f'ORD{order_codes.allocate():07d}'
+
+
+def reserve_order_codes(codes):
+    """
+    Đẩy bộ đếm mã đơn qua các mã dạng ORD####### do client hoặc import đặt sẵn.
+
+    Chạy sau khi transaction commit để không giữ khoá dòng Sequence suốt lô ghi. Khối số mà
+    tiến trình khác đang giữ vẫn có thể chứa mã đó; create_order xử lý bằng cách bỏ khối và cấp lại.
+    """
+    numbers = [int(match.group(1)) for match in map(ORDER_CODE.fullmatch, codes) if match]
+    if numbers:
+        transaction.on_commit(lambda: order_codes.advance_past(max(numbers)))
+
+
+def next_customer_code():
+    return f'CUS{customer_codes.allocate():07d}'
@@ -1,20 +1,68 @@
 from rest_framework import serializers
-from .models import Customer, Product, OrderDetail, Chat
+from .models import Customer, Product, Order, OrderLine, Chat, ImportJob
 
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
-        fields = '__all__'
+        # Không có name_key: cột nội bộ cho tìm kiếm, gán lại trong signal pre_save
+        fields = ['id', 'user', 'customer_code', 'name', 'segment_code', 'segment_description']
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
 
-class OrderDetailSerializer(serializers.ModelSerializer):
+class OrderLineSerializer(serializers.ModelSerializer):
     class Meta:
-        model = OrderDetail
-        fields = '__all__'
+        model = OrderLine
+        fields = ['id', 'order', 'product', 'quantity', 'total_price']
+
+class OrderSerializer(serializers.ModelSerializer):
+    lines = OrderLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'order_code', 'customer', 'created_at', 'total_price', 'lines']
+        read_only_fields = ['total_price']  # Tính từ các dòng
+
+class OrderLineInputSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    total_price = serializers.IntegerField(required=False, allow_null=True)
+
+class OrderCreateSerializer(serializers.Serializer):
+    """Tạo đơn hàng cùng tất cả các dòng trong một lần gọi."""
+    order_code = serializers.CharField(max_length=10, required=False)
+    customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all())
+    created_at = serializers.DateTimeField(required=False)
+    order_lines = OrderLineInputSerializer(many=True, allow_empty=False)
+
+class CustomerBulkSerializer(serializers.Serializer):
+    """Một khách hàng trong POST /api/customers/bulk/, upsert theo customer_code."""
+    customer_code = serializers.CharField()
+    name = serializers.CharField(max_length=100)
+    segment_code = serializers.CharField()
+    segment_description = serializers.CharField(required=False, allow_blank=True, default='')
+
+class ProductBulkSerializer(serializers.Serializer):
+    """Một sản phẩm trong POST /api/products/bulk/, upsert theo product_code."""
+    product_code = serializers.CharField(max_length=6)
+    product_name = serializers.CharField(max_length=100)
+    group_code = serializers.CharField()
+    group_name = serializers.CharField(max_length=100)
+    price = serializers.IntegerField(min_value=0)
+
+class OrderBulkLineSerializer(serializers.Serializer):
+    product_code = serializers.CharField(max_length=6)
+    quantity = serializers.IntegerField(min_value=1)
+    total_price = serializers.IntegerField(required=False, allow_null=True)
+
+class OrderBulkSerializer(serializers.Serializer):
+    """Một đơn hàng trong POST /api/orders/bulk/; khách hàng và sản phẩm tham chiếu bằng mã, không tra từng dòng."""
+    order_code = serializers.CharField(max_length=10)
+    customer_code = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    lines = OrderBulkLineSerializer(many=True, allow_empty=False)
 
 class ChatSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()  # Hiển thị tên người dùng thay vì ID
@@ -22,4 +70,15 @@ class ChatSerializer(serializers.ModelSerializer):
     class Meta:
         model = Chat
         fields = ['id', 'user', 'message', 'timestamp']
-        read_only_fields = ['user', 'timestamp']  # Ngăn chặn việc chỉnh sửa những trường này
\ No newline at end of file
+        read_only_fields = ['user', 'timestamp']  # Ngăn chặn việc chỉnh sửa những trường này
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'file_name', 'status', 'total_rows', 'created_at', 'started_at', 'finished_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(instance.progress())
+        return data
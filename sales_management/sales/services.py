@@ -0,0 +1,165 @@
+import hashlib
+import unicodedata
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Collate
+from django.utils import timezone
+
+from .intents import normalize
+from .models import Customer, Order, OrderLine, Product
+from .sequences import next_customer_code, next_order_code, order_codes, reserve_order_codes
+
+AUTOCOMPLETE_LIMIT = 10
+# Ký tự lớn nhất: mọi khoá bắt đầu bằng tiền tố p đều nằm trong khoảng [p, p + MAX_CHAR)
+MAX_CHAR = chr(0x10FFFF)
+
+
+class OrderError(ValueError):
+    pass
+
+
+def normalize_lines(lines):
+    """
+    Chuẩn hoá danh sách dòng đơn hàng thành dict product_id -> [quantity, total_price].
+
+    Mỗi dòng là (product_id, quantity) hoặc (product_id, quantity, total_price);
+    các dòng trùng sản phẩm được cộng dồn vì mỗi sản phẩm chỉ có một dòng trong đơn.
+    """
+    merged = {}
+    for line in lines:
+        product_id, quantity, total_price = (tuple(line) + (None,))[:3]
+        try:
+            product_id, quantity = int(product_id), int(quantity)
+            total_price = int(total_price) if total_price not in (None, '') else None
+        except (TypeError, ValueError):
+            raise OrderError(f'Invalid order line: {line!r}')
+        if quantity <= 0:
+            raise OrderError(f'Quantity must be positive for product {product_id}.')
+        if product_id in merged:
+            merged[product_id][0] += quantity
+            merged[product_id][1] = None if total_price is None or merged[product_id][1] is None \
+                else merged[product_id][1] + total_price
+        else:
+            merged[product_id] = [quantity, total_price]
+    if not merged:
+        raise OrderError('Order has no lines.')
+    return merged
+
+
+def create_order(customer, lines, order_code=None, created_at=None):
+    """
+    Tạo đơn hàng cùng tất cả các dòng với số truy vấn không đổi.
+
+    Sản phẩm được nạp bằng một truy vấn in_bulk, toàn bộ dòng được kiểm tra trước rồi
+    mới ghi header và một bulk_create trong cùng transaction. total_price của dòng mặc
+    định là price * quantity. Trả về (Order, danh sách OrderLine đã gắn sẵn product).
+    """
+    merged = normalize_lines(lines)
+    products = Product.objects.in_bulk(merged)
+    missing = [str(product_id) for product_id in merged if product_id not in products]
+    if missing:
+        raise OrderError(f"Product not found: {', '.join(missing)}")
+
+    generated = not order_code
+    order = Order(
+        order_code=order_code or next_order_code(),
+        customer=customer,
+        created_at=created_at or timezone.now(),
+    )
+    order_lines = [
+        OrderLine(
+            order=order,
+            product=products[product_id],
+            quantity=quantity,
+            total_price=total_price if total_price is not None else products[product_id].price * quantity,
+        )
+        for product_id, (quantity, total_price) in merged.items()
+    ]
+    # Tổng được tính trước khi lưu header nên signal của Order cập nhật luôn rollup và dashboard
+    order.total_price = sum(line.total_price for line in order_lines)
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                order.save()
+                OrderLine.objects.bulk_create(order_lines)
+            break
+        except IntegrityError:
+            if not generated or attempt or not Order.objects.filter(order_code=order.order_code).exists():
+                raise OrderError(f'Order {order.order_code} already exists.')
+            # Mã tự cấp trùng mã import/client đặt sẵn nằm trong khối đang giữ: bỏ khối và cấp mã mới
+            order_codes.discard()
+            order.order_code = next_order_code()
+    if not generated:
+        reserve_order_codes([order.order_code])
+    return order, order_lines
+
+
+def update_totals(order_ids):
+    """Tính lại total_price của các đơn hàng từ các dòng bằng một câu UPDATE."""
+    line_totals = (OrderLine.objects.filter(order=OuterRef('pk')).values('order')
+                   .annotate(total=Sum('total_price')).values('total'))
+    Order.objects.filter(id__in=order_ids).update(total_price=Coalesce(Subquery(line_totals), 0))
+
+
+def customer_name_key(name):
+    """Tên khách hàng để so khớp: chữ thường, bỏ dấu tiếng Việt, gộp khoảng trắng."""
+    return ' '.join(normalize(unicodedata.normalize('NFC', name or '')).split())[:100]
+
+
+def advisory_xact_lock(key):
+    # Advisory lock theo chuỗi `key`, tự nhả khi transaction kết thúc; CSDL khác dựa vào khoá ghi của transaction
+    if connection.vendor == 'postgresql':
+        lock_id = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [lock_id])
+
+
+def lock_name_key(key):
+    advisory_xact_lock(key)
+
+
+def resolve_customer(name):
+    """
+    Khách hàng có tên trùng `name` (không phân biệt hoa thường, dấu), tạo mới nếu chưa có.
+
+    Thay cho get_or_create(name=...): tìm qua index name_key, nhiều khách trùng tên thì lấy
+    khách tạo sớm nhất. Việc tạo mới được tuần tự hoá theo tên nên hai request đồng thời không
+    tạo hai khách. Trả về (customer, created) như get_or_create.
+    """
+    key = customer_name_key(name)
+    if not key:
+        raise OrderError('Customer name is required.')
+    customers = Customer.objects.filter(name_key=key).order_by('id')
+    customer = customers.first()
+    if customer:
+        return customer, False
+    with transaction.atomic():
+        lock_name_key(key)
+        # Kiểm tra lại sau khi có khoá: request giữ khoá trước có thể vừa tạo khách này
+        customer = customers.first()
+        if customer:
+            return customer, False
+        customer = Customer.objects.create(
+            customer_code=next_customer_code(),
+            name=' '.join(name.split()),
+            segment_code='',
+            segment_description='',
+        )
+    return customer, True
+
+
+def autocomplete_customers(query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Tối đa `limit` khách có tên bắt đầu bằng `query` (đã chuẩn hoá), theo thứ tự tên.
+
+    Điều kiện là khoảng [tiền tố, tiền tố + MAX_CHAR) so sánh theo byte (collation "C" trên
+    PostgreSQL, BINARY trên SQLite) nên cả lọc lẫn sắp xếp đều chạy trên index, không phụ
+    thuộc số khách khớp tiền tố.
+    """
+    prefix = customer_name_key(query)
+    if not prefix:
+        return []
+    key = Collate('name_key', 'C') if connection.vendor == 'postgresql' else F('name_key')
+    return list(Customer.objects.annotate(key=key).filter(key__gte=prefix, key__lt=prefix + MAX_CHAR)
+                .order_by('key', 'id').values('id', 'customer_code', 'name')[:limit])
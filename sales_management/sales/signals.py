@@ -0,0 +1,109 @@
+from celery.signals import worker_process_init
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import fragments, product_index, rollups, statistics
+from .models import Customer, Order, OrderLine, Product
+from .services import customer_name_key, update_totals
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: product_index.record_change(product_id))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: product_index.record_change(product_id))
+
+
+@receiver(pre_save, sender=Customer)
+def customer_saving(sender, instance, **kwargs):
+    instance.name_key = customer_name_key(instance.name)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        name = 'customers' if sender is Customer else 'products'
+        transaction.on_commit(lambda: statistics.record_created(name))
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+def count_deleted(sender, instance, **kwargs):
+    name = 'customers' if sender is Customer else 'products'
+    transaction.on_commit(lambda: statistics.record_deleted(name))
+
+
+@receiver(pre_save, sender=Order)
+def order_moving(sender, instance, **kwargs):
+    # Sửa created_at chuyển đơn sang ngày khác: ngày cũ cũng phải dựng lại bảng tổng hợp
+    if instance.pk:
+        previous = Order.objects.filter(pk=instance.pk).values_list('created_at', flat=True).first()
+        if previous and previous != instance.created_at:
+            rollups.mark_dirty([previous])
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    rollups.mark_dirty([instance.created_at])
+    if created:
+        transaction.on_commit(lambda: statistics.record_orders([instance]))
+    else:
+        # Không biết giá trị cũ nên bỏ doanh thu của ngày đó, lần đọc sau sẽ tính lại
+        date = timezone.localdate(instance.created_at)
+        transaction.on_commit(lambda: statistics.forget_revenue(date))
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    rollups.mark_dirty([instance.created_at])
+    transaction.on_commit(lambda: statistics.record_orders([instance], sign=-1))
+
+
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+def order_line_changed(sender, instance, origin=None, **kwargs):
+    # Dòng bị xoá cùng đơn hàng hoặc khách hàng: header cũng bị xoá nên không cần tính lại
+    if origin is not None:
+        model = origin.model if isinstance(origin, QuerySet) else type(origin)
+        if model in (Order, Customer):
+            return
+    # services.create_order và importer ghi dòng bằng bulk_create nên không đi qua đây
+    update_totals([instance.order_id])
+    created_at = Order.objects.filter(pk=instance.order_id).values_list('created_at', flat=True).first()
+    if created_at:
+        rollups.mark_dirty([created_at])
+        date = timezone.localdate(created_at)
+        transaction.on_commit(lambda: statistics.forget_revenue(date))
+
+
+# Danh sách HTML hiển thị dữ liệu của từng model (order_list hiển thị cả tên khách hàng)
+LIST_FRAGMENTS = {
+    Customer: ('customers', 'orders'),
+    Product: ('products',),
+    Order: ('orders',),
+    OrderLine: ('orders',),
+}
+
+
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderLine)
+def list_changed(sender, **kwargs):
+    names = LIST_FRAGMENTS[sender]
+    transaction.on_commit(lambda: fragments.bump(*names))
+
+
+@worker_process_init.connect
+def build_product_index(**kwargs):
+    # Dựng index khi tiến trình worker Celery khởi động để tin nhắn đầu tiên không phải chờ
+    product_index.get_index()
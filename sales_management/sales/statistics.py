@@ -0,0 +1,135 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Customer, Order, OrderLine, Product
+
+KEY_PREFIX = 'sales:stats'
+COUNTED_MODELS = {'customers': Customer, 'products': Product, 'orders': Order}
+DEFAULT_TTL = 300
+REVENUE_DAYS = 30
+TOP_PRODUCTS = 10
+
+
+def key(*parts):
+    return ':'.join((KEY_PREFIX,) + tuple(str(part) for part in parts))
+
+
+def ttl():
+    return getattr(settings, 'SALES_STATISTICS_TTL', DEFAULT_TTL)
+
+
+def estimate_mode():
+    return getattr(settings, 'SALES_STATISTICS_MODE', 'exact') == 'estimate' and connection.vendor == 'postgresql'
+
+
+def count_rows(model):
+    """COUNT(*) chính xác, hoặc ước lượng pg_class.reltuples (không quét bảng) nếu SALES_STATISTICS_MODE='estimate'."""
+    if estimate_mode():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        # reltuples = -1 khi bảng chưa từng được ANALYZE
+        if row and row[0] >= 0:
+            return row[0]
+    return model.objects.count()
+
+
+def counts():
+    """Số khách hàng, sản phẩm, đơn hàng; lấy từ cache, chỉ đếm lại khoá bị thiếu."""
+    keys = {name: key('count', name) for name in COUNTED_MODELS}
+    cached = cache.get_many(keys.values())
+    result = {}
+    for name, cache_key in keys.items():
+        if cache_key in cached:
+            result[name] = cached[cache_key]
+        else:
+            result[name] = count_rows(COUNTED_MODELS[name])
+            cache.set(cache_key, result[name], timeout=ttl())
+    return result
+
+
+def revenue_per_day(days=REVENUE_DAYS):
+    """
+    Doanh thu từng ngày (giờ địa phương) của `days` ngày gần nhất, cũ nhất trước.
+
+    Mỗi ngày là một khoá cache riêng; các ngày thiếu được tính lại bằng một truy vấn GROUP BY.
+    """
+    today = timezone.localdate()
+    dates = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    keys = {date: key('revenue', date.isoformat()) for date in dates}
+    cached = cache.get_many(keys.values())
+    missing = [date for date in dates if keys[date] not in cached]
+    if missing:
+        start = timezone.make_aware(datetime.combine(missing[0], time.min))
+        end = timezone.make_aware(datetime.combine(missing[-1] + timedelta(days=1), time.min))
+        totals = dict(Order.objects.filter(created_at__gte=start, created_at__lt=end)
+                      .annotate(day=TruncDate('created_at')).values('day')
+                      .annotate(revenue=Sum('total_price')).values_list('day', 'revenue'))
+        fresh = {keys[date]: totals.get(date, 0) for date in missing}
+        cache.set_many(fresh, timeout=ttl())
+        cached.update(fresh)
+    return [{'date': date, 'revenue': cached[keys[date]]} for date in dates]
+
+
+def top_products(limit=TOP_PRODUCTS):
+    """Sản phẩm có doanh thu cao nhất; cache theo TTL vì không cập nhật tăng dần được."""
+    cache_key = key('top_products', limit)
+    result = cache.get(cache_key)
+    if result is None:
+        result = list(OrderLine.objects.values('product_id', 'product__product_code', 'product__product_name')
+                      .annotate(quantity=Sum('quantity'), revenue=Sum('total_price'))
+                      .order_by('-revenue')[:limit])
+        cache.set(cache_key, result, timeout=ttl())
+    return result
+
+
+def dashboard():
+    return {**counts(), 'revenue_per_day': revenue_per_day(), 'top_products': top_products()}
+
+
+def incr(cache_key, delta):
+    # Chỉ cộng khi khoá đang có trong cache; khoá đã hết hạn sẽ được tính lại ở lần đọc sau
+    if not delta:
+        return
+    try:
+        cache.incr(cache_key, delta)
+    except ValueError:
+        pass
+
+
+def record_created(name, count=1):
+    incr(key('count', name), count)
+
+
+def record_deleted(name, count=1):
+    incr(key('count', name), -count)
+
+
+def record_orders(orders, sign=1):
+    """Cập nhật số đơn hàng và doanh thu theo ngày cho các Order vừa tạo (sign=-1 khi xoá)."""
+    revenue = {}
+    for order in orders:
+        date = timezone.localdate(order.created_at)
+        revenue[date] = revenue.get(date, 0) + order.total_price
+    incr(key('count', 'orders'), sign * len(orders))
+    for date, total in revenue.items():
+        incr(key('revenue', date.isoformat()), sign * total)
+
+
+def forget_revenue(date):
+    cache.delete(key('revenue', date.isoformat()))
+
+
+def invalidate():
+    """Xoá toàn bộ số liệu đã cache, dùng sau các thao tác ghi hàng loạt (import CSV, migration dữ liệu)."""
+    today = timezone.localdate()
+    keys = [key('count', name) for name in COUNTED_MODELS]
+    keys += [key('revenue', (today - timedelta(days=offset)).isoformat()) for offset in range(REVENUE_DAYS)]
+    keys.append(key('top_products', TOP_PRODUCTS))
+    cache.delete_many(keys)
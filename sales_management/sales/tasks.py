@@ -1,42 +1,110 @@
 import logging
-from celery import shared_task
-from sales.models import Customer, Product, OrderDetail
+import os
+from asgiref.sync import async_to_sync
+from celery import shared_task, chord
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
+from sales.models import Customer, Order, OrderLine, ImportJob, ImportChunk
+from sales.importer import OrderImporter, scan_rows
 from django.contrib.auth.models import User
-import re
 from django.utils import timezone
-from django.db.models import Q, Max
+from sales.intents import Message, extract_order, parse_order_items, router
+from sales import product_index, profiling, rollups, tracing
+from sales.services import OrderError, create_order
 
 logger = logging.getLogger(__name__)
 
-def generate_order_code():
-    last_order_code = OrderDetail.objects.aggregate(Max('order_code'))['order_code__max']
-    if last_order_code:
-        num = int(last_order_code[3:]) + 1
-    else:
-        num = 1
-    return f'ORD{num:07d}'
+HISTORY_PAGE_ORDERS = 15
+HISTORY_FRAMES_PER_REQUEST = 4
+HISTORY_CURSOR_TIMEOUT = 1800
 
-@shared_task
-def process_chat_message(message, username):
-    if re.search(r'\b(đặt hàng|mua).*(\d+\s+\w+(\s+\w+)*(\s+(và|,)\s+)?)+', message, re.IGNORECASE):
-        return process_order(message, username)
-    elif re.search(r'\b(xem|kiểm tra|lấy)\s+lịch sử\s+(mua hàng|đặt hàng)\b', message, re.IGNORECASE):
-        return get_order_history(username)
-    elif re.search(r'\b(Hi|Hello|xin chào)\b', message, re.IGNORECASE):
-        return "Xin chào, tôi có thể giúp gì cho bạn?"
-    else:
-        return "Xin lỗi, tôi không hiểu yêu cầu của bạn. Bạn có thể đặt hàng hoặc xem lịch sử mua hàng."
+STAFF_GROUP = 'chat_staff'
+
+
+def user_group_name(user_id):
+    return f'chat_user_{user_id}'
+
+@shared_task(ignore_result=True)
+def process_chat_message(message, username, reply_to=None, trace=None):
+    # reply_to: group của channel layer nhận câu trả lời, consumer không phải chờ kết quả task
+    # trace: context của sales.tracing do ChatConsumer gửi kèm, được gắn lại vào các câu trả lời
+    context = trace
+    trace = tracing.Trace.resume(context)
+    if trace is not None:
+        trace.add('task.queue_wait', tracing.waited(context))
+    with tracing.activate(trace):
+        try:
+            response_message = route_chat_message(message, username, reply_to) or "Đã xử lý yêu cầu của bạn."
+        except Exception as e:
+            logger.error(f"Error processing message: {str(e)}")
+            if reply_to:
+                send_reply(reply_to, {'type': 'chat_error', 'error': 'An error occurred while processing your message.'})
+            raise
+
+        if reply_to:
+            send_reply(reply_to, {'type': 'chat_message', 'message': response_message, 'username': 'System'})
+    if trace is not None:
+        trace.log('task')
+    return response_message
+
+def send_chat_event(group, event, final=False):
+    # final: câu trả lời cuối cho tin nhắn, consumer tính tổng thời gian từ lúc nhận tin nhắn
+    trace = tracing.current()
+    if trace is not None:
+        event = dict(event, trace=trace.context(final=final))
+    async_to_sync(get_channel_layer().group_send)(group, event)
+
+def send_reply(group, event):
+    # Câu trả lời cuối/lỗi cũng tới nhân viên ở ws/chat/staff/ như tin nhắn của khách; bản gửi
+    # nhân viên không kèm trace để tổng thời gian chỉ đo ở socket của người hỏi
+    send_chat_event(group, event, final=True)
+    async_to_sync(get_channel_layer().group_send)(STAFF_GROUP, event)
+
+def route_chat_message(message, username, reply_to=None):
+    trace = tracing.current()
+    if trace is None:
+        return router.dispatch(message, username=username, reply_to=reply_to)
+    with trace.span('task.route'):
+        intent, parsed, slots = router.route(message)
+    # Thời gian DB của handler (process_order, lịch sử mua hàng...) đo qua execute wrapper của sales.profiling
+    with trace.span(f'task.intent.{intent.name}'), profiling.profile('chat', intent.name) as queries:
+        response = intent.handler(parsed, slots, username=username, reply_to=reply_to)
+    trace.add('task.db', queries.db_time)
+    return response
+
+@router.intent('order', r'\b(?:dat hang|mua)\b', priority=30, extract=extract_order)
+def handle_order(message, slots, username, reply_to=None):
+    return process_order(message.text, username, items=slots['items'])
+
+@router.intent('order_history_more', r'\b(?:xem (?:them|tiep)|tiep tuc)\b', priority=25)
+def handle_order_history_more(message, slots, username, reply_to=None):
+    cursor = cache.get(history_cursor_key(username))
+    if cursor is None:
+        return "Không còn lịch sử mua hàng nào để xem thêm."
+    return get_order_history(username, reply_to=reply_to, cursor=cursor)
+
+@router.intent('order_history', r'\b(?:xem|kiem tra|lay) +lich su +(?:mua hang|dat hang)\b', priority=20)
+def handle_order_history(message, slots, username, reply_to=None):
+    return get_order_history(username, reply_to=reply_to)
+
+@router.intent('greeting', r'\b(?:hi|hello|xin chao)\b', priority=10)
+def handle_greeting(message, slots, username, reply_to=None):
+    return "Xin chào, tôi có thể giúp gì cho bạn?"
+
+@router.default
+def handle_unknown(message, slots, username, reply_to=None):
+    return "Xin lỗi, tôi không hiểu yêu cầu của bạn. Bạn có thể đặt hàng hoặc xem lịch sử mua hàng."
 
 @shared_task
-def process_order(message, username):
-    products = re.findall(r'(\d+)\s+([\w\s]+?)(?:,|\s+và\s+|$)', message)
+def process_order(message, username, items=None):
+    products = items if items is not None else parse_order_items(Message(message))
     logger.debug(f"Parsed products from message: {products}")
     
     if not products:
         return "Không tìm thấy sản phẩm nào trong yêu cầu đặt hàng của bạn."
     
-    order_details = []
-    total_price = 0
     not_found_products = []
 
     try:
@@ -45,74 +113,207 @@ def process_order(message, username):
     except User.DoesNotExist:
         return "Không tìm thấy người dùng."
 
-    order_code = generate_order_code()
-
+    # Tra tên sản phẩm trên index trong bộ nhớ, không truy vấn DB
+    index = product_index.get_index()
+    lines = []
     for quantity, product_name in products:
-        try:
-            product = Product.objects.filter(
-                Q(product_name__icontains=product_name.strip()) |
-                Q(product_name__icontains=product_name.strip().replace(' ', ''))
-            ).first()
-            
-            if product is None:
-                not_found_products.append(product_name.strip())
-                continue
-            
-            quantity = int(quantity)
-            price = product.price * quantity
-            total_price += price
-            
-            order_detail = OrderDetail(
-                order_code=order_code,
-                product=product,
-                quantity=quantity,
-                total_price=price,
-                customer=customer,
-                created_at=timezone.now()
-            )
-            order_detail.save()
-            order_details.append(order_detail)
-        except Exception as e:
-            logger.error(f"Lỗi khi xử lý sản phẩm {product_name}: {str(e)}")
+        entry = index.best(product_name)
+        if entry is None:
             not_found_products.append(product_name.strip())
-    
-    if not order_details:
+        else:
+            lines.append((entry.id, quantity))
+
+    if not lines:
         return f"Không tìm thấy sản phẩm: {', '.join(not_found_products)}"
-    
-    response = f"Đơn hàng của bạn đã được đặt thành công. Mã đơn hàng: {order_code}. Tổng giá trị đơn hàng: {total_price:,} VND.\n"
+    try:
+        order, order_lines = create_order(customer, lines)
+    except OrderError as e:
+        logger.error(f"Lỗi khi tạo đơn hàng cho {username}: {str(e)}")
+        return "Không thể tạo đơn hàng, vui lòng thử lại."
+
+    response = f"Đơn hàng của bạn đã được đặt thành công. Mã đơn hàng: {order.order_code}. Tổng giá trị đơn hàng: {order.total_price:,} VND.\n"
     
     response += "Chi tiết đơn hàng:\n"
-    for order in order_details:
-        response += f"- {order.product.product_name}: {order.quantity} x {order.product.price:,} VND = {order.total_price:,} VND.\n"
+    for line in order_lines:
+        response += f"- {line.product.product_name}: {line.quantity} x {line.product.price:,} VND = {line.total_price:,} VND.\n"
     
     if not_found_products:
         response += f"\nKhông tìm thấy các sản phẩm sau: {', '.join(not_found_products)}"
     
     return response
 
+def history_cursor_key(username):
+    return f'sales:chat_history_cursor:{username}'
+
+def order_history_page(customer, cursor=None, limit=None):
+    """
+    Một trang lịch sử theo keyset (created_at, id) giảm dần, tối đa `limit` đơn hàng.
+
+    Trả về (danh sách Order đã nạp sẵn các dòng, cursor trang sau hoặc None).
+    """
+    limit = limit or HISTORY_PAGE_ORDERS
+    orders = Order.objects.filter(customer=customer).only('order_code', 'created_at', 'total_price')
+    if cursor is not None:
+        created_at, id = cursor
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id))
+    orders = list(orders.order_by('-created_at', '-id').prefetch_related(Prefetch(
+        'lines',
+        queryset=OrderLine.objects.select_related('product').only(
+            'order_id', 'quantity', 'total_price', 'product__product_name').order_by('id'),
+    ))[:limit + 1])
+
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    next_cursor = (orders[-1].created_at, orders[-1].id) if has_more else None
+    return orders, next_cursor
+
+def format_order_history(orders):
+    text = []
+    for order in orders:
+        local_time = timezone.localtime(order.created_at)
+        text.append(f"Mã đơn hàng: {order.order_code} - Ngày tạo đơn: {local_time.strftime('%d/%m/%Y, %I:%M %p')}")
+        for line in order.lines.all():
+            text.append(f"- {line.product.product_name}: {line.quantity} sản phẩm, {line.total_price:,} VND")
+        text.append(f"Tổng tiền: {order.total_price:,} VND.\n")
+    return "\n".join(text)
+
 @shared_task
-def get_order_history(username):
+def get_order_history(username, reply_to=None, cursor=None):
+    """
+    Gửi lịch sử mua hàng thành nhiều frame (mỗi frame một trang keyset) tới group reply_to.
+
+    Mỗi lượt chỉ gửi tối đa HISTORY_FRAMES_PER_REQUEST trang; cursor được lưu trên cache
+    cho intent "xem thêm" nên bộ nhớ không phụ thuộc độ dài lịch sử. Khi không có
+    reply_to (gọi trực tiếp), trả về nội dung các trang thay vì gửi từng frame.
+    """
     try:
         user = User.objects.get(username=username)
         customer = Customer.objects.get(user=user)
     except (User.DoesNotExist, Customer.DoesNotExist):
         return "Không tìm thấy khách hàng."
-    
-    orders = OrderDetail.objects.filter(customer=customer).order_by('-created_at')
-    
-    if not orders:
+
+    frames = []
+    sent = 0
+    while sent < HISTORY_FRAMES_PER_REQUEST:
+        orders, cursor = order_history_page(customer, cursor)
+        if not orders:
+            break
+        frame = format_order_history(orders)
+        if reply_to:
+            send_chat_event(reply_to, {'type': 'chat_message', 'message': frame, 'username': 'System'})
+        else:
+            frames.append(frame)
+        sent += 1
+        if cursor is None:
+            break
+
+    if cursor is None:
+        cache.delete(history_cursor_key(username))
+    else:
+        cache.set(history_cursor_key(username), cursor, timeout=HISTORY_CURSOR_TIMEOUT)
+
+    if not sent:
         return "Bạn chưa có lịch sử mua hàng nào."
-    
-    history = []
-    for order in orders:
-        local_time = timezone.localtime(order.created_at)
-        history.append(
-            f"Mã đơn hàng: {order.order_code},\n"
-            f"Tên khách hàng: {order.customer.name},\n"
-            f"Sản phẩm: {order.product.product_name},\n"
-            f"Ngày tạo đơn: {local_time.strftime('%d/%m/%Y, %I:%M %p')},\n"
-            f"Số lượng: {order.quantity},\n"
-            f"Tổng tiền: {order.total_price} VND.\n"
+    footer = 'Gõ "xem thêm" để xem các đơn hàng cũ hơn.' if cursor else "Đã hiển thị hết lịch sử mua hàng."
+    return "\n".join(frames + [footer])
+
+@shared_task
+def run_import_job(job_id):
+    job = ImportJob.objects.get(id=job_id)
+    chunk_rows = settings.SALES_IMPORT_CHUNK_ROWS
+    try:
+        with open(job.file_path, 'rb') as file:
+            total_rows, offsets = scan_rows(file, chunk_rows)
+    except OSError as e:
+        logger.error(f"Import job {job_id} failed: {e}")
+        job.status = ImportJob.STATUS_FAILED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+        return
+
+    # Chia file thành các khoảng dòng để nhiều worker import song song, mỗi khoảng bắt đầu từ vị trí byte của nó
+    job.chunks.all().delete()
+    ImportChunk.objects.bulk_create([
+        ImportChunk(job=job, start_row=start, end_row=min(start + chunk_rows, total_rows), committed_row=start,
+                    start_offset=offset, committed_offset=offset)
+        for start, offset in zip(range(0, total_rows, chunk_rows), offsets)
+    ])
+
+    job.total_rows = total_rows
+    job.status = ImportJob.STATUS_RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['total_rows', 'status', 'started_at'])
+    dispatch_import_chunks(job)
+
+
+def dispatch_import_chunks(job):
+    chunk_ids = list(job.chunks.exclude(status=ImportJob.STATUS_COMPLETED).values_list('id', flat=True))
+    if chunk_ids:
+        chord(import_chunk.s(chunk_id) for chunk_id in chunk_ids)(finish_import_job.si(job.id))
+    else:
+        finish_import_job.delay(job.id)
+
+
+@shared_task
+def import_chunk(chunk_id):
+    chunk = ImportChunk.objects.select_related('job').get(id=chunk_id)
+    base = {
+        'created_rows': chunk.created_rows,
+        'updated_rows': chunk.updated_rows,
+        'skipped_rows': chunk.skipped_rows,
+        'error_rows': chunk.error_rows,
+    }
+
+    def save_progress(importer, next_row):
+        stats = importer.stats
+        ImportChunk.objects.filter(id=chunk.id).update(
+            committed_row=next_row,
+            committed_offset=importer.offset,
+            created_rows=base['created_rows'] + stats.created,
+            updated_rows=base['updated_rows'] + stats.updated,
+            skipped_rows=base['skipped_rows'] + stats.skipped,
+            error_rows=base['error_rows'] + stats.errors,
         )
-    
-    return "\n".join(history)
+
+    ImportChunk.objects.filter(id=chunk.id).update(status=ImportJob.STATUS_RUNNING, last_error='')
+    try:
+        with open(chunk.job.file_path, 'rb') as file:
+            importer = OrderImporter(on_batch=save_progress)
+            importer.run(file, start_row=chunk.committed_row, end_row=chunk.end_row, offset=chunk.committed_offset)
+    except Exception as e:
+        logger.error(f"Import chunk {chunk_id} failed: {e}")
+        ImportChunk.objects.filter(id=chunk.id).update(status=ImportJob.STATUS_FAILED, last_error=str(e))
+        return
+    ImportChunk.objects.filter(id=chunk.id).update(status=ImportJob.STATUS_COMPLETED)
+
+
+@shared_task
+def finish_import_job(job_id):
+    job = ImportJob.objects.get(id=job_id)
+    failed = job.chunks.filter(status=ImportJob.STATUS_FAILED).exists()
+    job.status = ImportJob.STATUS_FAILED if failed else ImportJob.STATUS_COMPLETED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+    if not failed:
+        try:
+            os.remove(job.file_path)
+        except OSError:
+            pass
+
+
+@shared_task
+def resume_import_job(job_id):
+    job = ImportJob.objects.get(id=job_id)
+    if job.total_rows is None:
+        return run_import_job(job_id)
+    # Các khoảng chưa xong sẽ tiếp tục từ lô cuối cùng đã commit (committed_row)
+    job.status = ImportJob.STATUS_RUNNING
+    job.finished_at = None
+    job.save(update_fields=['status', 'finished_at'])
+    dispatch_import_chunks(job)
+
+
+@shared_task(ignore_result=True)
+def refresh_rollups():
+    refreshed = rollups.refresh()
+    logger.info(f"Rebuilt sales rollups for {refreshed} day(s)")
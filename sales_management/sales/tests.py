@@ -1,3 +1,1283 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+
+from django.db import IntegrityError, OperationalError, connection
+from django.db.migrations.loader import MigrationLoader
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from sales_management.asgi import application
+
+from .benchmarks import adversarial_messages
+from .intents import Message, normalize, parse_order_items, router
+from .chat_buffer import ChatWriteBuffer
+from .consumers import ChatConsumer
+from .importer import COLUMN_MAPPING, LineReader, OrderImporter, scan_rows
+from .models import Chat, Customer, DailySegmentSales, ImportChunk, ImportJob, Order, OrderLine, Product, RollupDirtyDay, Sequence
+from .product_index import ProductIndex
+from .sequences import BlockAllocator, order_codes
+from .services import OrderError, autocomplete_customers, create_order, resolve_customer
+from . import bulk, metrics, product_index, profiling, tracing, rollups, statistics, tasks  # noqa: F401  (đăng ký các intent của chatbot)
+
+
+def make_orders(specs):
+    """Tạo nhanh Order + OrderLine; specs: [(order_code, customer, created_at, [(product, quantity, total_price)])]."""
+    orders = Order.objects.bulk_create([
+        Order(order_code=code, customer=customer, created_at=created_at, total_price=sum(line[2] for line in lines))
+        for code, customer, created_at, lines in specs
+    ])
+    OrderLine.objects.bulk_create([
+        OrderLine(order=order, product=product, quantity=quantity, total_price=total_price)
+        for order, (_, _, _, lines) in zip(orders, specs) for product, quantity, total_price in lines
+    ])
+    return orders
+
+
+def import_csv(rows, bom=True):
+    """Nội dung file CSV import (bytes) từ các dòng (created_at, order_code, customer_code, product_code, quantity, price)."""
+    lines = [','.join(COLUMN_MAPPING)]
+    for created_at, order_code, customer_code, product_code, quantity, price in rows:
+        lines.append(f'{created_at},{order_code},{customer_code},Khách {customer_code},SEG1,Lẻ,G1,Nhóm 1,'
+                     f'{product_code},Sản phẩm {product_code},{quantity},{price},{quantity * price}')
+    return ('\ufeff' if bom else '').encode() + '\r\n'.join(lines).encode() + b'\r\n'
+
+
+class ImportOffsetTests(TestCase):
+    def test_chunk_seeks_to_its_offset_without_parsing_earlier_rows(self):
+        rows = [('2024-05-01T10:00:00', f'O{i}', 'C1', 'P1', 1, 1000) for i in range(5)]
+        content = import_csv(rows)
+        total, offsets = scan_rows(io.BytesIO(content), chunk_rows=2)
+        self.assertEqual(total, 5)
+        self.assertEqual(len(offsets), 3)
+
+        # Hai dòng dữ liệu đầu bị thay bằng byte không giải mã được: chỉ đọc được nếu seek qua chúng
+        header_end = content.index(b'\n') + 1
+        corrupted = content[:header_end] + b'\xff' * (offsets[1] - header_end) + content[offsets[1]:]
+        importer = OrderImporter()
+        stats = importer.run(io.BytesIO(corrupted), start_row=2, end_row=4, offset=offsets[1])
+        self.assertEqual((stats.rows, stats.created), (2, 2))
+        self.assertEqual(sorted(Order.objects.values_list('order_code', flat=True)), ['O2', 'O3'])
+        self.assertEqual(importer.offset, offsets[2])
+
+
+class OrderImporterTests(TestCase):
+    def test_bom_and_multibyte_characters_split_across_reads(self):
+        content = import_csv([('2024-05-01T10:00:00', 'O1', 'C1', 'P1', 2, 1000)])
+        expected = list(LineReader(io.BytesIO(content)))
+        self.assertTrue(expected[0].startswith('Thời gian tạo đơn,'))
+        for chunk_size in (1, 2, 3, 5):
+            self.assertEqual(list(LineReader(io.BytesIO(content), chunk_size=chunk_size)), expected)
+
+        with mock.patch('sales.importer.READ_CHUNK_SIZE', 3):
+            OrderImporter().run(io.BytesIO(content))
+        self.assertEqual(Customer.objects.get().name, 'Khách C1')
+        self.assertEqual(Product.objects.get().product_name, 'Sản phẩm P1')
+
+    def test_records_skipped_and_invalid_rows(self):
+        content = import_csv([
+            ('2024-05-01T10:00:00', 'O1', 'C1', 'P1', 2, 1000),
+            ('2024-05-01T10:00:00', 'O2', '', 'P1', 1, 1000),  # thiếu mã khách hàng
+            ('không phải ngày', 'O3', 'C1', 'P1', 1, 1000),
+        ])
+        with self.assertLogs('sales.importer', 'WARNING'):
+            stats = OrderImporter().run(io.BytesIO(content))
+        self.assertEqual((stats.rows, stats.created, stats.skipped, stats.errors), (3, 1, 1, 1))
+        self.assertEqual(list(Order.objects.values_list('order_code', flat=True)), ['O1'])
+
+    def test_reimport_upserts_existing_orders(self):
+        OrderImporter().run(io.BytesIO(import_csv([('2024-05-01T10:00:00', 'O1', 'C1', 'P1', 2, 1000)])))
+        stats = OrderImporter().run(io.BytesIO(import_csv([
+            ('2024-05-02T10:00:00', 'O1', 'C1', 'P1', 5, 1000),
+            ('2024-05-02T10:00:00', 'O1', 'C1', 'P2', 1, 3000),
+        ])))
+        self.assertEqual((stats.created, stats.updated), (1, 1))
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, 8000)
+        self.assertEqual(order.lines.get(product__product_code='P1').quantity, 5)
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        rows = [('2024-05-01T10:00:00', f'O{i}', f'C{i % 2}', 'P1', 1, 1000) for i in range(5)]
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(import_csv(rows))
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+        self.job = ImportJob.objects.create(file_name='orders.csv', file_path=self.path)
+
+    def run_job(self, task, job_id):
+        with self.settings(SALES_IMPORT_CHUNK_ROWS=2, SALES_IMPORT_BATCH_SIZE=1), self.captureOnCommitCallbacks(execute=True):
+            task.delay(job_id)
+        self.job.refresh_from_db()
+
+    def test_chunks_commit_progress_per_batch(self):
+        self.run_job(tasks.run_import_job, self.job.id)
+        self.assertEqual(self.job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual(self.job.total_rows, 5)
+        chunks = list(self.job.chunks.values_list('start_row', 'end_row', 'committed_row', 'created_rows', 'status'))
+        self.assertEqual(chunks, [(0, 2, 2, 2, 'completed'), (2, 4, 4, 2, 'completed'), (4, 5, 5, 1, 'completed')])
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_resume_continues_failed_chunk_from_last_commit(self):
+        upsert_orders = OrderImporter.upsert_orders
+        calls = []
+
+        def fail_on_fourth_batch(importer, rows):
+            calls.append(rows)
+            if len(calls) == 4:
+                raise RuntimeError('worker lost')
+            return upsert_orders(importer, rows)
+
+        with mock.patch.object(OrderImporter, 'upsert_orders', fail_on_fourth_batch), \
+                self.assertLogs('sales.tasks', 'ERROR'):
+            self.run_job(tasks.run_import_job, self.job.id)
+        self.assertEqual(self.job.status, ImportJob.STATUS_FAILED)
+        failed = self.job.chunks.get(status=ImportJob.STATUS_FAILED)
+        self.assertEqual((failed.start_row, failed.committed_row, failed.last_error), (2, 3, 'worker lost'))
+        self.assertGreater(failed.committed_offset, failed.start_offset)
+        self.assertEqual(Order.objects.count(), 4)
+
+        self.run_job(tasks.resume_import_job, self.job.id)
+        self.assertEqual(self.job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual(sorted(Order.objects.values_list('order_code', flat=True)), [f'O{i}' for i in range(5)])
+        self.assertEqual(self.job.chunks.get(start_row=2).created_rows, 2)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ChatSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        self.staff = User.objects.create(username='staff', is_staff=True)
+
+    def connect(self, user=None, path='/ws/chat/', token=None):
+        if user is not None:
+            token = str(AccessToken.for_user(user))
+        query = f'?token={token}' if token else ''
+        return WebsocketCommunicator(application, f'{path}{query}')
+
+    async def assert_rejected(self, communicator):
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_rejects_anonymous_invalid_and_expired_tokens(self):
+        expired = AccessToken.for_user(self.alice)
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+        await self.assert_rejected(self.connect())
+        await self.assert_rejected(self.connect(token='not-a-jwt'))
+        await self.assert_rejected(self.connect(token=str(expired)))
+
+    async def test_replies_reach_only_the_sender_and_staff(self):
+        alice, bob = self.connect(self.alice), self.connect(self.bob)
+        staff, not_staff = self.connect(self.staff, '/ws/chat/staff/'), self.connect(self.bob, '/ws/chat/staff/')
+        for communicator in (alice, bob, staff, not_staff):
+            self.assertTrue((await communicator.connect())[0])
+
+        await alice.send_json_to({'message': 'xin chào'})
+        self.assertEqual(await alice.receive_json_from(), {'message': 'xin chào', 'username': 'alice'})
+        self.assertEqual((await alice.receive_json_from())['message'], 'Xin chào, tôi có thể giúp gì cho bạn?')
+        self.assertEqual(await staff.receive_json_from(), {'message': 'xin chào', 'username': 'alice'})
+        self.assertEqual(await staff.receive_json_from(), {'message': 'Xin chào, tôi có thể giúp gì cho bạn?', 'username': 'System'})
+        self.assertTrue(await bob.receive_nothing())
+        self.assertTrue(await not_staff.receive_nothing())  # /staff/ chỉ có tác dụng với nhân viên
+
+        # Socket của nhân viên chỉ ở STAFF_GROUP: tin nhắn của chính họ và câu trả lời tới đúng một lần
+        await staff.send_json_to({'message': 'xin chào'})
+        self.assertEqual(await staff.receive_json_from(), {'message': 'xin chào', 'username': 'staff'})
+        self.assertEqual((await staff.receive_json_from())['username'], 'System')
+        self.assertTrue(await staff.receive_nothing())
+        self.assertTrue(await alice.receive_nothing())
+
+        for communicator in (alice, bob, staff, not_staff):
+            await communicator.disconnect()
+        self.assertEqual(await Chat.objects.filter(user=self.alice).acount(), 1)
+
+    async def test_receive_does_not_wait_for_the_reply_task(self):
+        alice, bob = self.connect(self.alice), self.connect(self.bob)
+        for communicator in (alice, bob):
+            self.assertTrue((await communicator.connect())[0])
+
+        # Task chỉ được đưa vào hàng đợi; câu trả lời tới sau, khi worker gửi vào group của người hỏi
+        with mock.patch('sales.consumers.process_chat_message.delay') as delay:
+            await alice.send_json_to({'message': 'xem lịch sử mua hàng'})
+            self.assertEqual((await alice.receive_json_from())['username'], 'alice')
+            self.assertTrue(await alice.receive_nothing())
+        message, username, reply_to = delay.call_args.args
+        self.assertEqual((message, username, reply_to), ('xem lịch sử mua hàng', 'alice', f'chat_user_{self.alice.id}'))
+
+        await sync_to_async(tasks.send_chat_event)(reply_to, {'type': 'chat_message', 'message': 'xong', 'username': 'System'})
+        self.assertEqual(await alice.receive_json_from(), {'message': 'xong', 'username': 'System'})
+        self.assertTrue(await bob.receive_nothing())
+        for communicator in (alice, bob):
+            await communicator.disconnect()
+
+
+class BlockAllocatorTests(TestCase):
+    def test_allocates_consecutive_numbers_within_block(self):
+        allocator = BlockAllocator('test', block_size=5)
+        self.assertEqual([allocator.allocate() for _ in range(7)], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(Sequence.objects.get(name='test').next_value, 11)
+
+    def test_reset_discards_reserved_block(self):
+        allocator = BlockAllocator('test', block_size=5)
+        allocator.allocate()
+        allocator.reset()
+        self.assertEqual(allocator.allocate(), 6)
+
+
+class OrderCodeReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        cls.product = Product.objects.create(product_code='P1', product_name='Sản phẩm 1', price=1000)
+
+    def setUp(self):
+        order_codes.reset()
+        self.addCleanup(order_codes.reset)
+
+    def test_explicit_and_imported_codes_advance_the_sequence(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_order(self.customer, [(self.product.id, 1)], order_code='ORD0000050')
+        self.assertEqual(create_order(self.customer, [(self.product.id, 1)])[0].order_code, 'ORD0000051')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderImporter().run(io.BytesIO(import_csv([('2024-05-01T10:00:00', 'ORD0000900', 'C1', 'P1', 1, 1000)])))
+        order_codes.reset()  # khối mới của một worker khác
+        self.assertEqual(create_order(self.customer, [(self.product.id, 1)])[0].order_code, 'ORD0000901')
+
+    def test_generated_code_taken_inside_held_block_is_reallocated(self):
+        with mock.patch.object(order_codes, 'block_size', 20):
+            self.assertEqual(create_order(self.customer, [(self.product.id, 1)])[0].order_code, 'ORD0000001')
+            # Mã do tiến trình khác ghi thẳng, nằm trong khối [1, 21) tiến trình này đang giữ
+            Order.objects.create(order_code='ORD0000002', customer=self.customer, created_at=timezone.now())
+            self.assertEqual(create_order(self.customer, [(self.product.id, 1)])[0].order_code, 'ORD0000021')
+        with self.assertRaises(OrderError):
+            create_order(self.customer, [(self.product.id, 1)], order_code='ORD0000002')
+
+
+# SQLite khoá cả file khi ghi nên các luồng báo "database table is locked" thay vì chờ khoá dòng
+@skipIf(connection.vendor == 'sqlite', 'needs row-level locking (PostgreSQL/MySQL)')
+class BlockAllocatorConcurrencyTests(TransactionTestCase):
+    def test_concurrent_workers_never_share_a_code(self):
+        workers, per_worker = 8, 60
+        results = [[] for _ in range(workers)]
+        errors = []
+        barrier = threading.Barrier(workers)
+
+        def work(index):
+            # Mỗi luồng có allocator riêng, giống một tiến trình worker Celery
+            allocator = BlockAllocator('order_code', block_size=7)
+            try:
+                barrier.wait()
+                for _ in range(per_worker):
+                    results[index].append(f'ORD{allocator.allocate():07d}')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        codes = [code for result in results for code in result]
+        self.assertEqual(len(codes), workers * per_worker)
+        self.assertEqual(len(set(codes)), len(codes))
+
+
+class OrderDetailMigrationTests(TransactionTestCase):
+    def test_duplicate_lines_are_merged_before_unique_constraint(self):
+        # Bảng orderdetail đã bị xoá ở 0015: dựng lại theo trạng thái sau 0008 rồi chạy hàm của 0009
+        migration = importlib.import_module('sales.migrations.0009_orderdetail_indexes')
+        apps = MigrationLoader(connection).project_state(('sales', '0008_sequence')).apps
+        OrderDetail = apps.get_model('sales', 'OrderDetail')
+        customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        product = Product.objects.create(product_code='P1', product_name='Sản phẩm 1', price=1000)
+        other = Product.objects.create(product_code='P2', product_name='Sản phẩm 2', price=500)
+        with connection.schema_editor() as editor:
+            editor.create_model(OrderDetail)
+        try:
+            now = timezone.now()
+            keep, _, single = OrderDetail.objects.bulk_create([
+                OrderDetail(order_code='O1', customer_id=customer.id, product_id=product.id, created_at=now, quantity=2, total_price=2000),
+                OrderDetail(order_code='O1', customer_id=customer.id, product_id=product.id, created_at=now, quantity=3, total_price=3000),
+                OrderDetail(order_code='O1', customer_id=customer.id, product_id=other.id, created_at=now, quantity=1, total_price=500),
+            ])
+            migration.remove_duplicate_order_lines(apps, None)
+            rows = list(OrderDetail.objects.order_by('id').values_list('id', 'quantity', 'total_price'))
+            self.assertEqual(rows, [(keep.id, 5, 5000), (single.id, 1, 500)])
+        finally:
+            with connection.schema_editor() as editor:
+                editor.delete_model(OrderDetail)
+
+
+class IntentRouterTests(SimpleTestCase):
+    def route(self, text):
+        intent, message, slots = router.route(text)
+        return intent.name, slots
+
+    def test_normalize_keeps_length(self):
+        text = 'Đặt HÀNG 2 bánh mì'
+        self.assertEqual(normalize(text), 'dat hang 2 banh mi')
+        self.assertEqual(len(normalize(text)), len(text))
+
+    def test_routes_intents(self):
+        self.assertEqual(self.route('Xin chào'), ('greeting', {}))
+        self.assertEqual(self.route('cho tôi xem lịch sử mua hàng'), ('order_history', {}))
+        self.assertEqual(self.route('kiem tra lich su dat hang'), ('order_history', {}))
+        self.assertEqual(self.route('Xem thêm'), ('order_history_more', {}))
+        self.assertEqual(self.route('hôm nay trời đẹp'), ('fallback', {}))
+
+    def test_order_without_items_falls_through(self):
+        self.assertEqual(self.route('mua gì bây giờ?'), ('fallback', {}))
+
+    def test_extracts_order_items_from_original_text(self):
+        name, slots = self.route('Tôi muốn đặt hàng 2 Bánh Mì và 3 sữa tươi, 1 nước cam.')
+        self.assertEqual(name, 'order')
+        self.assertEqual(slots['items'], [[2, 'Bánh Mì'], [3, 'sữa tươi'], [1, 'nước cam']])
+
+    def test_ignores_oversized_quantities(self):
+        self.assertEqual(parse_order_items(Message('mua ' + '9' * 50 + ' bánh')), [])
+
+    def test_adversarial_messages_parse_in_bounded_time(self):
+        for label, text in adversarial_messages(20000):
+            started = time.perf_counter()
+            router.route(text)
+            self.assertLess(time.perf_counter() - started, 0.5, label)
+
+
+class ChatWriteBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='chat')
+
+    async def test_flushes_when_batch_is_full(self):
+        buffer = ChatWriteBuffer(flush_size=3, flush_interval=60)
+        for text in ('a', 'b'):
+            await buffer.add(self.user.id, text)
+        self.assertEqual(await Chat.objects.acount(), 0)
+        await buffer.add(self.user.id, 'c')
+        self.assertEqual([chat.message async for chat in Chat.objects.order_by('id')], ['a', 'b', 'c'])
+
+    async def test_flushes_after_interval(self):
+        buffer = ChatWriteBuffer(flush_size=100, flush_interval=0.01)
+        await buffer.add(self.user.id, 'a')
+        await asyncio.sleep(0.1)
+        self.assertEqual(await Chat.objects.acount(), 1)
+        self.assertEqual(buffer.pending, [])
+
+    def test_failed_batch_is_kept_for_retry(self):
+        buffer = ChatWriteBuffer()
+        buffer.pending = [Chat(user_id=self.user.id, message='a')]
+        with mock.patch.object(Chat.objects, 'bulk_create', side_effect=OperationalError('database is down')), \
+                self.assertLogs('sales.chat_buffer', 'ERROR'):
+            buffer.flush_sync()
+        self.assertEqual(len(buffer.pending), 1)
+        buffer.flush_sync()
+        self.assertEqual(Chat.objects.get().message, 'a')
+
+    def test_poison_row_is_dropped_without_blocking_the_batch(self):
+        bulk_create = Chat.objects.bulk_create
+
+        def reject_bad(chats, **kwargs):
+            if any(chat.message == 'bad' for chat in chats):
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return bulk_create(chats, **kwargs)
+
+        buffer = ChatWriteBuffer()
+        buffer.pending = [Chat(user_id=self.user.id, message=text) for text in ('a', 'bad', 'b')]
+        with mock.patch.object(Chat.objects, 'bulk_create', side_effect=reject_bad), \
+                self.assertLogs('sales.chat_buffer', 'ERROR') as logs:
+            buffer.flush_sync()
+        self.assertEqual(buffer.pending, [])
+        self.assertEqual(sorted(Chat.objects.values_list('message', flat=True)), ['a', 'b'])
+        self.assertIn('Dropped chat message', logs.output[-1])
+
+    async def test_pending_is_capped_while_database_is_down(self):
+        buffer = ChatWriteBuffer(flush_size=2, flush_interval=60, max_pending=3)
+        with mock.patch.object(Chat.objects, 'bulk_create', side_effect=OperationalError('database is down')), \
+                self.assertLogs('sales.chat_buffer', 'ERROR') as logs:
+            for text in 'abcde':
+                await buffer.add(self.user.id, text)
+        buffer.timer.cancel()
+        self.assertEqual([chat.message for chat in buffer.pending], ['c', 'd', 'e'])
+        self.assertTrue(any('dropped' in line for line in logs.output))
+
+
+class ProductIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = ProductIndex([
+            (1, 'P1', 'Bánh mì', 15000),
+            (2, 'P2', 'Bánh mì thịt', 25000),
+            (3, 'P3', 'Sữa tươi', 12000),
+            (4, 'P4', 'Nước cam', 20000),
+        ], version=1)
+
+    def names(self, query):
+        return [entry.product_name for _, entry in self.index.search(query)]
+
+    def test_exact_match_ignores_case_and_diacritics(self):
+        self.assertEqual(self.index.best('BANH MI').id, 1)
+        self.assertEqual(self.index.best('sua tuoi').id, 3)
+        self.assertEqual(self.index.best('nuoccam').id, 4)
+
+    def test_prefix_ranks_shorter_names_first(self):
+        self.assertEqual(self.names('bánh'), ['Bánh mì', 'Bánh mì thịt'])
+
+    def test_fuzzy_match_tolerates_typos(self):
+        self.assertEqual(self.index.best('sữa tưới').id, 3)
+        self.assertIsNone(self.index.best('xyz'))
+
+    def test_add_and_remove(self):
+        self.index.add(3, 'P3', 'Sữa chua', 9000)
+        self.index.remove(4)
+        self.assertEqual(self.index.best('sua chua').price, 9000)
+        self.assertIsNone(self.index.best('nuoc cam'))
+
+
+class ProductIndexRefreshTests(TestCase):
+    def setUp(self):
+        product_index.cache.delete(product_index.VERSION_KEY)
+        Product.objects.create(product_code='P1', product_name='Bánh mì', price=15000)
+
+    def test_applies_recorded_changes_without_rebuilding(self):
+        index = product_index.load_index()
+        product = Product.objects.create(product_code='P2', product_name='Sữa tươi', price=12000)
+        product_index.record_change(product.id)
+        with self.assertNumQueries(1):
+            self.assertIs(product_index.refresh(index), index)
+        self.assertEqual(index.best('sua tuoi').id, product.id)
+        with self.assertNumQueries(0):
+            index.best('banh mi')
+
+    def test_invalidate_forces_rebuild(self):
+        index = product_index.load_index()
+        product_index.invalidate()
+        self.assertIsNot(product_index.refresh(index), index)
+
+
+class CreateOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        cls.products = Product.objects.bulk_create([
+            Product(product_code=f'P{i}', product_name=f'Sản phẩm {i}', price=1000 * (i + 1)) for i in range(100)
+        ])
+
+    def test_query_count_does_not_grow_with_lines(self):
+        # in_bulk + savepoint + header + bulk_create dòng + release savepoint (ngày rollup ghi sau commit)
+        for count in (1, 10, 100):
+            lines = [(product.id, 2) for product in self.products[:count]]
+            with self.assertNumQueries(5):
+                order, _ = create_order(self.customer, lines, order_code=f'T{count}')
+            self.assertEqual(order.lines.count(), count)
+            self.assertEqual(order.total_price, sum(product.price * 2 for product in self.products[:count]))
+
+    def test_merges_duplicates_and_computes_totals(self):
+        product = self.products[0]
+        order, lines = create_order(self.customer, [(product.id, 2), (str(product.id), '3')], order_code='T1')
+        self.assertEqual([(line.quantity, line.total_price) for line in lines], [(5, 5 * product.price)])
+        self.assertEqual(Order.objects.get(order_code='T1').total_price, 5 * product.price)
+
+    def test_invalid_lines_write_nothing(self):
+        for lines in ([(self.products[0].id, 1), (0, 1)], [(self.products[0].id, 0)], []):
+            with self.assertRaises(OrderError):
+                create_order(self.customer, lines, order_code='T1')
+        self.assertFalse(Order.objects.exists())
+
+    def test_duplicate_order_code_is_rejected(self):
+        create_order(self.customer, [(self.products[0].id, 1)], order_code='T1')
+        with self.assertRaises(OrderError):
+            create_order(self.customer, [(self.products[1].id, 1)], order_code='T1')
+        self.assertEqual(OrderLine.objects.count(), 1)
+
+    def test_line_changes_keep_stored_total(self):
+        order, lines = create_order(self.customer, [(self.products[0].id, 1), (self.products[1].id, 1)])
+        lines[0].total_price = 5000
+        lines[0].save()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 7000)
+        lines[1].delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 5000)
+
+
+class CustomerResolutionTests(TestCase):
+    def test_matches_name_ignoring_case_diacritics_and_spaces(self):
+        customer = Customer.objects.create(customer_code='C1', name='Nguyễn Văn Đức')
+        self.assertEqual(customer.name_key, 'nguyen van duc')
+        # Chuỗi tổ hợp (NFD) cũng khớp dạng dựng sẵn
+        for name in ('nguyen van duc', '  NGUYỄN   văn đức ', 'Nguye\u0302\u0303n Va\u0306n \u0110u\u031bc'):
+            self.assertEqual(resolve_customer(name), (customer, False))
+
+    def test_duplicate_names_resolve_to_oldest_customer(self):
+        first = Customer.objects.create(customer_code='C1', name='Trần An')
+        Customer.objects.create(customer_code='C2', name='TRẦN AN')
+        self.assertEqual(resolve_customer('tran an'), (first, False))
+
+    def test_creates_customers_with_unique_codes(self):
+        first, created = resolve_customer('Lê Bình')
+        second, _ = resolve_customer('Phạm Chi')
+        self.assertTrue(created)
+        self.assertEqual(first.name, 'Lê Bình')
+        self.assertNotEqual(first.customer_code, second.customer_code)
+        with self.assertRaises(OrderError):
+            resolve_customer('   ')
+
+    def test_autocomplete_returns_prefix_matches_in_name_order(self):
+        user = User.objects.create(username='api', is_staff=True)
+        for code, name in [('C1', 'Nguyễn Văn B'), ('C2', 'Ngô An'), ('C3', 'nguyễn văn a'), ('C4', 'Lê Nguyễn')]:
+            Customer.objects.create(customer_code=code, name=name)
+        self.assertEqual([c['customer_code'] for c in autocomplete_customers('NGUYEN v')], ['C3', 'C1'])
+        self.assertEqual(autocomplete_customers(''), [])
+
+        client = APIClient()
+        client.force_authenticate(user)
+        data = client.get('/sales/api/customers/autocomplete/', {'q': 'ng', 'limit': 2}).json()
+        self.assertEqual([c['name'] for c in data], ['Ngô An', 'nguyễn văn a'])
+
+
+class BulkApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='api', is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upserts_customers_from_json_array(self):
+        Customer.objects.create(customer_code='C1', name='Cũ', segment_code='SEG0')
+        records = [
+            {'customer_code': 'C1', 'name': 'Nguyễn An', 'segment_code': 'SEG1'},
+            {'customer_code': 'C2', 'name': 'Trần Bình', 'segment_code': 'SEG1', 'segment_description': 'Sỉ'},
+        ]
+        response = self.client.post('/sales/api/customers/bulk/', records, format='json')
+        self.assertEqual(response.json(), {'success': True, 'created': 1, 'updated': 1})
+        self.assertEqual(list(Customer.objects.order_by('customer_code').values_list('name', 'name_key')),
+                         [('Nguyễn An', 'nguyen an'), ('Trần Bình', 'tran binh')])
+
+    def test_upserts_products_from_ndjson(self):
+        body = '\n'.join(json.dumps({'product_code': f'P{i}', 'product_name': f'Sản phẩm {i}', 'group_code': 'G1',
+                                      'group_name': 'Nhóm 1', 'price': 1000 * i}) for i in range(3))
+        response = self.client.post('/sales/api/products/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(Product.objects.get(product_code='P2').price, 2000)
+
+        response = self.client.post('/sales/api/products/bulk/', '{"product_code": ', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    def test_orders_resolve_codes_and_reject_unknown_ones(self):
+        Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        Product.objects.create(product_code='P1', product_name='Sản phẩm 1', price=1000)
+        Product.objects.create(product_code='P2', product_name='Sản phẩm 2', price=2000)
+        order = {'order_code': 'O1', 'customer_code': 'C1', 'created_at': '2024-05-01T10:00:00',
+                 'lines': [{'product_code': 'P1', 'quantity': 2}, {'product_code': 'P2', 'quantity': 1, 'total_price': 1500}]}
+        bad = {**order, 'order_code': 'O2', 'customer_code': 'C9', 'lines': [{'product_code': 'P9', 'quantity': 1}]}
+
+        response = self.client.post('/sales/api/orders/bulk/', [order, bad], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertEqual(set(response.json()[1]), {'customer_code', 'lines'})
+        self.assertFalse(Order.objects.exists())
+
+        # Khách hàng, sản phẩm, đơn đã có + savepoint, upsert đơn, upsert dòng, tổng tiền, release
+        # (ngày rollup ghi sau commit)
+        with self.assertNumQueries(8):
+            response = self.client.post('/sales/api/orders/bulk/', [order], format='json')
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(Order.objects.get(order_code='O1').total_price, 3500)
+
+    def test_exports_stream_ndjson_and_csv(self):
+        make_orders([('O1', Customer.objects.create(customer_code='C1', name='Khách hàng 1'),
+                      timezone.now(), [(Product.objects.create(product_code='P1', product_name='Sản phẩm 1', price=1000), 2, 2000)])])
+        response = self.client.get('/sales/api/orders/export/', {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['order_code'], row['customer_code'], row['product_code'], row['total_price']) for row in rows],
+                         [('O1', 'C1', 'P1', 2000)])
+
+        response = self.client.get('/sales/api/customers/export/', {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(),
+                         ['id,customer_code,name,segment_code,segment_description',
+                          f'{Customer.objects.get().id},C1,Khách hàng 1,,'])
+
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await Customer.objects.acreate(customer_code='C1', name='Khách hàng 1')
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/sales/api/customers/export/', {'format': 'ndjson'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(json.loads(content)['customer_code'], 'C1')
+
+        produced = []
+
+        def lines():
+            for i in range(3):
+                produced.append(i)
+                yield f'{i}\n'
+
+        chunks = bulk.aiter_chunks(lines())
+        self.assertEqual(await chunks.__anext__(), '0\n')
+        self.assertEqual(produced, [0])  # chưa đọc trước các chunk sau
+        self.assertEqual([chunk async for chunk in chunks], ['1\n', '2\n'])
+
+
+class FastSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='api', is_staff=True)
+        customers = [
+            Customer.objects.create(customer_code='C1', name='Nguyễn \u2028 "An"', segment_code='SEG1', user=cls.user),
+            Customer.objects.create(customer_code='C2', name='Trần Bình'),
+        ]
+        products = Product.objects.bulk_create([
+            Product(product_code=f'P{i}', product_name=f'Sản phẩm {i}', group_code='G1', price=1000 * i) for i in range(3)
+        ])
+        now = timezone.now().replace(microsecond=123456)
+        make_orders([
+            (f'O{i}', customers[i % 2], now - timedelta(hours=i), [(product, i + 1, 1000) for product in products[:i % 3 + 1]])
+            for i in range(5)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_responses_match_model_serializers_byte_for_byte(self):
+        urls = [
+            '/sales/api/customers/', '/sales/api/customers/?pagination=cursor&page_size=1',
+            f'/sales/api/customers/{Customer.objects.get(customer_code="C1").id}/',
+            '/sales/api/products/', '/sales/api/orders/?count=false&page_size=2', '/sales/api/orders/O3/',
+            '/sales/api/orders/?pagination=cursor&page_size=2', '/sales/api/orderlines/?order=1',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with self.settings(SALES_FAST_SERIALIZERS=False), CaptureQueriesContext(connection) as slow:
+                    expected = self.client.get(url)
+                cache.clear()  # không để response thứ hai đọc từ cache HTTP
+                with CaptureQueriesContext(connection) as fast:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                self.assertLessEqual(len(fast), len(slow))
+
+    def test_customer_name_key_is_not_exposed(self):
+        self.addCleanup(cache.clear)
+        for fast in (True, False):
+            with self.subTest(fast=fast), self.settings(SALES_FAST_SERIALIZERS=fast):
+                cache.clear()
+                customer = self.client.get('/sales/api/customers/').json()['results'][0]
+                self.assertNotIn('name_key', customer)
+        response = self.client.post('/sales/api/customers/', {
+            'customer_code': 'C9', 'name': 'Đỗ Hà', 'segment_code': 'SEG1', 'segment_description': 'Lẻ', 'name_key': 'x',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Customer.objects.get(customer_code='C9').name_key, 'do ha')
+
+
+class HttpCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        cls.product = Product.objects.create(product_code='P1', product_name='Sản phẩm 1', group_code='G1', price=1000)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_catalog_responses_are_cached_and_revalidated(self):
+        first = self.client.get('/sales/api/products/')
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            hit = self.client.get('/sales/api/products/')
+            not_modified = self.client.get('/sales/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(hit.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get('/sales/api/products/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 2000
+            self.product.save()
+        changed = self.client.get('/sales/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.json()['results'][0]['price'], 2000)
+
+        stats = self.client.get('/sales/api/metrics/').json()['http_cache']['products']
+        self.assertEqual((stats['miss'], stats['hit'], stats['not_modified']), (2, 1, 2))
+        self.assertEqual(stats['bytes_saved'], 2 * len(first.content))
+        self.assertEqual(stats['hit_ratio'], 0.6)
+
+    def test_html_list_answers_not_modified(self):
+        self.client.force_login(self.user)
+        self.client.get('/sales/products/')  # lần đầu đặt cookie CSRF (một phần của ETag)
+        etag = self.client.get('/sales/products/')['ETag']
+        self.assertEqual(self.client.get('/sales/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/sales/products/?group=G1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_metrics_are_admin_only(self):
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=False))
+        self.assertEqual(self.client.get('/sales/api/metrics/').status_code, 403)
+
+
+class OrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='history')
+        cls.customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1', user=cls.user)
+        products = Product.objects.bulk_create([
+            Product(product_code=f'P{i}', product_name=f'Sản phẩm {i}', price=1000) for i in range(3)
+        ])
+        now = timezone.now()
+        # 60 đơn hàng, mỗi đơn 3 dòng, đơn sau mới hơn đơn trước
+        make_orders([
+            (f'H{order:04d}', cls.customer, now - timedelta(minutes=order), [(product, 1, 1000) for product in products])
+            for order in range(60)
+        ])
+
+    def setUp(self):
+        cache.delete(tasks.history_cursor_key('history'))
+
+    def order_codes(self, text):
+        return [line.split()[3] for line in text.splitlines() if line.startswith('Mã đơn hàng')]
+
+    def test_pages_load_whole_orders(self):
+        orders, cursor = tasks.order_history_page(self.customer, limit=3)
+        self.assertEqual([order.order_code for order in orders], ['H0000', 'H0001', 'H0002'])
+        self.assertTrue(all(len(order.lines.all()) == 3 for order in orders))
+        orders, cursor = tasks.order_history_page(self.customer, cursor, limit=3)
+        self.assertEqual(orders[0].order_code, 'H0003')
+
+    @mock.patch.object(tasks, 'HISTORY_PAGE_ORDERS', 3)
+    def test_show_more_continues_from_cursor(self):
+        # Mỗi trang là hai truy vấn (đơn hàng, các dòng kèm sản phẩm), không nạp riêng cho từng dòng
+        with self.assertNumQueries(2 + 2 * tasks.HISTORY_FRAMES_PER_REQUEST):
+            first = tasks.route_chat_message('xem lịch sử mua hàng', 'history')
+        replies = [first] + [tasks.route_chat_message('xem thêm', 'history') for _ in range(4)]
+        codes = [code for reply in replies for code in self.order_codes(reply)]
+        # 3 đơn/frame, 4 frame mỗi lượt
+        self.assertEqual(codes, [f'H{order:04d}' for order in range(60)])
+        self.assertIn('xem thêm', first)
+        self.assertIn('Đã hiển thị hết', replies[-1])
+        self.assertIsNone(cache.get(tasks.history_cursor_key('history')))
+        self.assertIn('Không còn', tasks.route_chat_message('xem thêm', 'history'))
+
+
+class SwitchablePaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='api', is_staff=True)
+        customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        product = Product.objects.create(product_code='P1', product_name='Sản phẩm 1', price=1000)
+        now = timezone.now()
+        # Nhiều đơn trùng created_at để kiểm tra cursor không lặp/bỏ sót
+        make_orders([
+            (f'O{i:03d}', customer, now - timedelta(minutes=i // 4), [(product, 1, 1000)]) for i in range(25)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_default_page_number_keeps_count(self):
+        data = self.client.get('/sales/api/orders/', {'page_size': 10}).json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(len(data['results']), 10)
+
+    def test_countless_pages_skip_count_query(self):
+        # Trang đơn hàng + các dòng của trang, không COUNT
+        with self.assertNumQueries(2):
+            data = self.client.get('/sales/api/orders/', {'page_size': 10, 'count': 'false', 'page': 3}).json()
+        self.assertNotIn('count', data)
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNone(data['next'])
+        self.assertIn('page=2', data['previous'])
+
+    def test_cursor_walks_every_row_once(self):
+        url, params, seen = '/sales/api/orders/', {'pagination': 'cursor', 'page_size': 10}, []
+        while url:
+            data = self.client.get(url, params).json()
+            seen += [row['id'] for row in data['results']]
+            url, params = data['next'], None
+        self.assertEqual(sorted(seen), sorted(Order.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_cursor_keyset_with_shared_timestamp(self):
+        # Mọi đơn cùng một created_at: cursor phải mang cả id, không quay về OFFSET
+        Order.objects.update(created_at=timezone.now())
+        url, params, seen = '/sales/api/orders/', {'pagination': 'cursor', 'page_size': 4}, []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                data = self.client.get(url, params).json()
+                seen += [row['id'] for row in data['results']]
+                url, params = data['next'], None
+        self.assertEqual(seen, list(Order.objects.order_by('-id').values_list('id', flat=True)))
+        self.assertFalse([query['sql'] for query in queries if 'OFFSET' in query['sql'].upper()])
+
+        previous = self.client.get(data['previous']).json()
+        self.assertEqual([row['id'] for row in previous['results']], seen[-5:-1])
+
+    def test_chat_cursor_with_shared_timestamp(self):
+        other = User.objects.create(username='khac')
+        Chat.objects.bulk_create([Chat(user=self.user, message=f'm{i}') for i in range(11)] + [Chat(user=other, message='x')])
+        stamp = timezone.now()
+        Chat.objects.filter(id__in=Chat.objects.filter(user=self.user).order_by('id')[3:9].values('id')).update(timestamp=stamp)
+        expected = list(Chat.objects.filter(user=self.user).order_by('-timestamp', '-id').values_list('id', flat=True))
+        url, params, seen = '/sales/api/chat/', {'pagination': 'cursor', 'page_size': 4}, []
+        while url:
+            data = self.client.get(url, params).json()
+            seen += [row['id'] for row in data['results']]
+            url, params = data['next'], None
+        self.assertEqual(seen, expected)
+
+    def test_cursor_invalid_returns_404(self):
+        response = self.client.get('/sales/api/orders/', {'pagination': 'cursor', 'cursor': 'rác'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OrdersByProductBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='api', is_staff=True)
+        customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        cls.products = Product.objects.bulk_create([
+            Product(product_code=f'P{i}', product_name=f'Sản phẩm {i}', price=1000) for i in range(12)
+        ])
+        now = timezone.now()
+        # Sản phẩm i có i đơn hàng
+        make_orders([
+            (f'O{i}-{n}', customer, now, [(product, n + 1, 1000)])
+            for i, product in enumerate(cls.products) for n in range(i)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_returns_top_orders_per_product_in_constant_queries(self):
+        # COUNT sản phẩm, trang sản phẩm, số đơn theo nhóm, đơn hàng theo ROW_NUMBER
+        with self.assertNumQueries(4):
+            response = self.client.get('/sales/api/search/orders_by_product/batch/',
+                                       {'page_size': 10, 'orders_per_product': 5})
+        data = response.json()
+        self.assertEqual(data['count'], 12)
+        self.assertEqual(len(data['results']), 10)
+        for i, product in enumerate(data['results']):
+            self.assertEqual(product['total_orders'], i)
+            self.assertEqual([order['quantity'] for order in product['orders']], list(range(1, min(i, 5) + 1)))
+            self.assertEqual(product['has_more_orders'], i > 5)
+
+    def test_rejects_invalid_limits(self):
+        response = self.client.get('/sales/api/search/orders_by_product/batch/', {'orders_per_product': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrdersByCustomerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='api', is_staff=True)
+        cls.customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        products = Product.objects.bulk_create([
+            Product(product_code=f'P{i}', product_name=f'Sản phẩm {i}', price=1000) for i in range(30)
+        ])
+        start = timezone.make_aware(datetime(2024, 1, 1, 12))
+        # 30 đơn, mỗi ngày một đơn từ 01/01/2024, mỗi đơn hai dòng
+        make_orders([
+            (f'O{i:02d}', cls.customer, start + timedelta(days=i), [(product, i, 1000), (products[i - 1], 1, 500)])
+            for i, product in enumerate(products)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        response = self.client.get('/sales/api/search/orders_by_customer/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results'][0]
+
+    def test_pages_orders_newest_first(self):
+        for lean in ('false', 'true'):
+            first = self.get(order_page_size=10, lean=lean)
+            third = self.get(order_page_size=10, order_page=3, lean=lean)
+            self.assertEqual([order['lines'][0]['quantity'] for order in first['orders']], list(range(29, 19, -1)))
+            self.assertTrue(first['orders_pagination']['has_next'])
+            self.assertEqual([order['lines'][0]['quantity'] for order in third['orders']], list(range(9, -1, -1)))
+            self.assertFalse(third['orders_pagination']['has_next'])
+            self.assertEqual([line['product_code'] for line in first['orders'][0]['lines']], ['P29', 'P28'])
+            self.assertEqual(first['orders'][0]['total_price'], 1500)
+
+    def test_filters_by_date_range(self):
+        for lean in ('false', 'true'):
+            data = self.get(date_from='2024-01-05', date_to='2024-01-07', lean=lean)
+            self.assertEqual([order['order_code'] for order in data['orders']], ['O06', 'O05', 'O04'])
+
+
+class SearchViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='staff', is_staff=True)
+        cls.customers = Customer.objects.bulk_create([
+            Customer(customer_code=f'C{i}', name=f'Khách hàng {i}') for i in range(3)
+        ])
+        cls.products = Product.objects.bulk_create([
+            Product(product_code=f'P{i}', product_name=f'Sản phẩm {i}', price=1000) for i in range(3)
+        ])
+
+    def add_orders(self, count):
+        now = timezone.now()
+        start = Order.objects.count()
+        make_orders([
+            (f'O{i}', self.customers[i % 3], now, [(self.products[i % 2], 2, 1000)])
+            for i in range(start, start + count)
+        ])
+
+    def query_count(self, url):
+        self.client.force_login(self.user)
+        self.client.get(url)  # nạp session trước khi đếm
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_depend_on_data_size(self):
+        urls = [f'/sales/search/product_customers/{self.products[0].id}/',
+                f'/sales/search/customer_orders/{self.customers[0].id}/']
+        self.add_orders(6)
+        small = [self.query_count(url)[0] for url in urls]
+        self.add_orders(600)
+        self.assertEqual([self.query_count(url)[0] for url in urls], small)
+
+    def test_groups_totals_per_customer(self):
+        self.add_orders(6)
+        _, response = self.query_count(f'/sales/search/product_customers/{self.products[0].id}/')
+        self.assertEqual(response.context['totals']['lines'], 3)
+        rows = {row['order__customer__customer_code']: (row['lines'], row['quantity'], row['revenue'])
+                for row in response.context['customers']}
+        self.assertEqual(rows, {'C0': (1, 2, 1000), 'C1': (1, 2, 1000), 'C2': (1, 2, 1000)})
+
+    def test_order_detail_loads_multi_line_order(self):
+        make_orders([('M1', self.customers[0], timezone.now(), [(product, 1, 1000) for product in self.products])])
+        _, response = self.query_count('/sales/order/M1/')
+        self.assertEqual(response.context['order'].total_price, 3000)
+        self.assertEqual(len(response.context['lines']), 3)
+
+
+class QueryProfilerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        cls.customers = Customer.objects.bulk_create([Customer(customer_code=f'C{i}', name=f'Khách {i}') for i in range(6)])
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_flags_repeated_queries_by_call_site(self):
+        with profiling.profile('test', 'loop') as profile:
+            names = [Customer.objects.get(pk=customer.pk).name for customer in self.customers]
+            Customer.objects.get(pk=self.customers[0].pk)
+        self.assertEqual(len(names), 6)
+        self.assertEqual(profile.queries, 7)
+        self.assertEqual(profile.duplicates, 1)
+        [(site, sql, count)] = profile.nplusone()
+        self.assertIn('sales/tests.py', site)
+        self.assertEqual(count, 6)
+        self.assertIn('WHERE "sales_customer"."id" = %s', sql)
+        with self.assertRaises(AssertionError):
+            profile.check()
+        profile.check(max_queries=7, nplusone=True)
+
+        with profiling.profile('test', 'batch') as profile:
+            list(Customer.objects.filter(pk__in=[customer.pk for customer in self.customers]))
+        profile.check(max_queries=1)
+
+    def test_middleware_aggregates_per_view(self):
+        with self.settings(SALES_QUERY_PROFILER=True):
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            client.get('/sales/api/customers/')
+            client.get('/sales/api/customers/')
+            queries = client.get('/sales/api/metrics/').json()['queries']
+        unit = queries['http GET customer-list']
+        self.assertEqual(unit['count'], 2)
+        self.assertGreater(unit['avg_queries'], 0)
+        self.assertEqual(unit['nplusone'], {})
+
+    def test_tasks_are_profiled(self):
+        with self.settings(SALES_QUERY_PROFILER=True), mock.patch('sales.tasks.send_chat_event'):
+            profiling.connect()
+            tasks.get_order_history.delay('nobody')
+        self.assertEqual(profiling.summary()['task sales.tasks.get_order_history']['count'], 1)
+
+
+class ChatTracingTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_histograms_export_prometheus_text(self):
+        metrics.observe('demo_seconds', 0.004, span='a')
+        metrics.observe('demo_seconds', 0.5, span='a')
+        metrics.incr('demo_total', kind='x"y')
+        text = metrics.prometheus()
+        self.assertIn('# TYPE demo_seconds histogram', text)
+        self.assertIn('demo_seconds_bucket{span="a",le="0.005"} 1', text)
+        self.assertIn('demo_seconds_bucket{span="a",le="+Inf"} 2', text)
+        self.assertIn('demo_seconds_count{span="a"} 2', text)
+        self.assertIn('demo_total{kind="x\\"y"} 1', text)
+
+    def test_trace_follows_message_to_task_and_back(self):
+        trace = tracing.Trace()
+        with trace.span('consumer.parse'):
+            pass
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch('sales.tasks.get_channel_layer', return_value=layer):
+            tasks.process_chat_message('xin chào', 'nobody', 'room', trace=trace.context())
+        (group, event), (staff_group, staff_event) = [call.args for call in layer.group_send.call_args_list]
+        self.assertEqual((group, staff_group), ('room', 'chat_staff'))
+        self.assertNotIn('trace', staff_event)  # bản gửi nhân viên không đo lại roundtrip
+        self.assertEqual(event['trace']['id'], trace.id)
+        self.assertTrue(event['trace']['final'])
+        spans = [name for name, _ in event['trace']['spans']]
+        self.assertEqual(spans, ['consumer.parse', 'task.queue_wait', 'task.route', 'task.intent.greeting', 'task.db'])
+
+        consumer = ChatConsumer()
+        consumer.send = mock.AsyncMock()
+        with self.assertLogs('sales.tracing', 'INFO') as logs:
+            asyncio.run(consumer.chat_message(event))
+        self.assertEqual(json.loads(consumer.send.call_args.kwargs['text_data'])['trace_id'], trace.id)
+        self.assertIn(trace.id, logs.output[0])
+        spans = {labels['span']: count for name, labels, _, _, count in metrics.histograms() if name == tracing.CHAT_SPAN_METRIC}
+        self.assertEqual(spans, {'channel.delivery': 1, 'task.queue_wait': 1, 'task.route': 1, 'task.intent.greeting': 1, 'task.db': 1})
+
+        text = self.client.get('/sales/metrics/').content.decode()
+        self.assertIn(f'{tracing.CHAT_ROUNDTRIP_METRIC}_count 1', text)
+        self.assertEqual(self.client.get('/sales/metrics/', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+
+class StatisticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(customer_code='C1', name='Khách hàng 1')
+        cls.product = Product.objects.create(product_code='P1', product_name='Sản phẩm 1', price=1000)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dashboard_is_served_from_cache(self):
+        stats = statistics.dashboard()
+        self.assertEqual((stats['customers'], stats['products'], stats['orders']), (1, 1, 0))
+        with self.assertNumQueries(0):
+            statistics.dashboard()
+
+    def test_new_orders_update_counters_without_recounting(self):
+        statistics.dashboard()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_order(self.customer, [(self.product.id, 3)], order_code='S1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(customer_code='C2', name='Khách hàng 2')
+        with self.assertNumQueries(0):
+            stats = statistics.dashboard()
+        self.assertEqual((stats['customers'], stats['orders']), (2, 1))
+        self.assertEqual(stats['revenue_per_day'][-1], {'date': timezone.localdate(), 'revenue': 3000})
+
+    def test_invalidate_recounts(self):
+        statistics.dashboard()
+        make_orders([('S1', self.customer, timezone.now(), [(self.product, 1, 500)])])
+        statistics.invalidate()
+        stats = statistics.dashboard()
+        self.assertEqual(stats['orders'], 1)
+        self.assertEqual(stats['top_products'][0]['revenue'], 500)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='api', is_staff=True)
+        cls.customers = Customer.objects.bulk_create([
+            Customer(customer_code=f'C{i}', name=f'Khách hàng {i}', segment_code=f'SEG{i % 2}') for i in range(4)
+        ])
+        cls.products = Product.objects.bulk_create([
+            Product(product_code=f'P{i}', product_name=f'Sản phẩm {i}', group_code=f'GRP{i}', price=1000 * (i + 1))
+            for i in range(2)
+        ])
+        cls.day = timezone.make_aware(datetime(2024, 3, 10, 9))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Celery chạy eager: không để refresh hẹn sau commit chạy ngay và xoá các ngày bẩn cần kiểm tra
+        patcher = mock.patch('sales.rollups.schedule_refresh')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def order(self, code, customer, days=0, quantity=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_order(customer, [(self.products[0].id, quantity), (self.products[1].id, 1)],
+                                order_code=code, created_at=self.day + timedelta(days=days))
+
+    def get(self, action, **params):
+        response = self.client.get(f'/sales/api/analytics/{action}/', {'start': '2024-03-01', 'end': '2024-03-31', **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_refresh_rebuilds_only_dirty_days(self):
+        self.order('R1', self.customers[0])
+        self.order('R2', self.customers[1], days=1, quantity=3)
+        self.assertEqual(RollupDirtyDay.objects.count(), 2)
+        self.assertEqual(rollups.refresh(), 2)
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+        series = self.get('timeseries')['series']
+        self.assertEqual([(row['period'], row['revenue']) for row in series],
+                         [('2024-03-10', 3000), ('2024-03-11', 5000)])
+        segment = self.get('timeseries', dimension='segment', key='SEG1')['series']
+        self.assertEqual([row['revenue'] for row in segment], [5000])
+
+    def test_updates_and_deletes_move_totals(self):
+        order, _ = self.order('R1', self.customers[0])
+        rollups.refresh()
+        order.created_at += timedelta(days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+            OrderLine.objects.get(order=order, product=self.products[1]).delete()
+        rollups.refresh()
+        self.assertEqual(list(DailySegmentSales.objects.values_list('date', 'revenue')),
+                         [(date(2024, 3, 12), 1000)])
+
+    def test_order_transaction_does_not_write_dirty_days(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_order(self.customers[0], [(self.products[0].id, 1)], order_code='R1', created_at=self.day)
+            self.assertFalse(RollupDirtyDay.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(RollupDirtyDay.objects.values_list('date', flat=True)), [date(2024, 3, 10)])
+
+    def test_rebuild_locks_the_day_before_replacing_rows(self):
+        self.order('R1', self.customers[0])
+        rollups.refresh()
+        self.order('R2', self.customers[1])
+        seen = []
+
+        def lock_day(day):
+            # Khoá phải được lấy trong transaction dựng lại, trước khi xoá dòng cũ của ngày
+            seen.append((day, connection.in_atomic_block, DailySegmentSales.objects.filter(date=day).count()))
+
+        with mock.patch('sales.rollups.lock_day', side_effect=lock_day):
+            rollups.refresh()
+        self.assertEqual(seen, [(date(2024, 3, 10), True, 1)])
+        self.assertEqual(sorted(DailySegmentSales.objects.values_list('segment_code', 'revenue')),
+                         [('SEG0', 3000), ('SEG1', 3000)])
+
+        # Trên PostgreSQL mỗi ngày một advisory lock riêng, cố định theo ngày
+        with mock.patch.object(connection, 'vendor', 'postgresql'), mock.patch.object(connection, 'cursor') as cursor:
+            rollups.lock_day(date(2024, 3, 10))
+            rollups.lock_day(date(2024, 3, 10))
+            rollups.lock_day(date(2024, 3, 11))
+        calls = [call.args for call in cursor.return_value.__enter__.return_value.execute.call_args_list]
+        self.assertEqual({sql for sql, _ in calls}, {'SELECT pg_advisory_xact_lock(%s)'})
+        self.assertEqual(calls[0], calls[1])
+        self.assertNotEqual(calls[0], calls[2])
+
+    def test_top_customers(self):
+        self.order('R1', self.customers[0])
+        self.order('R2', self.customers[2], quantity=5)
+        rollups.refresh()
+        with self.assertNumQueries(1):
+            top = self.get('top', dimension='customer', limit=1)['results']
+        self.assertEqual([(row['customer__customer_code'], row['revenue']) for row in top], [('C2', 7000)])
+        self.assertEqual(self.client.get('/sales/api/analytics/top/').status_code, 400)
+
+
+class ListViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='staff', is_staff=True)
+        cls.customers = Customer.objects.bulk_create([
+            Customer(customer_code=f'C{i:03d}', name=f'Khách hàng {i}', segment_code=f'SEG{i % 2}') for i in range(120)
+        ])
+        cls.products = Product.objects.bulk_create([
+            Product(product_code=f'P{i:03d}', product_name=f'Sản phẩm {i}', group_code=f'GRP{i % 3}', price=1000)
+            for i in range(120)
+        ])
+        start = timezone.make_aware(datetime(2024, 1, 1, 12))
+        make_orders([
+            (f'O{i:03d}', cls.customers[i % 4], start + timedelta(hours=i), [(cls.products[i % 6], 1, 1000)])
+            for i in range(120)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.client.get('/sales/products/')  # nạp session trước khi đếm
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_pages_use_constant_queries(self):
+        # session + user + một truy vấn cho trang, dù đi tới trang nào
+        for url, name in (('/sales/orders/', 'orders'), ('/sales/customers/', 'customers'),
+                          ('/sales/products/', 'products')):
+            response, count = self.get(url)
+            self.assertEqual(count, 3, url)
+            self.assertEqual(len(response.context[name]), 50)
+            response, count = self.get(url + response.context[name].next_url())
+            self.assertEqual(count, 3, url)
+            self.assertEqual(len(response.context[name]), 50)
+
+    def test_cursor_walks_every_order_once(self):
+        url, seen = '/sales/orders/', []
+        while url:
+            response, _ = self.get(url)
+            page = response.context['orders']
+            seen += [order.order_code for order in page]
+            url = page.next_url() and f'/sales/orders/{page.next_url()}'
+        self.assertEqual(seen, [f'O{i:03d}' for i in range(119, -1, -1)])
+
+        previous = page.previous_url()
+        response, _ = self.get(f'/sales/orders/{previous}')
+        self.assertEqual([order.order_code for order in response.context['orders']][-1], 'O020')
+
+    def test_filters(self):
+        response, _ = self.get('/sales/orders/', {'customer': 'C001', 'group': 'GRP2', 'date_from': '2024-01-02'})
+        # Khách C001 có các đơn i % 4 == 1; nhóm GRP2 có sản phẩm i % 6 in (2, 5) -> i % 12 == 5
+        self.assertEqual([order.order_code for order in response.context['orders']],
+                         [f'O{i:03d}' for i in range(119, 11, -1) if i % 12 == 5])
+        response, _ = self.get('/sales/customers/', {'segment': 'SEG1', 'code': 'C00'})
+        self.assertEqual([c.customer_code for c in response.context['customers']], ['C001', 'C003', 'C005', 'C007', 'C009'])
+        response, _ = self.get('/sales/products/', {'group': 'GRP0', 'page_size': 5})
+        self.assertEqual([p.product_code for p in response.context['products']], ['P000', 'P003', 'P006', 'P009', 'P012'])
+
+    def test_row_fragments_follow_writes(self):
+        self.get('/sales/customers/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customers[0].name = 'Khách hàng đổi tên'
+            self.customers[0].save()
+        response, _ = self.get('/sales/customers/')
+        self.assertContains(response, 'Khách hàng đổi tên')
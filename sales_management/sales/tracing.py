@@ -0,0 +1,98 @@
+"""
+Đo độ trễ theo span trên đường đi của một tin nhắn chat: socket -> ChatConsumer -> Celery
+-> channel layer -> socket.
+
+ChatConsumer.receive tạo một Trace (id tương quan + thời điểm nhận tin nhắn) và gửi context
+của nó kèm task process_chat_message; task tiếp tục trace, đo thời gian chờ trong hàng đợi,
+route intent, handler và DB, rồi gắn context (cả các span đã đo) vào mọi event trả lời qua
+channel layer. Consumer nhận câu trả lời đo thời gian qua channel layer và tổng thời gian
+từ lúc nhận tin nhắn, ghi một dòng log JSON cho cả tin nhắn và cộng các span vào histogram
+của sales.metrics (CHAT_SPAN_METRIC theo nhãn span, CHAT_ROUNDTRIP_METRIC).
+
+Histogram chỉ được cộng ở tiến trình web (consumer) nên /sales/metrics/ có đủ span của cả
+worker; thời gian chờ hàng đợi và channel layer tính bằng time.time() của hai máy khác nhau.
+"""
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CHAT_SPAN_METRIC = 'chat_span_seconds'
+CHAT_ROUNDTRIP_METRIC = 'chat_roundtrip_seconds'
+
+_current = ContextVar('sales_chat_trace', default=None)
+
+
+class Trace:
+    def __init__(self, trace_id=None, started_at=None, spans=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.started_at = started_at or time.time()
+        self.spans = [tuple(span) for span in spans or ()]  # [(tên span, giây)]
+
+    @classmethod
+    def resume(cls, context):
+        """Trace từ context gửi kèm task/event (None nếu không có)."""
+        if not context:
+            return None
+        return cls(context['id'], context['started_at'], context.get('spans'))
+
+    def add(self, name, seconds):
+        self.spans.append((name, seconds))
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def context(self, **extra):
+        """Phần gửi kèm (JSON được) cho task Celery hoặc event channel layer; `sent_at` để đo thời gian chờ."""
+        return dict(id=self.id, started_at=self.started_at, spans=[[name, round(seconds, 6)] for name, seconds in self.spans],
+                    sent_at=time.time(), **extra)
+
+    def observe(self, prefix=''):
+        for name, seconds in self.spans:
+            if name.startswith(prefix):
+                metrics.observe(CHAT_SPAN_METRIC, seconds, span=name)
+
+    def log(self, stage, **extra):
+        report = {'trace_id': self.id, 'stage': stage,
+                  'spans': {name: round(seconds * 1000, 3) for name, seconds in self.spans}, **extra}
+        logger.info(f'chat_trace {json.dumps(report, ensure_ascii=False)}')
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def activate(trace):
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Span trên trace đang chạy (không làm gì nếu không có trace)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+
+def waited(context):
+    """Số giây từ lúc context được gửi tới giờ (thời gian chờ hàng đợi/channel layer)."""
+    return max(time.time() - context['sent_at'], 0.0)
@@ -1,15 +1,19 @@
 from django.urls import path, include
 from . import views
-from .views import CustomerViewSet, ProductViewSet, OrderDetailViewSet, SearchViewSet, StatisticViewSets, ChatViewSet
+from .views import CustomerViewSet, ProductViewSet, OrderViewSet, OrderLineViewSet, SearchViewSet, StatisticViewSets, ChatViewSet, ImportJobViewSet, AnalyticsViewSet, MetricsViewSet
 from rest_framework import routers
 
 router = routers.DefaultRouter()
 router.register(r'home', StatisticViewSets, basename="home")
 router.register(r'customers', CustomerViewSet)
 router.register(r'products', ProductViewSet)
-router.register(r'orderdetails', OrderDetailViewSet)
+router.register(r'orders', OrderViewSet)
+router.register(r'orderlines', OrderLineViewSet)
 router.register(r'search', SearchViewSet, basename="search")
 router.register(r'chat', ChatViewSet)
+router.register(r'imports', ImportJobViewSet, basename="imports")
+router.register(r'analytics', AnalyticsViewSet, basename="analytics")
+router.register(r'metrics', MetricsViewSet, basename="metrics")
 
 urlpatterns = [
     path('', views.index, name="index"),
@@ -37,5 +41,6 @@ urlpatterns = [
     path('accounts/login/', views.login_view, name='login'),
     path('api/', include(router.urls)), 
     path('chat/', views.chat_view, name='chat'),
+    path('metrics/', views.metrics_view, name='metrics'),
     
 ]
@@ -1,43 +1,67 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Customer, Product, OrderDetail
-from .forms import CustomerForm, ProductForm, OrderDetailForm
+from django.urls import reverse
+from .models import Customer, Product, Order, OrderLine
+from . import fragments, rollups, statistics
+from .pagination import KeysetPaginator
+from .http_cache import conditional_list
+from .forms import CustomerForm, ProductForm, OrderForm
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import Paginator
 from django.db import transaction
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+from datetime import timedelta
+from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import user_passes_test
 
 def staff_check(user):
     return user.is_staff
 
+def list_filters(request, names):
+    return {name: request.GET.get(name, '').strip() for name in names}
+
+def filter_date(value):
+    # Bộ lọc của trang HTML: ngày sai định dạng thì bỏ qua thay vì báo lỗi
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+def render_list(request, template, name, page, filters):
+    return render(request, template, {
+        name: page,
+        'filters': filters,
+        'rows_version': fragments.version(name),
+        'cache_ttl': fragments.ttl(),
+    })
+
 @login_required
 def index(request):
-    customer_count = Customer.objects.count()
-    product_count = Product.objects.count()
-    order_count = OrderDetail.objects.count()
+    stats = statistics.dashboard()
     context = {
-        'customer_count': customer_count,
-        'product_count': product_count,
-        'order_count': order_count,
+        'customer_count': stats['customers'],
+        'product_count': stats['products'],
+        'order_count': stats['orders'],
+        'revenue_per_day': stats['revenue_per_day'],
+        'top_products': stats['top_products'],
     }
     return render(request, 'index.html', context)
 
 @login_required
 @user_passes_test(staff_check)
+@conditional_list('customers')
 def customer_list(request):
-    customers = Customer.objects.all().order_by('customer_code')
-    paginator = Paginator(customers, 1000)  
-    page = request.GET.get('page')
-    try:
-        customers = paginator.page(page)
-    except PageNotAnInteger:
-        customers = paginator.page(1)
-    except EmptyPage:
-        customers = paginator.page(paginator.num_pages)
-    return render(request, 'sales/customer_list.html', {'customers': customers})
+    filters = list_filters(request, ('segment', 'code'))
+    customers = Customer.objects.only('customer_code', 'name', 'segment_code', 'segment_description')
+    if filters['segment']:
+        customers = customers.filter(segment_code=filters['segment'])
+    if filters['code']:
+        customers = customers.filter(customer_code__startswith=filters['code'])
+    # Keyset theo customer_code (unique): không COUNT, trang sâu không chậm dần
+    page = KeysetPaginator(customers, ('customer_code',)).get_page(request)
+    return render_list(request, 'sales/customer_list.html', 'customers', page, filters)
 
 
 @login_required
@@ -91,9 +115,14 @@ def customer_delete(request, pk):
     return render(request, 'sales/customer_delete.html', {'customer': customer})
 
 @login_required
+@conditional_list('products')
 def product_list(request):
-    products = Product.objects.all()
-    return render(request, 'sales/product_list.html', {'products': products})
+    filters = list_filters(request, ('group',))
+    products = Product.objects.only('product_code', 'product_name', 'group_code', 'group_name', 'price')
+    if filters['group']:
+        products = products.filter(group_code=filters['group'])
+    page = KeysetPaginator(products, ('product_code',)).get_page(request)
+    return render_list(request, 'sales/product_list.html', 'products', page, filters)
 
 @login_required
 def product_detail(request, pk):
@@ -143,30 +172,40 @@ def product_delete(request, pk):
         return redirect('product_list')
     return render(request, 'sales/product_delete.html', {'product': product})
 
-from django.db.models import Prefetch 
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Sum
 
 @login_required
 @user_passes_test(staff_check)
 def order_list(request):
-    orders = OrderDetail.objects.all().order_by('created_at')
-
-    paginator = Paginator(orders, 1000)
-    page = request.GET.get('page')
-    try:
-        orders = paginator.page(page)
-    except PageNotAnInteger:
-        orders = paginator.page(1)
-    except EmptyPage:
-        orders = paginator.page(paginator.num_pages)
-    return render(request, 'sales/order_list.html', {'orders': orders})
+    filters = list_filters(request, ('date_from', 'date_to', 'customer', 'group'))
+    orders = Order.objects.select_related('customer').only('order_code', 'created_at', 'total_price', 'customer__name')
+    date_from, date_to = filter_date(filters['date_from']), filter_date(filters['date_to'])
+    if date_from:
+        orders = orders.filter(created_at__gte=rollups.day_bounds(date_from)[0])
+    if date_to:
+        orders = orders.filter(created_at__lt=rollups.day_bounds(date_to)[1])
+    if filters['customer']:
+        orders = orders.filter(customer__customer_code=filters['customer'])
+    if filters['group']:
+        # Đơn có ít nhất một dòng thuộc nhóm hàng, kiểm tra theo unique (order, product) của từng đơn
+        orders = orders.filter(Exists(
+            OrderLine.objects.filter(order=OuterRef('pk'), product__group_code=filters['group'])))
+    # Mới nhất trước theo index (created_at, id); lọc theo khách hàng dùng (customer, -created_at, -id)
+    page = KeysetPaginator(orders, ('-created_at', '-id')).get_page(request)
+    return render_list(request, 'sales/order_list.html', 'orders', page, filters)
 
 @login_required
 @user_passes_test(staff_check)
 def order_detail(request, order_code):
-    order = get_object_or_404(OrderDetail, order_code=order_code)
-    return render(request, 'sales/order_detail.html', {'order': order})
+    # order_code là unique nên đơn nhiều dòng vẫn chỉ là một bản ghi header
+    order = get_object_or_404(Order.objects.select_related('customer'), order_code=order_code)
+    lines = order.lines.select_related('product').order_by('id')
+    return render(request, 'sales/order_detail.html', {'order': order, 'lines': lines})
 
 from django.contrib import messages
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .services import OrderError, create_order, resolve_customer
 
 @login_required
 @require_http_methods(["GET", "POST"])
@@ -180,29 +219,28 @@ def order_create(request):
             order_code = data.get('order_code')
             customer_name = data.get('customer_name')
             created_at = data.get('created_at')
-            products = data.get('products', [])
-            quantities = data.get('quantities', [])
-
-            if not order_code or not customer_name or not products or not quantities:
+            # Hỗ trợ cả dạng cũ (products + quantities) và order_lines của form tạo đơn
+            if 'order_lines' in data:
+                lines = [(line.get('product'), line.get('quantity'), line.get('total_price'))
+                         for line in data.get('order_lines') or []]
+            else:
+                lines = list(zip(data.get('products', []), data.get('quantities', [])))
+
+            if not order_code or not customer_name or not lines:
                 return JsonResponse({'success': False, 'message': 'Please fill in all required fields.'})
 
-            customer, created = Customer.objects.get_or_create(name=customer_name)
-            total_price = 0
+            if created_at:
+                created_at = parse_datetime(created_at)
+                if created_at is None:
+                    return JsonResponse({'success': False, 'message': 'Invalid created_at.'})
+                if timezone.is_naive(created_at):
+                    created_at = timezone.make_aware(created_at)
 
-            with transaction.atomic():
-                for product_id, quantity in zip(products, quantities):
-                    product = get_object_or_404(Product, id=product_id)
-                    line_total_price = product.price * int(quantity)
-                    total_price += line_total_price
-
-                    OrderDetail.objects.create(
-                        order_code=order_code,
-                        customer=customer,
-                        product=product,
-                        created_at=created_at,
-                        quantity=int(quantity),
-                        total_price=line_total_price
-                    )
+            try:
+                customer, created = resolve_customer(customer_name)
+                create_order(customer, lines, order_code=order_code, created_at=created_at)
+            except OrderError as e:
+                return JsonResponse({'success': False, 'message': str(e)})
 
             return JsonResponse({'success': True, 'message': 'Order created successfully!'})
         except json.JSONDecodeError:
@@ -219,9 +257,9 @@ def order_create(request):
 
 @user_passes_test(staff_check)
 def order_edit(request, pk):
-    order_detail = get_object_or_404(OrderDetail, pk=pk)
+    order = get_object_or_404(Order, pk=pk)
     if request.method == 'POST':
-        form = OrderDetailForm(request.POST, instance=order_detail)
+        form = OrderForm(request.POST, instance=order)
         if form.is_valid():
             form.save()
             messages.success(request, 'Order updated successfully!')
@@ -229,7 +267,7 @@ def order_edit(request, pk):
         else:
             messages.error(request, 'Please correct the error below.')
     else:
-        form = OrderDetailForm(instance=order_detail)
+        form = OrderForm(instance=order)
         
     products = Product.objects.all()
     
@@ -237,34 +275,55 @@ def order_edit(request, pk):
 
 @user_passes_test(staff_check)
 def order_delete(request, pk):
-    order = get_object_or_404(OrderDetail, pk=pk)
+    order = get_object_or_404(Order, pk=pk)
     if request.method == 'POST':
         order.delete()
         return redirect('order_list')
     return render(request, 'sales/order_delete.html', {'order': order})
 
+SEARCH_ORDERS_PER_PAGE = 100
+SEARCH_GROUPS_PER_PAGE = 50
+
+def order_totals():
+    return {
+        'lines': Count('id'),
+        'quantity': Sum('quantity'),
+        'revenue': Sum('total_price'),
+        'last_order': Max('order__created_at'),
+    }
+
 @login_required
 @user_passes_test(staff_check)
 def search_product_customers(request, product_id):
-    product = Product.objects.get(id=product_id)
-    orders = OrderDetail.objects.filter(product=product)
-    customers = set(order.customer for order in orders)
+    product = get_object_or_404(Product, id=product_id)
+    orders = OrderLine.objects.filter(product=product)
+    # Gom nhóm trên DB thay vì nạp customer cho từng dòng; số truy vấn mỗi trang không đổi
+    customers = (orders.values('order__customer_id', 'order__customer__name', 'order__customer__customer_code')
+                 .annotate(**order_totals()).order_by('-revenue', 'order__customer_id'))
     return render(request, 'sales/search_product_customers.html', {
         'product': product,
-        'customers': customers,
-        'orders': orders
+        'totals': orders.aggregate(**order_totals()),
+        'customers': Paginator(customers, SEARCH_GROUPS_PER_PAGE).get_page(request.GET.get('customers_page')),
+        'orders': Paginator(
+            orders.select_related('order__customer').order_by('-id'), SEARCH_ORDERS_PER_PAGE
+        ).get_page(request.GET.get('page')),
     })
 
 @login_required
 @user_passes_test(staff_check)
 def search_customer_orders(request, customer_id):
-    customer = Customer.objects.get(id=customer_id)
-    orders = OrderDetail.objects.filter(customer=customer)
-    products = set(order.product for order in orders)
+    customer = get_object_or_404(Customer, id=customer_id)
+    orders = OrderLine.objects.filter(order__customer=customer)
+    products = (orders.values('product_id', 'product__product_name', 'product__product_code')
+                .annotate(**order_totals()).order_by('-revenue', 'product_id'))
     return render(request, 'sales/search_customer_orders.html', {
         'customer': customer,
-        'products': products,
-        'orders': orders
+        'totals': orders.aggregate(**order_totals()),
+        'products': Paginator(products, SEARCH_GROUPS_PER_PAGE).get_page(request.GET.get('products_page')),
+        'orders': Paginator(
+            orders.select_related('order', 'product').order_by('-order__created_at', '-order_id', 'id'),
+            SEARCH_ORDERS_PER_PAGE
+        ).get_page(request.GET.get('page')),
     })
 
 
@@ -285,109 +344,35 @@ def search_orders_by_customer(request):
         'customers': customers
     })
 
-import csv
 from django.contrib import messages
 from .forms import UploadFileForm
-from django.utils.dateparse import parse_datetime
-from django.db import transaction, IntegrityError
-
-# Ánh xạ tên cột CSV tiếng Việt sang tên trường trong cơ sở dữ liệu
-column_mapping = {
-    'Thời gian tạo đơn': 'created_at',
-    'Mã đơn hàng': 'order_code',
-    'Mã khách hàng': 'customer_code',
-    'Tên khách hàng': 'customer_name',
-    'Mã PKKH': 'segment_code',
-    'Mô tả Phân Khúc Khách hàng': 'segment_description',
-    'Mã nhóm hàng': 'group_code',
-    'Tên nhóm hàng': 'group_name',
-    'Mã mặt hàng': 'product_code',
-    'Tên mặt hàng': 'product_name',
-    'SL': 'quantity',
-    'Đơn giá': 'price',
-    'Thành tiền': 'total_price'
-}
-
-def handle_uploaded_file(file):
-    file_data = file.read().decode('utf-8').splitlines()  # Đọc và giải mã file
-    reader = csv.DictReader(file_data)
-    
-    for row in reader:
-        data = {column_mapping[key]: value for key, value in row.items() if key in column_mapping}
-
-        # Kiểm tra các giá trị bắt buộc
-        if not data['customer_code'] or not data['product_code'] or not data['order_code']:
-            continue  # Bỏ qua dòng nếu thiếu thông tin bắt buộc
-
-        if not data['segment_code']:
-            data['segment_code'] = 'DEFAULT_SEGMENT_CODE'  # Thay thế bằng giá trị mặc định nếu cần
-
-        if not data['segment_description']:
-            data['segment_description'] = 'DEFAULT_SEGMENT_DESCRIPTION'  # Thay thế bằng giá trị mặc định nếu cần
-        
-        if not data['price']:
-            data['price'] = 0
-        # Tạo hoặc lấy khách hàng
-        customer, created = Customer.objects.get_or_create(
-            customer_code=data['customer_code'],
-            defaults={
-                'name': data['customer_name'],
-                'segment_code': data['segment_code'],
-                'segment_description': data['segment_description']
-            }
-        )
-
-        # Tạo hoặc lấy sản phẩm
-        product, created = Product.objects.get_or_create(
-            product_code=data['product_code'],
-            defaults={
-                'product_name': data['product_name'],
-                'group_code': data['group_code'],
-                'group_name': data['group_name'],
-                'price': data['price']
-            }
-        )
-
-        # Sử dụng transaction để đảm bảo an toàn khi thực hiện nhiều thao tác trên cơ sở dữ liệu
-        try:
-            with transaction.atomic():
-                order_detail = OrderDetail.objects.filter(
-                    order_code=data['order_code'],
-                    customer=customer,
-                    product=product
-                ).first()
-
-                if order_detail:
-                    # Nếu có bản ghi, cập nhật bản ghi đó
-                    order_detail.created_at = parse_datetime(data['created_at'])
-                    order_detail.quantity = data['quantity']
-                    order_detail.total_price = data['total_price']
-                    order_detail.save()
-                else:
-                    # Nếu không có bản ghi, tạo mới
-                    OrderDetail.objects.create(
-                        order_code=data['order_code'],
-                        customer=customer,
-                        product=product,
-                        created_at=parse_datetime(data['created_at']),
-                        quantity=data['quantity'],
-                        total_price=data['total_price']
-                    )
-        except IntegrityError as e:
-            print(f"Error saving order: {e}")
-            continue  # Bỏ qua dòng nếu có lỗi
-
+from .importer import save_upload
+from .models import ImportJob
+from .tasks import run_import_job
 
 def upload_file(request):
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
-            handle_uploaded_file(request.FILES['file'])
-            messages.success(request, 'File uploaded successfully!')
-            return redirect('upload_file')
+            # Lưu file và giao cho Celery import, trả về job id ngay lập tức
+            upload = request.FILES['file']
+            job = ImportJob.objects.create(
+                user=request.user if request.user.is_authenticated else None,
+                file_name=upload.name,
+                file_path=save_upload(upload),
+            )
+            transaction.on_commit(lambda: run_import_job.delay(job.id))
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse({
+                    'success': True,
+                    'message': 'File uploaded, import started',
+                    'job_id': job.id,
+                })
+            messages.success(request, f'File uploaded successfully! Import job #{job.id} started.')
+            return redirect(f"{reverse('upload_file')}?job={job.id}")
     else:
         form = UploadFileForm()
-    return render(request, 'sales/upload.html', {'form': form})
+    return render(request, 'sales/upload.html', {'form': form, 'job_id': request.GET.get('job')})
 
 from django.contrib.auth import logout, login
 from django.shortcuts import redirect
@@ -407,48 +392,249 @@ def logout_view(request):
         return redirect('/sales/')
     
 from rest_framework import viewsets
-from .serializers import CustomerSerializer, ProductSerializer, OrderDetailSerializer
+from .serializers import CustomerSerializer, ProductSerializer, OrderSerializer, OrderLineSerializer, ImportJobSerializer, OrderCreateSerializer
+from .serializers import CustomerBulkSerializer, ProductBulkSerializer, OrderBulkSerializer
+from .bulk import BulkMixin, upsert_customers, upsert_orders, upsert_products
+from .fast import FastReadMixin
+from .http_cache import CachedResponseMixin
+from . import http_cache, metrics, profiling
+from rest_framework.permissions import IsAdminUser
+from .pagination import SwitchablePagination, query_date, query_int
+from .services import AUTOCOMPLETE_LIMIT, autocomplete_customers
+from .models import DailySegmentSales
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+from rest_framework.exceptions import ValidationError
+from django_filters.rest_framework import DjangoFilterBackend # type: ignore
+from .tasks import resume_import_job
 from rest_framework.decorators import action 
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        jobs = ImportJob.objects.all().order_by('-id')
+        if not self.request.user.is_staff:
+            jobs = jobs.filter(user=self.request.user)
+        return jobs
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ImportJob.STATUS_FAILED:
+            return Response({'success': False, 'message': 'Only failed jobs can be resumed.'}, status=400)
+        resume_import_job.delay(job.id)
+        return Response({'success': True, 'job_id': job.id})
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Doanh thu theo thời gian và top-N đọc từ các bảng tổng hợp theo ngày (sales/rollups.py).
+
+    dimension: segment | group | customer (timeseries còn có total); start/end: YYYY-MM-DD
+    (mặc định 30 ngày gần nhất).
+    """
+    INTERVALS = ('day', 'week', 'month')
+    TOP_ORDERING = ('revenue', 'quantity', 'lines')
+
+    def list(self, request):
+        return Response({'dimensions': ['total', *rollups.DIMENSIONS], 'intervals': self.INTERVALS})
+
+    def get_range(self, request):
+        end = query_date(request, 'end') or timezone.localdate()
+        start = query_date(request, 'start') or end - timedelta(days=29)
+        if start > end:
+            raise ValidationError({'start': 'start must not be after end.'})
+        return start, end
+
+    def get_dimension(self, request, allow_total=False):
+        dimension = request.query_params.get('dimension', 'total' if allow_total else '')
+        if allow_total and dimension == 'total':
+            return DailySegmentSales, None
+        if dimension not in rollups.DIMENSIONS:
+            raise ValidationError({'dimension': f"Choose one of: {', '.join(rollups.DIMENSIONS)}."})
+        model, key, _ = rollups.DIMENSIONS[dimension]
+        return model, key
+
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        model, key = self.get_dimension(request, allow_total=True)
+        start, end = self.get_range(request)
+        interval = request.query_params.get('interval', 'day')
+        if interval not in self.INTERVALS:
+            raise ValidationError({'interval': f"Choose one of: {', '.join(self.INTERVALS)}."})
+
+        rows = model.objects.filter(date__gte=start, date__lte=end)
+        if key:
+            value = request.query_params.get('key')
+            if not value:
+                raise ValidationError({'key': 'This parameter is required for this dimension.'})
+            rows = rows.filter(**{key: value})
+        series = (rows.annotate(period=Trunc('date', interval, output_field=DateField())).values('period')
+                  .annotate(lines=Sum('lines'), quantity=Sum('quantity'), revenue=Sum('revenue'))
+                  .order_by('period'))
+        return Response({'start': start, 'end': end, 'interval': interval, 'series': list(series)})
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        model, key = self.get_dimension(request)
+        start, end = self.get_range(request)
+        limit = query_int(request, 'limit', 10, maximum=100)
+        ordering = request.query_params.get('order_by', 'revenue')
+        if ordering not in self.TOP_ORDERING:
+            raise ValidationError({'order_by': f"Choose one of: {', '.join(self.TOP_ORDERING)}."})
+
+        fields = [key, 'customer__name', 'customer__customer_code'] if key == 'customer_id' else [key]
+        rows = (model.objects.filter(date__gte=start, date__lte=end).values(*fields)
+                .annotate(lines=Sum('lines'), quantity=Sum('quantity'), revenue=Sum('revenue'))
+                .order_by(f'-{ordering}', key)[:limit])
+        return Response({'start': start, 'end': end, 'results': list(rows)})
+
 class StatisticViewSets(viewsets.ViewSet):
     def list(self, request):
-        customer_count = Customer.objects.count()
-        product_count = Product.objects.count()
-        order_count = OrderDetail.objects.count()
+        stats = statistics.dashboard()
         data = {
             'Welcome Message': 'Welcome to the Sales Management System',
             'Developed By' : 'A website developed by Hang Nguyen',
-            'Total Customers': customer_count,
-            'Total Products': product_count,
-            'Total Orders': order_count,
+            'Total Customers': stats['customers'],
+            'Total Products': stats['products'],
+            'Total Orders': stats['orders'],
+            'Revenue Per Day': stats['revenue_per_day'],
+            'Top Products': stats['top_products'],
         }
         return Response(data)
+
+class MetricsViewSet(viewsets.ViewSet):
+    """Số liệu vận hành của tiến trình đang phục vụ request (sales/metrics.py), chỉ cho admin."""
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response({
+            'http_cache': http_cache.summary(),
+            'queries': profiling.summary(),
+            'counters': [{'name': name, 'labels': labels, 'value': value} for name, labels, value in metrics.counters()],
+        })
+
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+def metrics_view(request):
+    """Số liệu của tiến trình theo định dạng text của Prometheus, cho admin hoặc máy trong SALES_METRICS_ALLOWED_IPS."""
+    if not request.user.is_staff and request.META.get('REMOTE_ADDR') not in getattr(settings, 'SALES_METRICS_ALLOWED_IPS', ()):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
     
-class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.all().order_by('id')[100:]
+class CustomerViewSet(CachedResponseMixin, FastReadMixin, BulkMixin, viewsets.ModelViewSet):
+    queryset = Customer.objects.all().order_by('id')
     serializer_class = CustomerSerializer
+    pagination_class = SwitchablePagination
+    cursor_ordering = 'id'
+    cache_list = 'customers'
+    bulk_serializer_class = CustomerBulkSerializer
+    bulk_upsert = staticmethod(upsert_customers)
+    export_fields = {field: field for field in ('id', 'customer_code', 'name', 'segment_code', 'segment_description')}
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        # ?q=<tiền tố tên, không phân biệt hoa thường, dấu>&limit=<tối đa 50>
+        limit = query_int(request, 'limit', AUTOCOMPLETE_LIMIT, maximum=50)
+        return Response(autocomplete_customers(request.query_params.get('q', ''), limit))
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedResponseMixin, FastReadMixin, BulkMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by('id')
     serializer_class = ProductSerializer
+    cache_list = 'products'
+    bulk_serializer_class = ProductBulkSerializer
+    bulk_upsert = staticmethod(upsert_products)
+    export_fields = {field: field for field in ('id', 'product_code', 'product_name', 'group_code', 'group_name', 'price')}
+
+class OrderViewSet(FastReadMixin, BulkMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.prefetch_related(
+        Prefetch('lines', queryset=OrderLine.objects.order_by('id'))).order_by('-created_at', '-id')
+    serializer_class = OrderSerializer
+    # Tra cứu một đơn theo mã: /api/orders/<order_code>/
+    lookup_field = 'order_code'
+    pagination_class = SwitchablePagination
+    cursor_ordering = ('-created_at', '-id')
+    bulk_serializer_class = OrderBulkSerializer
+    bulk_upsert = staticmethod(upsert_orders)
+    # Mỗi dòng đơn hàng một bản ghi, cùng các cột như file CSV import
+    export_fields = {
+        'order_code': 'order__order_code',
+        'created_at': 'order__created_at',
+        'customer_code': 'order__customer__customer_code',
+        'product_code': 'product__product_code',
+        'quantity': 'quantity',
+        'total_price': 'total_price',
+    }
 
-class OrderDetailViewSet(viewsets.ModelViewSet):
-    queryset = OrderDetail.objects.all().order_by('-id')[100:]
-    serializer_class = OrderDetailSerializer
+    def get_export_queryset(self):
+        # ?start=&end=: YYYY-MM-DD theo ngày tạo đơn (giờ địa phương), để đồng bộ từng khoảng
+        lines = OrderLine.objects.order_by('order_id', 'id')
+        start, end = query_date(self.request, 'start'), query_date(self.request, 'end')
+        if start:
+            lines = lines.filter(order__created_at__gte=rollups.day_bounds(start)[0])
+        if end:
+            lines = lines.filter(order__created_at__lt=rollups.day_bounds(end)[1])
+        return lines
+
+    def create(self, request, *args, **kwargs):
+        # Đơn hàng luôn được tạo cùng các dòng qua service dùng chung
+        serializer = OrderCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            order, lines = create_order(
+                data['customer'],
+                [(line['product'], line['quantity'], line.get('total_price')) for line in data['order_lines']],
+                order_code=data.get('order_code'),
+                created_at=data.get('created_at'),
+            )
+        except OrderError as e:
+            return Response({'success': False, 'message': str(e)}, status=400)
+        return Response({
+            'success': True,
+            'order_code': order.order_code,
+            'total_price': order.total_price,
+            'lines': OrderLineSerializer(lines, many=True).data,
+        }, status=201)
+
+class OrderLineViewSet(FastReadMixin, viewsets.ModelViewSet):
+    queryset = OrderLine.objects.all().order_by('-id')
+    serializer_class = OrderLineSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['order', 'product']
+    pagination_class = SwitchablePagination
+    cursor_ordering = '-id'
         
 
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Prefetch
+from django.db.models import Count, F, Prefetch, Window
+from django.db.models.functions import RowNumber
 
 class CustomPagination(PageNumberPagination):
     page_size = 1
     page_size_query_param = 'page_size'
     max_page_size = 1
 
+def ranked_rows(queryset, partition_by, order_by, limit, fields):
+    """
+    Lấy tối đa `limit` dòng đầu của mỗi nhóm trong một truy vấn (ROW_NUMBER() OVER PARTITION BY).
+
+    Trả về tuple theo thứ tự `fields`, không khởi tạo model.
+    """
+    return (queryset
+            .annotate(row_number=Window(RowNumber(), partition_by=[F(partition_by)], order_by=order_by))
+            .filter(row_number__lte=limit)
+            .order_by(partition_by, 'row_number')
+            .values_list(*fields))
+
 class SearchViewSet(viewsets.ViewSet):
     pagination_class = CustomPagination
+    cursor_ordering = 'id'
 
     def list(self, request):
         return Response([])
@@ -468,20 +654,20 @@ class SearchViewSet(viewsets.ViewSet):
                 'orders': []
             }
 
-            orders = OrderDetail.objects.filter(product=product).select_related('customer').order_by('id')
+            orders = OrderLine.objects.filter(product=product).select_related('order__customer').order_by('id')
             
             order_page = request.GET.get('order_page', 1)
-            order_page_size = request.GET.get('order_page_size', 300)
+            order_page_size = query_int(request, 'order_page_size', 300, maximum=1000)
             order_paginator = Paginator(orders, order_page_size)
             paginated_orders = order_paginator.get_page(order_page)
 
             
             for order in paginated_orders:
                 order_data = {
-                    'customer_name': order.customer.name,
-                    'customer_code': order.customer.customer_code,
-                    'order_code': order.order_code,
-                    'created_at': order.created_at,
+                    'customer_name': order.order.customer.name,
+                    'customer_code': order.order.customer.customer_code,
+                    'order_code': order.order.order_code,
+                    'created_at': order.order.created_at,
                     'quantity': order.quantity
                 }
                 product_data['orders'].append(order_data)
@@ -495,33 +681,134 @@ class SearchViewSet(viewsets.ViewSet):
             }
             result.append(product_data)
         return paginator.get_paginated_response(result)
+
+    @action(detail=False, methods=['get'], url_path='orders_by_product/batch')
+    def orders_by_product_batch(self, request):
+        """
+        Nhiều sản phẩm mỗi trang (page_size, mặc định 100), kèm tối đa `orders_per_product`
+        đơn hàng đầu tiên của từng sản phẩm và tổng số đơn.
+
+        Số truy vấn cố định: trang sản phẩm, một truy vấn ROW_NUMBER cho đơn hàng,
+        một truy vấn GROUP BY cho số lượng.
+        """
+        limit = query_int(request, 'orders_per_product', 20, maximum=300)
+        paginator = SwitchablePagination()
+        products = paginator.paginate_queryset(
+            Product.objects.order_by('id').values('id', 'product_name', 'product_code'), request, view=self)
+
+        ids = [product['id'] for product in products]
+        counts = dict(OrderLine.objects.filter(product_id__in=ids)
+                      .values('product_id').annotate(total=Count('id')).values_list('product_id', 'total'))
+        orders = {id: [] for id in ids}
+        rows = ranked_rows(
+            OrderLine.objects.filter(product_id__in=ids), 'product_id', F('id').asc(), limit,
+            ['product_id', 'order__customer__name', 'order__customer__customer_code', 'order__order_code',
+             'order__created_at', 'quantity'])
+        for product_id, customer_name, customer_code, order_code, created_at, quantity in rows:
+            orders[product_id].append({
+                'customer_name': customer_name,
+                'customer_code': customer_code,
+                'order_code': order_code,
+                'created_at': created_at,
+                'quantity': quantity,
+            })
+
+        for product in products:
+            total = counts.get(product['id'], 0)
+            product['orders'] = orders[product['id']]
+            product['total_orders'] = total
+            product['has_more_orders'] = total > limit
+        return paginator.get_paginated_response(products)
     
     @action(detail=False, methods=['get'])
     def orders_by_customer(self, request):
-        customers = Customer.objects.prefetch_related(
-            Prefetch('orderdetail_set', queryset=OrderDetail.objects.select_related('product'))
-        ).order_by('id')
+        """
+        Khách hàng kèm một trang đơn hàng (order_page, order_page_size) mới nhất trước, mỗi đơn
+        kèm các dòng; lọc tuỳ chọn theo date_from/date_to (YYYY-MM-DD, tính cả hai đầu).
+
+        Prefetch dùng queryset có slice (ROW_NUMBER) nên mỗi khách chỉ nạp một trang;
+        ?lean=true đọc thẳng tuple, không khởi tạo model.
+        """
+        order_page = query_int(request, 'order_page', 1)
+        order_page_size = query_int(request, 'order_page_size', 100, maximum=1000)
+        offset = (order_page - 1) * order_page_size
+        orders = Order.objects.all()
+        date_from, date_to = query_date(request, 'date_from'), query_date(request, 'date_to')
+        if date_from:
+            orders = orders.filter(created_at__gte=rollups.day_bounds(date_from)[0])
+        if date_to:
+            orders = orders.filter(created_at__lt=rollups.day_bounds(date_to)[1])
+        lean = request.query_params.get('lean', '').lower() in ('1', 'true', 'yes')
+
+        customers = Customer.objects.order_by('id')
+        if not lean:
+            # Lấy thêm một đơn để biết còn trang sau
+            customers = customers.prefetch_related(Prefetch(
+                'orders',
+                queryset=orders.order_by('-created_at', '-id')[offset:offset + order_page_size + 1].prefetch_related(
+                    Prefetch('lines', queryset=OrderLine.objects.select_related('product').order_by('id'))),
+                to_attr='order_page',
+            ))
         paginator = self.pagination_class()
         paginated_customers = paginator.paginate_queryset(customers, request)
 
+        if lean:
+            # Trang khách hàng rất nhỏ (CustomPagination) nên mỗi khách một truy vấn LIMIT theo index
+            # (customer, -created_at, -id) rẻ hơn tính ROW_NUMBER trên toàn bộ lịch sử của khách,
+            # rồi một truy vấn cho các dòng của những đơn đó
+            pages = {
+                customer.id: list(orders.filter(customer_id=customer.id).order_by('-created_at', '-id').values_list(
+                    'id', 'order_code', 'created_at', 'total_price')[offset:offset + order_page_size + 1])
+                for customer in paginated_customers
+            }
+            lines = {}
+            for order_id, product_name, product_code, quantity, total_price in OrderLine.objects.filter(
+                    order_id__in=[order[0] for page in pages.values() for order in page[:order_page_size]]
+            ).order_by('id').values_list('order_id', 'product__product_name', 'product__product_code',
+                                         'quantity', 'total_price'):
+                lines.setdefault(order_id, []).append((product_name, product_code, quantity, total_price))
+        else:
+            pages = {customer.id: [
+                (order.id, order.order_code, order.created_at, order.total_price)
+                for order in customer.order_page
+            ] for customer in paginated_customers}
+            lines = {
+                order.id: [(line.product.product_name, line.product.product_code, line.quantity, line.total_price)
+                           for line in order.lines.all()]
+                for customer in paginated_customers for order in customer.order_page
+            }
+
         result = []
         for customer in paginated_customers:
+            page = pages[customer.id]
             customer_data = {
                 'id': customer.id,
                 'name': customer.name,
                 'customer_code': customer.customer_code,
-                'orders': []
+                'orders': [
+                    {
+                        'order_code': order_code,
+                        'created_at': created_at,
+                        'total_price': total_price,
+                        'lines': [
+                            {
+                                'product_name': product_name,
+                                'product_code': product_code,
+                                'quantity': quantity,
+                                'total_price': line_total,
+                            }
+                            for product_name, product_code, quantity, line_total in lines.get(order_id, [])
+                        ],
+                    }
+                    for order_id, order_code, created_at, total_price in page[:order_page_size]
+                ],
+                'orders_pagination': {
+                    'current_page': order_page,
+                    'page_size': order_page_size,
+                    'has_next': len(page) > order_page_size,
+                    'has_previous': order_page > 1,
+                },
             }
-            for order in customer.orderdetail_set.all():
-                order_data = {
-                    'product_name': order.product.product_name,
-                    'product_code': order.product.product_code,
-                    'order_code': order.order_code,
-                    'created_at': order.created_at,
-                    'quantity': order.quantity,
-                    'total_price': order.total_price
-                }
-                customer_data['orders'].append(order_data)
             result.append(customer_data)
         
         return paginator.get_paginated_response(result)
@@ -542,7 +829,10 @@ class ChatViewSet(viewsets.ModelViewSet):
     filter_backends=[DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['user']
     ordering_fields = ['timestamp']
-    ordering =['-timestamp']
+    # id làm khoá phụ để cursor ổn định khi nhiều tin nhắn trùng timestamp
+    ordering = ['-timestamp', '-id']
+    cursor_ordering = ('-timestamp', '-id')
+    pagination_class = SwitchablePagination
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
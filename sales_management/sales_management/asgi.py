@@ -12,14 +12,17 @@ from django.core.asgi import get_asgi_application
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 import sales.routing
+from sales.middleware import JWTAuthMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sales_management.settings')
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            sales.routing.websocket_urlpatterns
+        JWTAuthMiddleware(
+            URLRouter(
+                sales.routing.websocket_urlpatterns
+            )
         )
     ),
 })
\ No newline at end of file
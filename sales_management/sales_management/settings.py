@@ -65,6 +65,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'sales.profiling.QueryProfilerMiddleware',
 ]
 
 
@@ -189,10 +190,53 @@ LOGGING = {
     },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+}
+
 # Celery settings
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
 
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, '../frontend/chat-app/build/static')
-]
\ No newline at end of file
+]
+
+# Số dòng CSV ghi trong mỗi lô (mỗi lô một transaction) khi import CSV
+SALES_IMPORT_BATCH_SIZE = 2000
+# Thư mục lưu file upload chờ import và số dòng của mỗi khoảng giao cho một worker
+SALES_IMPORT_DIR = os.path.join(BASE_DIR, 'imports')
+SALES_IMPORT_CHUNK_ROWS = 200000
+
+# Số mã đơn hàng mỗi tiến trình giữ sẵn trong bộ nhớ (xem sales.sequences)
+SALES_SEQUENCE_BLOCK_SIZE = 20
+
+# Chu kỳ (giây) mỗi tiến trình kiểm tra index tên sản phẩm có bị thay đổi ở tiến trình khác không
+SALES_PRODUCT_INDEX_CHECK_INTERVAL = 5
+# Số liệu dashboard: 'exact' (COUNT(*)) hoặc 'estimate' (pg_class.reltuples trên PostgreSQL)
+SALES_STATISTICS_MODE = 'exact'
+SALES_STATISTICS_TTL = 300
+# Số giây gộp các thay đổi đơn hàng trước khi dựng lại bảng tổng hợp theo ngày
+SALES_ROLLUP_REFRESH_DELAY = 10
+# Thời gian (giây) cache phần HTML các dòng của order_list, customer_list, product_list
+SALES_FRAGMENT_CACHE_TTL = 300
+# Tin nhắn chat được ghi theo lô: khi đủ số tin nhắn hoặc sau số giây này (xem sales.chat_buffer)
+SALES_CHAT_FLUSH_SIZE = 100
+SALES_CHAT_FLUSH_INTERVAL = 0.2
+# Số tin nhắn tối đa giữ trong bộ đệm khi DB gián đoạn; quá thì bỏ tin nhắn cũ nhất
+SALES_CHAT_MAX_PENDING = 10000
+# Số bản ghi tối đa mỗi request POST .../bulk/ (xem sales.bulk)
+SALES_BULK_MAX_RECORDS = 5000
+# list/retrieve của các API đọc nhiều đọc values_list() và render bằng orjson thay vì ModelSerializer (xem sales.fast)
+SALES_FAST_SERIALIZERS = True
+# Thời gian (giây) cache response JSON của API sản phẩm/khách hàng theo phiên bản danh sách (xem sales.http_cache)
+SALES_HTTP_CACHE_TTL = 300
+# Đo số truy vấn/thời gian DB và phát hiện N+1 cho mỗi request, tin nhắn websocket, task Celery (xem sales.profiling)
+SALES_QUERY_PROFILER = False
+# Số lần một câu SQL được gọi từ cùng một dòng code để bị coi là N+1
+SALES_QUERY_NPLUSONE_THRESHOLD = 5
+# Địa chỉ được đọc /sales/metrics/ (định dạng Prometheus) không cần đăng nhập, thường là Prometheus chạy cùng máy
+SALES_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']